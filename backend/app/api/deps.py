@@ -0,0 +1,33 @@
+"""
+API Dependencies
+Request dependencies shared by the v1 routers
+"""
+
+from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import OAuth2PasswordBearer
+from app.core.logger import logger
+from app.core.revocation import revocation_list
+from app.services.auth_service import AuthService
+
+# OAuth2 scheme for token extraction
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/signin")
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+    """
+    Username from the request's bearer token
+    Only verifies the JWT (usually from the verified-token cache) and checks
+    the in-memory revocation filter, so it needs no database session and runs
+    on the event loop. Only a filter hit is confirmed in the database.
+    """
+    payload = AuthService.get_token_payload(token)
+    jti = payload.get("jti")
+    if revocation_list.might_be_revoked(jti) and await run_in_threadpool(AuthService.is_token_revoked, jti):
+        logger.warning(f"Token verification failed: token of '{payload['sub']}' was revoked")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload["sub"]
@@ -1,16 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from app.db.database import get_db
-from app.schemas.user import UserCreate, UserLogin, UserResponse, Token
+from app.db.database import get_db, run_db
+from app.schemas.user import UserCreate, UserLogin, UserResponse, Token, RefreshRequest, LogoutRequest
 from app.services.auth_service import AuthService
+from app.api.deps import get_current_user, oauth2_scheme
 from app.core.logger import logger
 
 router = APIRouter()
 
-# OAuth2 scheme for token extraction from Authorization header
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/signin")
-
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup(user: UserCreate, db: Session = Depends(get_db)):
     """
@@ -19,7 +16,7 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
     """
     logger.info(f"[API] Signup request received for username: {user.username}, email: {user.email}")
     try:
-        db_user = AuthService.create_user(db, user)
+        db_user = await AuthService.register_user(db, user)
         logger.info(f"[API] Signup successful for user: {user.username}")
         return db_user
     except HTTPException as e:
@@ -40,7 +37,7 @@ async def signin(user_login: UserLogin, db: Session = Depends(get_db)):
     """
     logger.info(f"[API] Signin request received for username: {user_login.username}")
     try:
-        token = AuthService.authenticate_user(db, user_login)
+        token = await AuthService.authenticate_user(db, user_login)
         logger.info(f"[API] Signin successful for user: {user_login.username}")
         return token
     except HTTPException as e:
@@ -53,17 +50,61 @@ async def signin(user_login: UserLogin, db: Session = Depends(get_db)):
             detail=f"An error occurred during signin: {str(e)}"
         )
 
+@router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access token and refresh token
+    The refresh token is single use: presenting one that was already
+    exchanged revokes its whole chain, so a stolen copy stops working.
+    """
+    logger.info("[API] Token refresh request received")
+    try:
+        return await AuthService.refresh_tokens(db, request.refresh_token)
+    except HTTPException as e:
+        logger.warning(f"[API] Token refresh failed: {e.detail}")
+        raise e
+    except Exception as e:
+        logger.error(f"[API] Unexpected error during token refresh: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred during token refresh: {str(e)}"
+        )
+
+@router.post("/logout")
+async def logout(
+    request: LogoutRequest = LogoutRequest(),
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Revoke the current access token, and the refresh token if given
+    Other nodes stop accepting the access token within REVOCATION_SYNC_SECONDS.
+    """
+    logger.info(f"[API] Logout request for user: {current_user}")
+    try:
+        await AuthService.logout(db, token, request.refresh_token)
+        return {"message": "Logged out"}
+    except HTTPException as e:
+        logger.warning(f"[API] Logout failed for {current_user}: {e.detail}")
+        raise e
+    except Exception as e:
+        logger.error(f"[API] Unexpected error during logout for {current_user}: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred during logout: {str(e)}"
+        )
+
 @router.get("/users/me", response_model=UserResponse)
 async def get_user(
     db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
+    current_user: str = Depends(get_current_user)
 ):
     """
     Get current user's information based on JWT token
     """
-    current_user = AuthService.get_current_user_from_token(token)
     logger.info(f"[API] Get user request for authenticated user: {current_user}")
-    db_user = AuthService.get_user_by_username(db, current_user)
+    db_user = await run_db(db, AuthService.get_user_by_username, current_user)
     if not db_user:
         logger.warning(f"[API] User not found: {current_user}")
         raise HTTPException(
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.security import OAuth2PasswordBearer
+import math
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.db.database import get_db
+from app.db.database import get_db, run_db
+from app.db.replicas import get_read_db
 from app.schemas.device import (
     DeviceCreate, 
     DeviceResponse, 
@@ -13,20 +15,19 @@ from app.schemas.device import (
 )
 from app.services.device_service import DeviceService
 from app.services.sensor_service import SensorService
-from app.services.auth_service import AuthService
+from app.services.import_service import ImportService
+from app.services.ingest_service import IngestService
+from app.services.ingest_quota import ingest_quota
+from app.services.coalescing import sensor_queries
+from app.services.result_cache import result_cache, normalize_date, is_closed
+from app.api.deps import get_current_user
+from app.core.admission import run_admitted
 from app.core.logger import logger
+from app.core.responses import FastJSONResponse
 
-router = APIRouter()
-
-# OAuth2 scheme for token extraction
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/signin")
-
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> str:
-    return AuthService.get_current_user_from_token(token)
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
 
+router = APIRouter()
 
 # Device endpoints
 @router.get("/", response_model=List[DeviceResponse])
@@ -36,8 +37,98 @@ async def get_all_devices(
 ):
     """Get all devices with their current status"""
     logger.info(f"[API] Get all devices request by {current_user}")
-    devices = DeviceService.get_all_devices(db)
-    return devices
+    devices = await run_db(db, DeviceService.get_all_device_rows)
+    return FastJSONResponse(devices)
+
+@router.post("/import", status_code=status.HTTP_202_ACCEPTED)
+async def import_readings(
+    file: UploadFile = File(..., description="CSV, NDJSON or Parquet file of readings"),
+    format: Optional[str] = Query(default=None, description="csv, ndjson or parquet (default: from the file extension)"),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Bulk import historical sensor readings
+    
+    Each record has device_id, sensor_type, value, timestamp (ISO 8601 or
+    epoch seconds) and optionally unit; unknown devices are created. The
+    upload is stored and loaded in chunks (COPY on PostgreSQL) by a background
+    job; follow it with GET /api/v1/jobs/{job_id}.
+    """
+    logger.info(f"[API] Import request for {file.filename} by {current_user}")
+    path, fmt = await ImportService.store_upload(file, format)
+    job = ImportService.start_import_job(path, fmt)
+    return {
+        "success": True,
+        "message": f"Import of {file.filename} started (job {job.id})",
+        "job": job.to_dict()
+    }
+
+def _batch_columns(body: bytes, content_type: str) -> dict:
+    """Columns of a batch body: JSON (columnar or {"readings": [...]}) or an Arrow IPC stream"""
+    if content_type.startswith(ARROW_STREAM):
+        # pyarrow is only needed for Arrow bodies
+        import pyarrow.ipc
+        table = pyarrow.ipc.open_stream(body).read_all()
+        # Arrow columns are validated as they are
+        return {name: table.column(name) for name in table.column_names}
+    
+    data = orjson.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    readings = data.get("readings")
+    if readings is None:
+        return data
+    if not isinstance(readings, list) or not all(isinstance(item, dict) for item in readings):
+        raise ValueError("readings must be a list of objects")
+    return {name: [item.get(name) for item in readings] for name in ("device_id", "sensor_type", "value", "unit", "timestamp")}
+
+@router.post("/readings:batch")
+async def ingest_readings_batch(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Store a batch of readings from a gateway, across any number of devices
+    
+    The body is JSON, either columnar ({"device_id": [...] or "LR1",
+    "sensor_type": [...], "value": [...], "unit": ..., "timestamp": ...})
+    or {"readings": [{...}, ...]}, or an Arrow IPC stream with the same
+    columns (Content-Type: application/vnd.apache.arrow.stream). Timestamps
+    are ISO 8601 or epoch seconds and default to now.
+    
+    Valid readings are stored in one transaction; invalid or over-quota
+    ones are listed in "errors" by their index in the batch.
+    """
+    try:
+        columns = _batch_columns(await request.body(), request.headers.get("content-type", ""))
+    except (ValueError, orjson.JSONDecodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid batch: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid Arrow stream: {str(e)}")
+    
+    try:
+        result, over_quota = await run_db(db, IngestService.ingest_batch, columns)
+    except OverflowError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid batch: {str(e)}")
+    logger.info(f"[API] Batch of {result['accepted']} readings ({result['rejected']} rejected) by {current_user}")
+    
+    if over_quota is not None:
+        if not over_quota.allowed:
+            retry_after = str(max(1, math.ceil(over_quota.retry_after)))
+            if result["accepted"] == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Ingest quota exceeded",
+                    headers={"Retry-After": retry_after}
+                )
+            response.headers["Retry-After"] = retry_after
+        else:
+            response.headers["X-Ingest-Quota-Exceeded"] = over_quota.scope
+    return result
 
 @router.get("/{device_id}", response_model=DeviceResponse)
 async def get_device(
@@ -47,7 +138,7 @@ async def get_device(
 ):
     """Get a specific device by device_id"""
     logger.info(f"[API] Get device {device_id} request by {current_user}")
-    device = DeviceService.get_device_by_device_id(db, device_id)
+    device = await run_db(db, DeviceService.get_device_by_device_id, device_id)
     return device
 
 @router.post("/", response_model=DeviceResponse, status_code=status.HTTP_201_CREATED)
@@ -58,7 +149,7 @@ async def create_device(
 ):
     """Create a new device"""
     logger.info(f"[API] Create device request: {device.device_id} by {current_user}")
-    new_device = DeviceService.create_device(db, device)
+    new_device = await run_db(db, DeviceService.create_device, device)
     return new_device
 
 @router.put("/{device_id}/status", response_model=DeviceResponse)
@@ -75,20 +166,56 @@ async def update_device_status(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Status must be 'online' or 'offline'"
         )
-    device = DeviceService.update_device_status(db, device_id, status)
+    device = await run_db(db, DeviceService.update_device_status, device_id, status)
     return device
 
+@router.delete("/{device_id}", status_code=status.HTTP_202_ACCEPTED)
+async def delete_device(
+    device_id: str,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Start deleting a device and all of its data
+    
+    The device is marked "deleting" right away and its readings are purged
+    in small slices by a background job; follow it with GET /api/v1/jobs/{job_id}.
+    """
+    logger.info(f"[API] Delete device {device_id} request by {current_user}")
+    device = await run_db(db, DeviceService.mark_deleting, device_id)
+    job = DeviceService.start_delete_job(device)
+    return {
+        "success": True,
+        "message": f"Deletion of device {device_id} started (job {job.id})",
+        "job": job.to_dict()
+    }
+
 # Sensor endpoints
 @router.post("/{device_id}/sensors", response_model=SensorReadingResponse, status_code=status.HTTP_201_CREATED)
 async def create_sensor_reading(
     device_id: str,
     reading: SensorReadingCreate,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
-    """Store a new sensor reading"""
+    """
+    Store a new sensor reading
+    
+    Subject to the ingest quota: over-quota readings get 429 with Retry-After,
+    or are stored with an X-Ingest-Quota-Exceeded header when the action is "flag".
+    """
     logger.info(f"[API] Create sensor reading for {device_id}/{reading.sensor_type} by {current_user}")
-    new_reading = SensorService.create_sensor_reading(db, device_id, reading)
+    decision = ingest_quota.admit(device_id)
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Ingest quota exceeded for {decision.scope} ({device_id})",
+            headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))}
+        )
+    if decision.over_quota:
+        response.headers["X-Ingest-Quota-Exceeded"] = decision.scope
+    new_reading = await run_db(db, SensorService.create_sensor_reading, device_id, reading)
     return new_reading
 
 @router.get("/{device_id}/sensors/{sensor_type}/latest", response_model=SensorReadingResponse)
@@ -100,7 +227,7 @@ async def get_latest_sensor_reading(
 ):
     """Get the latest sensor reading for a device and sensor type"""
     logger.info(f"[API] Get latest reading for {device_id}/{sensor_type} by {current_user}")
-    reading = SensorService.get_latest_reading(db, device_id, sensor_type)
+    reading = await run_db(db, SensorService.get_latest_reading, device_id, sensor_type)
     return reading
 
 @router.get("/{device_id}/sensors/{sensor_type}/stats", response_model=SensorStats)
@@ -110,17 +237,30 @@ async def get_sensor_stats(
     hours: Optional[int] = Query(None, description="Time period in hours"),
     start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
     end_date: Optional[str] = Query(None, description="End date (ISO format)"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: str = Depends(get_current_user)
 ):
     """Get min, max, avg statistics for a sensor over a time period"""
     if start_date and end_date:
         logger.info(f"[API] Get stats for {device_id}/{sensor_type} from {start_date} to {end_date} by {current_user}")
-        stats = SensorService.get_sensor_stats_by_date_range(db, device_id, sensor_type, start_date, end_date)
+        start, end = normalize_date(start_date), normalize_date(end_date)
+        # Unparseable dates aren't cached or coalesced; the service reports them
+        key = ("stats", device_id, sensor_type, start, end) if start and end else None
+        closed = is_closed(end) if key else False
+        query = (SensorService.get_sensor_stats_by_date_range, device_id, sensor_type, start_date, end_date)
+        if key is None:
+            return await run_admitted("aggregate", db, *query)
     else:
         hours = hours or 24  # Default to 24 hours if not specified
         logger.info(f"[API] Get stats for {device_id}/{sensor_type} (last {hours} hours) by {current_user}")
-        stats = SensorService.get_sensor_stats(db, device_id, sensor_type, hours)
+        key, closed = ("stats", device_id, sensor_type, hours), False
+        query = (SensorService.get_sensor_stats, device_id, sensor_type, hours)
+
+    stats = await result_cache.get(key)
+    if stats is None:
+        stats = await sensor_queries.do(
+            key, lambda: run_admitted("aggregate", db, result_cache.compute, key, closed, device_id, *query)
+        )
     return stats
 
 @router.get("/{device_id}/sensors/{sensor_type}/timeseries", response_model=TimeSeriesResponse)
@@ -131,15 +271,22 @@ async def get_sensor_timeseries(
     start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
     end_date: Optional[str] = Query(None, description="End date (ISO format)"),
     quota_limit: Optional[int] = Query(None, description="Maximum data points to return (quota limit)"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: str = Depends(get_current_user)
 ):
     """Get time series data for graphing with optional quota limiting"""
     if start_date and end_date:
         logger.info(f"[API] Get timeseries for {device_id}/{sensor_type} from {start_date} to {end_date} (quota: {quota_limit}) by {current_user}")
-        timeseries = SensorService.get_time_series_by_date_range(db, device_id, sensor_type, start_date, end_date, quota_limit)
+        timeseries = await sensor_queries.do(
+            ("timeseries", device_id, sensor_type, start_date, end_date, quota_limit),
+            lambda: run_admitted("timeseries", db, SensorService.get_time_series_by_date_range, device_id, sensor_type, start_date, end_date, quota_limit)
+        )
     else:
         hours = hours or 24  # Default to 24 hours if not specified
         logger.info(f"[API] Get timeseries for {device_id}/{sensor_type} (last {hours} hours) by {current_user}")
-        timeseries = SensorService.get_time_series(db, device_id, sensor_type, hours)
-    return timeseries
+        timeseries = await sensor_queries.do(
+            ("timeseries", device_id, sensor_type, hours),
+            lambda: run_admitted("timeseries", db, SensorService.get_time_series, device_id, sensor_type, hours)
+        )
+    # Built from typed columns by the service, so skip response_model re-validation
+    return FastJSONResponse(timeseries)
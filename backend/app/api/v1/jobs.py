@@ -0,0 +1,59 @@
+"""
+Background Jobs API
+Progress, cancellation and resume for long-running maintenance jobs
+"""
+
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.api.deps import get_current_user
+from app.services.job_service import job_manager
+from app.core.logger import logger
+
+router = APIRouter()
+
+def _get_job_or_404(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
+        )
+    return job
+
+
+@router.get("/")
+async def list_jobs(
+    kind: Optional[str] = Query(None, description="Filter by job kind, e.g. retention"),
+    current_user: str = Depends(get_current_user)
+):
+    """List recent background jobs, newest first"""
+    logger.debug(f"[Jobs API] List jobs requested by {current_user}")
+    return [job.to_dict() for job in job_manager.list(kind)]
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, current_user: str = Depends(get_current_user)):
+    """Get a job's status and progress"""
+    return _get_job_or_404(job_id).to_dict()
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str, current_user: str = Depends(get_current_user)):
+    """Request cancellation; the job stops after its current batch"""
+    logger.info(f"[Jobs API] Cancel job {job_id} requested by {current_user}")
+    _get_job_or_404(job_id)
+    return job_manager.cancel(job_id).to_dict()
+
+
+@router.post("/{job_id}/resume", status_code=status.HTTP_202_ACCEPTED)
+async def resume_job(job_id: str, current_user: str = Depends(get_current_user)):
+    """Re-run a cancelled or failed job with its original arguments"""
+    logger.info(f"[Jobs API] Resume job {job_id} requested by {current_user}")
+    job = _get_job_or_404(job_id)
+    resumed = job_manager.resume(job_id)
+    if resumed is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job {job_id} is {job.status}; only cancelled or failed jobs can be resumed"
+        )
+    return resumed.to_dict()
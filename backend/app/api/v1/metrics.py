@@ -0,0 +1,156 @@
+"""
+Metrics API
+Live operational statistics for sizing and monitoring the backend
+"""
+
+from fastapi import APIRouter, Depends
+from app.db import database
+from app.db.replicas import replica_set
+from app.db.pool import pool_status
+from app.services.ingest_quota import ingest_quota
+from app.services.mqtt_service import mqtt_service
+from app.services.coalescing import sensor_queries
+from app.services.result_cache import result_cache
+from app.core.security import token_cache
+from app.core.passwords import password_hasher
+from app.core.revocation import revocation_list
+from app.core.rate_limit import rate_limiter
+from app.core.admission import admission_stats
+from app.api.deps import get_current_user
+from app.core.logger import logger
+
+router = APIRouter()
+
+@router.get("/db-pools")
+async def get_db_pool_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get connection pool statistics
+    
+    Per pool: size, checked in/out connections, overflow in use, and
+    checkout wait times (avg/max) and timeouts since startup.
+    Replica pools also report health and replication lag.
+    """
+    logger.debug(f"[Metrics API] DB pool stats requested by {current_user}")
+    pools = {
+        "api": pool_status(database.engine),
+        "ingest": pool_status(database.ingest_engine)
+    }
+    if database.async_engine is not None:
+        pools["api_async"] = pool_status(database.async_engine.sync_engine)
+    if replica_set is not None:
+        for index, replica in enumerate(replica_set.replicas):
+            pools[f"replica_{index}"] = {**replica.status(), **pool_status(replica.pool_engine)}
+    return pools
+
+
+@router.get("/ingest-quota")
+async def get_ingest_quota_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get ingest quota state
+    
+    Token bucket configuration and levels, devices that have exceeded their
+    quota, and accepted/rejected/sampled-out/flagged point counts per device.
+    """
+    logger.debug(f"[Metrics API] Ingest quota stats requested by {current_user}")
+    return ingest_quota.snapshot()
+
+
+@router.get("/ingest-batch")
+async def get_ingest_batch_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get MQTT batch writer statistics
+    
+    Queue depth, readings written, batches and average batch size, and
+    readings dropped (queue full) or failed since startup.
+    """
+    logger.debug(f"[Metrics API] Ingest batch stats requested by {current_user}")
+    return mqtt_service.writer.stats()
+
+
+@router.get("/auth")
+async def get_auth_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get verified-token cache statistics
+    
+    Cache size, hits, misses and hit rate, and entries dropped because
+    their token expired or to make room (LRU evictions).
+    """
+    logger.debug(f"[Metrics API] Auth stats requested by {current_user}")
+    return token_cache.stats()
+
+
+@router.get("/passwords")
+async def get_password_hashing_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get password hashing statistics
+    
+    scrypt cost, pool size, sign-ins waiting for a hashing thread, hashes and
+    verifications done, sign-ins refused because too many were waiting, and
+    the average time per hash.
+    """
+    logger.debug(f"[Metrics API] Password hashing stats requested by {current_user}")
+    return password_hasher.stats()
+
+
+@router.get("/revocation")
+async def get_revocation_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get token revocation filter statistics
+    
+    Revoked tokens in the Bloom filter, its size, tokens checked, filter hits
+    confirmed as revoked, false positives that cost a database lookup, and
+    the last sync with revocations from other nodes.
+    """
+    logger.debug(f"[Metrics API] Revocation stats requested by {current_user}")
+    return revocation_list.stats()
+
+
+@router.get("/rate-limit")
+async def get_rate_limit_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get rate limiting statistics
+    
+    Store in use (memory or redis), clients tracked, and each rule's limit,
+    window and rejected requests.
+    """
+    logger.debug(f"[Metrics API] Rate limit stats requested by {current_user}")
+    return rate_limiter.stats()
+
+
+@router.get("/admission")
+async def get_admission_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get admission control statistics per query class
+    
+    Slots in use and waiting, requests admitted, refused with a full queue or
+    after waiting too long, queries cut off by statement_timeout, and the
+    average wait for a slot.
+    """
+    logger.debug(f"[Metrics API] Admission stats requested by {current_user}")
+    return admission_stats()
+
+
+@router.get("/coalescing")
+async def get_coalescing_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get query coalescing statistics
+    
+    Queries in flight and, per query (stats, timeseries), requests served,
+    queries actually run, requests that shared an in-flight query instead,
+    and failed queries.
+    """
+    logger.debug(f"[Metrics API] Coalescing stats requested by {current_user}")
+    return sensor_queries.stats()
+
+
+@router.get("/result-cache")
+async def get_result_cache_stats(current_user: str = Depends(get_current_user)):
+    """
+    Get result cache statistics
+    
+    Store in use (memory or redis), entries and LRU evictions, and per query
+    (stats, quota_stats, database_stats) hits, misses and entries dropped as
+    outdated by new data or their TTL.
+    """
+    logger.debug(f"[Metrics API] Result cache stats requested by {current_user}")
+    return result_cache.stats()
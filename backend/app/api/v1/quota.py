@@ -3,43 +3,50 @@ Data Quota API
 Endpoints for managing and monitoring data quotas
 """
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException, status
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.db.database import get_db, run_db
+from app.db.replicas import get_read_db
 from app.services.quota_service import DataQuotaService
-from app.services.auth_service import AuthService
+from app.api.deps import get_current_user
+from app.core.admission import run_admitted
+from app.services.result_cache import result_cache, normalize_date, is_closed
 from app.schemas.quota import QuotaStatsResponse, DateRangeQuotaCheckResponse, QuotaApiResponse
 from app.core.logger import logger
-from fastapi.security import OAuth2PasswordBearer
 
 router = APIRouter()
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/signin")
-
-def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
-    return AuthService.get_current_user_from_token(token)
-
-
 @router.get("/stats", response_model=QuotaApiResponse)
 async def get_quota_stats(
     quota_limit: int = Query(25000, description="Quota limit (default: 25000 DPM)"),
     start_date: str = Query(None, description="Optional start date (ISO format)"),
     end_date: str = Query(None, description="Optional end date (ISO format)"),
+    approximate: bool = Query(False, description="Prorate partial edge hours from the histogram"),
     current_user: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get data quota statistics
     
     If start_date and end_date provided, returns stats for that date range only.
-    Otherwise, returns stats for all data.
+    Otherwise, returns stats for all data. Results are cached until new data
+    arrives; for ranges that have ended, until older data changes.
     """
     logger.info(f"[API] Quota stats requested by {current_user} (range: {start_date} to {end_date})")
     
     if start_date and end_date:
-        stats = DataQuotaService.get_quota_stats_for_range(db, start_date, end_date, quota_limit)
+        start, end = normalize_date(start_date), normalize_date(end_date)
+        # Unparseable dates aren't cached; the service reports them
+        key = ("quota_stats", quota_limit, start, end, approximate) if start and end else None
+        closed = is_closed(end) if key else False
+        query = (DataQuotaService.get_quota_stats_for_range, start_date, end_date, quota_limit, approximate)
     else:
-        stats = DataQuotaService.get_quota_stats(db, quota_limit)
+        key, closed = ("quota_stats", quota_limit), False
+        query = (DataQuotaService.get_quota_stats, quota_limit)
+    
+    stats = await result_cache.get(key)
+    if stats is None:
+        stats = await run_admitted("aggregate", db, result_cache.compute, key, closed, None, *query)
     
     return {
         "status": "success",
@@ -52,8 +59,9 @@ async def check_date_range_quota(
     start_date: str = Query(..., description="Start date (ISO format)"),
     end_date: str = Query(..., description="End date (ISO format)"),
     quota_limit: int = Query(25000, description="Quota limit (default: 25000 DPM)"),
+    approximate: bool = Query(False, description="Prorate partial edge hours from the histogram"),
     current_user: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Check if a date range would exceed the quota
@@ -65,9 +73,36 @@ async def check_date_range_quota(
         - suggested_quota: Suggested quota if exceeded
         - should_limit: Whether to limit data
         - limit_to: Number of points to limit to
+        - count_mode: "exact", or "bucket_approximate" when approximate=true
     """
     logger.info(f"[API] Date range quota check by {current_user}: {start_date} to {end_date}")
-    result = DataQuotaService.check_date_range_quota(db, start_date, end_date, quota_limit)
+    result = await run_admitted("aggregate", db, DataQuotaService.check_date_range_quota, start_date, end_date, quota_limit, approximate)
+    return {
+        "status": "success",
+        "data": result
+    }
+
+
+@router.post("/reconcile", response_model=QuotaApiResponse)
+async def reconcile_quota_counters(
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Correct drift in the data point counters and hourly histogram against sensor_readings
+    
+    Returns the number of counter rows and the drift that was corrected.
+    Checks every month; the scheduled run every QUOTA_RECONCILE_INTERVAL_SECONDS
+    only checks the latest QUOTA_RECONCILE_MONTHS.
+    """
+    logger.info(f"[API] Quota counter reconciliation requested by {current_user}")
+    try:
+        result = await run_db(db, DataQuotaService.reconcile_counters)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Counter reconciliation failed: {str(e)}"
+        )
     return {
         "status": "success",
         "data": result
@@ -3,44 +3,120 @@ Data Retention API
 Endpoints for viewing statistics and cleaning up old data
 """
 
-from fastapi import APIRouter, Depends, Query
-from fastapi.security import OAuth2PasswordBearer
+from typing import List
+from fastapi import APIRouter, Depends, Query, status
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.db.database import get_db, run_db
+from app.db.replicas import get_read_db
 from app.services.retention_service import RetentionService
-from app.services.auth_service import AuthService
+from app.services.result_cache import result_cache
+from app.schemas.retention import RetentionPolicyCreate, RetentionPolicyResponse
+from app.api.deps import get_current_user
 from app.core.logger import logger
 
 router = APIRouter()
 
-# OAuth2 scheme for token extraction
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/signin")
+@router.get("/stats")
+async def get_stats(
+    approximate: bool = Query(False, description="Serve the total from planner statistics instead of COUNT(*)"),
+    db: Session = Depends(get_read_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Get database statistics
+    
+    approximate=true avoids the full-table count; fields listed in
+    `estimated` are approximations. Cached until new data arrives.
+    """
+    logger.info(f"[Retention API] Get stats request by {current_user} (approximate={approximate})")
+    key = ("database_stats", approximate)
+    stats = await result_cache.get(key)
+    if stats is None:
+        stats = await run_db(db, result_cache.compute, key, False, None, RetentionService.get_database_stats, approximate)
+    return stats
+
+
+@router.post("/cleanup", status_code=status.HTTP_202_ACCEPTED)
+async def cleanup_old_data(
+    days: int = Query(default=30, ge=1, le=365, description="Delete data older than this many days"),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Start deleting sensor readings older than specified days
+    
+    Runs as a background job deleting in small slices; follow it with
+    GET /api/v1/jobs/{job_id}, cancel or resume it via the jobs API.
+    """
+    logger.info(f"[Retention API] Cleanup request by {current_user} for {days} days")
+    job = RetentionService.start_cleanup_job(days)
+    return {
+        "success": True,
+        "message": f"Cleanup of data older than {days} days started (job {job.id})",
+        "job": job.to_dict()
+    }
+
+
+@router.post("/apply-policies", status_code=status.HTTP_202_ACCEPTED)
+async def apply_retention_policies(current_user: str = Depends(get_current_user)):
+    """
+    Start applying retention policies in the background
+    
+    Raw readings past a channel's raw_days are rolled up hourly (unless
+    rollup_days is 0) and deleted; rollups past rollup_days are deleted.
+    Channels without a matching policy are left alone.
+    """
+    logger.info(f"[Retention API] Apply policies request by {current_user}")
+    job = RetentionService.start_policy_job()
+    return {
+        "success": True,
+        "message": f"Applying retention policies (job {job.id})",
+        "job": job.to_dict()
+    }
 
-def get_current_user(
+
+@router.get("/policies", response_model=List[RetentionPolicyResponse])
+async def list_policies(
     db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> str:
-    return AuthService.get_current_user_from_token(token)
+    current_user: str = Depends(get_current_user)
+):
+    """List retention policies"""
+    return await run_db(db, RetentionService.list_policies)
 
 
-@router.get("/stats")
-async def get_stats(
+@router.post("/policies", response_model=RetentionPolicyResponse, status_code=status.HTTP_201_CREATED)
+async def create_policy(
+    policy: RetentionPolicyCreate,
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
-    """Get database statistics"""
-    logger.info(f"[Retention API] Get stats request by {current_user}")
-    return RetentionService.get_database_stats(db)
+    """
+    Create a retention policy
+    
+    Null device_id / sensor_type / device_type match anything; the most
+    specific matching policy applies to each channel.
+    """
+    logger.info(f"[Retention API] Create policy by {current_user}: {policy.model_dump()}")
+    return await run_db(db, RetentionService.create_policy, policy)
 
 
-@router.post("/cleanup")
-async def cleanup_old_data(
-    days: int = Query(default=30, ge=1, le=365, description="Delete data older than this many days"),
+@router.put("/policies/{policy_id}", response_model=RetentionPolicyResponse)
+async def update_policy(
+    policy_id: int,
+    policy: RetentionPolicyCreate,
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
-    """Delete sensor readings older than specified days"""
-    logger.info(f"[Retention API] Cleanup request by {current_user} for {days} days")
-    result = RetentionService.cleanup_old_data(db, days)
-    logger.info(f"[Retention API] Cleanup completed by {current_user}: {result.get('deleted', 0)} records deleted")
-    return result
+    """Replace a retention policy"""
+    logger.info(f"[Retention API] Update policy {policy_id} by {current_user}")
+    return await run_db(db, RetentionService.update_policy, policy_id, policy)
+
+
+@router.delete("/policies/{policy_id}")
+async def delete_policy(
+    policy_id: int,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Delete a retention policy"""
+    logger.info(f"[Retention API] Delete policy {policy_id} by {current_user}")
+    return await run_db(db, RetentionService.delete_policy, policy_id)
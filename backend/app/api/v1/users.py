@@ -1,24 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from typing import List
-from app.db.database import get_db
+from app.db.database import get_db, run_db
 from app.schemas.user import UserResponse, UserUpdate, UserCreate
 from app.services.user_service import UserService
 from app.services.auth_service import AuthService
+from app.api.deps import get_current_user
+from app.core.passwords import password_hasher
 from app.core.logger import logger
 
 router = APIRouter()
 
 # OAuth2 scheme for token extraction from Authorization header
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/signin")
-
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> str:
-    return AuthService.get_current_user_from_token(token)
-
 @router.get("/", response_model=List[UserResponse])
 async def get_all_users(
     db: Session = Depends(get_db),
@@ -29,7 +22,7 @@ async def get_all_users(
     """
     logger.info(f"[API] Get all users request by {current_user}")
     try:
-        users = UserService.get_all_users(db)
+        users = await run_db(db, UserService.get_all_users)
         logger.info(f"[API] Retrieved {len(users)} users for {current_user}")
         return users
     except HTTPException as e:
@@ -53,8 +46,8 @@ async def create_user(
     """
     logger.info(f"[API] Create user request by {current_user} for username: {user.username}")
     try:
-        # Use AuthService to create user 
-        db_user = AuthService.create_user(db, user)
+        # Use AuthService to hash the password and create the user
+        db_user = await AuthService.register_user(db, user)
         logger.info(f"[API] User {user.username} created successfully by {current_user}")
         return db_user
     except HTTPException as e:
@@ -78,7 +71,7 @@ async def get_user_by_id(
     """
     logger.info(f"[API] Get user {user_id} request by {current_user}")
     try:
-        user = UserService.get_user_by_id(db, user_id)
+        user = await run_db(db, UserService.get_user_by_id, user_id)
         logger.info(f"[API] User {user_id} retrieved successfully by {current_user}")
         return user
     except HTTPException as e:
@@ -103,7 +96,11 @@ async def update_user(
     """
     logger.info(f"[API] Update user {user_id} request by {current_user}")
     try:
-        updated_user = UserService.update_user(db, user_id, user_update)
+        if user_update.password is not None:
+            user_update = user_update.model_copy(
+                update={"password": await password_hasher.hash(user_update.password)}
+            )
+        updated_user = await run_db(db, UserService.update_user, user_id, user_update)
         logger.info(f"[API] User {user_id} updated successfully by {current_user}")
         return updated_user
     except HTTPException as e:
@@ -128,7 +125,7 @@ async def delete_user(
     """
     logger.info(f"[API] Delete user {user_id} request by {current_user}")
     try:
-        result = UserService.delete_user(db, user_id)
+        result = await run_db(db, UserService.delete_user, user_id)
         logger.info(f"[API] User {user_id} deleted successfully by {current_user}")
         return result
     except HTTPException as e:
@@ -0,0 +1,156 @@
+"""
+Admission Control
+Concurrency limits with bounded wait queues per class of expensive endpoint,
+so a burst of long range queries can't hold every database connection while
+cheap requests like /latest time out. Admitted requests run their queries
+under a statement_timeout.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import run_db
+
+# statement_timeout (ms) for sessions beginning in the current request; None = server default
+statement_timeout_ms: ContextVar[Optional[int]] = ContextVar("statement_timeout_ms", default=None)
+
+QUERY_CANCELED = "57014"  # PostgreSQL SQLSTATE raised when statement_timeout fires
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    # run_in_threadpool and run_sync carry the request's context, so this sees the admission's timeout
+    timeout = statement_timeout_ms.get()
+    if timeout and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+def _query_canceled(error: DBAPIError) -> bool:
+    original = error.orig
+    return QUERY_CANCELED in (getattr(original, "pgcode", None), getattr(original, "sqlstate", None))
+
+
+class AdmissionLimiter:
+    """
+    At most `max_concurrent` requests of one class at a time; up to
+    `max_queue` more wait (at most `queue_timeout` seconds) and the rest
+    get 503 with Retry-After
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float, timeout_ms: int):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.timeout_ms = timeout_ms
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.canceled = 0
+        self.wait_seconds = 0.0
+
+    def _unavailable(self, reason: str) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Too many {self.name} queries in progress ({reason}), retry shortly",
+            headers={"Retry-After": str(max(1, round(self.queue_timeout)))}
+        )
+
+    async def acquire(self):
+        # Counted from our own tallies: the semaphore only reflects a waiter once its acquire task runs
+        if self.active + self.queued >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise self._unavailable("queue full")
+        started = time.perf_counter()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise self._unavailable(f"waited {self.queue_timeout:g}s")
+        finally:
+            self.queued -= 1
+        self.active += 1
+        self.admitted += 1
+        self.wait_seconds += time.perf_counter() - started
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "statement_timeouts": self.canceled,
+            "avg_wait_ms": round(self.wait_seconds / self.admitted * 1000, 2) if self.admitted else None
+        }
+
+
+limiters: Dict[str, AdmissionLimiter] = {
+    # Raw point fetches: /timeseries
+    "timeseries": AdmissionLimiter(
+        "timeseries", settings.ADMISSION_TIMESERIES_CONCURRENCY, settings.ADMISSION_TIMESERIES_QUEUE,
+        settings.ADMISSION_QUEUE_TIMEOUT_SECONDS, settings.ADMISSION_STATEMENT_TIMEOUT_MS
+    ),
+    # Aggregates over ranges: /stats, /quota/stats, /quota/check-date-range
+    "aggregate": AdmissionLimiter(
+        "aggregate", settings.ADMISSION_AGGREGATE_CONCURRENCY, settings.ADMISSION_AGGREGATE_QUEUE,
+        settings.ADMISSION_QUEUE_TIMEOUT_SECONDS, settings.ADMISSION_STATEMENT_TIMEOUT_MS
+    ),
+}
+
+
+@asynccontextmanager
+async def admitted(name: str):
+    """
+    Hold a slot of limiter `name` around a block of queries
+    Sessions that begin inside run under its statement_timeout; a query cut
+    off by the timeout is raised as 503.
+    """
+    limiter = limiters[name]
+    await limiter.acquire()
+    token = statement_timeout_ms.set(limiter.timeout_ms or None)
+    try:
+        yield
+    except DBAPIError as e:
+        if not _query_canceled(e):
+            raise
+        limiter.canceled += 1
+        logger.warning(f"[Admission] {name} query canceled after {limiter.timeout_ms} ms")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Query exceeded {limiter.timeout_ms} ms; narrow the range or set quota_limit"
+        )
+    finally:
+        statement_timeout_ms.reset(token)
+        limiter.release()
+
+
+async def run_admitted(name: str, db, fn, *args):
+    """
+    run_db under a slot of limiter `name`; inside a coalesced or cached
+    query, only the request that actually queries takes a slot
+    """
+    async with admitted(name):
+        return await run_db(db, fn, *args)
+
+
+def admission_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in limiters.items()}
@@ -4,8 +4,108 @@ from typing import Optional
 class Settings(BaseSettings):
     DATABASE_URL: str
     SECRET_KEY: str
-    ALGORITHM: str = "HS256"
+    ALGORITHM: str = "HS256"  # HS256 signs with SECRET_KEY; EdDSA or RS256 use the key ring and publish a JWKS
+    JWT_KEYS_DIR: str = "keys"  # Private signing keys (EdDSA/RS256), shared by all API nodes
+    JWT_KEY_RELOAD_SECONDS: float = 60.0  # How often nodes re-read JWT_KEYS_DIR to pick up rotations
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7  # Each refresh issues a new refresh token and revokes the old one
+    REVOCATION_BLOOM_CAPACITY: int = 100000  # Revoked tokens the in-memory filter is sized for (grows on rebuild)
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001  # Share of valid tokens that need a revoked_tokens lookup
+    REVOCATION_SYNC_SECONDS: float = 5.0  # How often nodes pull revocations made elsewhere
+    TOKEN_CACHE_SIZE: int = 10000  # Verified tokens kept in memory (LRU, until their exp); 0 disables
+    
+    # Rate limiting (sliding window; "<count>/<second|minute|hour|day>", empty disables a rule)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORAGE_URL: Optional[str] = None  # e.g. redis://localhost:6379/0 to share limits across workers; in-process when unset
+    RATE_LIMIT_TRUST_PROXY: bool = False  # Take the client IP from X-Forwarded-For; set true behind a proxy, or every client shares its IP
+    RATE_LIMIT_AUTH: str = "60/minute"  # signin, signup and refresh per IP; sized for a few users behind one NAT
+    RATE_LIMIT_HEAVY: str = "30/minute"  # timeseries, stats, quota and retention jobs per user
+    RATE_LIMIT_USER: str = "600/minute"  # Any API request per user (per IP without a token); ingest has its own quota
+    RATE_LIMIT_IP: str = "1200/minute"  # Any API request per IP
+    
+    # Admission control for expensive queries (per endpoint class; queued requests hold no connection)
+    ADMISSION_TIMESERIES_CONCURRENCY: int = 4  # /timeseries requests querying at once
+    ADMISSION_TIMESERIES_QUEUE: int = 32  # Waiting for a slot before new ones get 503
+    ADMISSION_AGGREGATE_CONCURRENCY: int = 4  # /stats and quota range requests querying at once
+    ADMISSION_AGGREGATE_QUEUE: int = 32
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0  # Longest wait for a slot before 503
+    ADMISSION_STATEMENT_TIMEOUT_MS: int = 15000  # PostgreSQL statement_timeout for admitted requests; 0 disables
+    QUERY_MAX_POINTS: int = 200000  # Timeseries ranges estimated above this return only the newest points; 0 disables
+    QUERY_MAX_SCAN_ROWS: int = 20000000  # Stats over ranges estimated above this are refused; 0 disables
+    QUERY_COALESCING_ENABLED: bool = True  # Identical concurrent stats/timeseries requests share one query
+    
+    # Result cache for /stats, /quota/stats and /retention/stats (invalidated by ingest watermarks)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_URL: str = ""  # Redis URL shared by all workers; empty = in-process cache per worker
+    RESULT_CACHE_MAX_ENTRIES: int = 10000  # LRU bound of the in-process cache
+    RESULT_CACHE_TTL_SECONDS: float = 30.0  # Open-ended ranges, also dropped on the next write to their data
+    RESULT_CACHE_CLOSED_TTL_SECONDS: float = 3600  # Closed ranges; bounds staleness from writes this process doesn't see. 0 = until history changes
+    RESULT_CACHE_SETTLE_SECONDS: int = 300  # Ranges ending longer ago than this are closed
+    
+    # Password hashing (scrypt on a dedicated thread pool)
+    PASSWORD_SCRYPT_N: int = 16384  # CPU/memory cost, a power of two; older hashes are upgraded at sign-in
+    PASSWORD_SCRYPT_R: int = 8  # Block size
+    PASSWORD_SCRYPT_P: int = 1  # Parallelism
+    PASSWORD_HASH_WORKERS: int = 4  # Hashes computed at once
+    PASSWORD_HASH_MAX_PENDING: int = 64  # Sign-ins waiting for a worker before new ones get 503; 0 disables
+    
+    # Async database sessions (SQLAlchemy AsyncSession with asyncpg)
+    DB_ASYNC: bool = False
+    ASYNC_DATABASE_URL: Optional[str] = None  # Derived from DATABASE_URL when not set
+    
+    # Connection pools (API requests and MQTT ingest use separate pools)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+    INGEST_DB_POOL_SIZE: int = 2
+    INGEST_DB_MAX_OVERFLOW: int = 3
+    
+    # Read replicas for heavy read-only endpoints (comma-separated URLs, empty = primary only)
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_MAX_LAG_SECONDS: float = 10.0  # Replicas lagging more than this are skipped
+    REPLICA_CHECK_INTERVAL: float = 5.0  # Seconds between replica lag checks
+    
+    # Quota counters are rebuilt from sensor_readings on this interval (0 = disabled)
+    QUOTA_RECONCILE_INTERVAL_SECONDS: int = 86400
+    QUOTA_RECONCILE_MONTHS: int = 2  # Scheduled runs check the latest N months (0 = all); POST /quota/reconcile checks all
+    
+    # Ingest-time quota (in-memory token buckets, data points per second)
+    INGEST_QUOTA_ENABLED: bool = True
+    INGEST_DEVICE_RATE: float = 10.0
+    INGEST_DEVICE_BURST: int = 100
+    INGEST_GLOBAL_RATE: float = 500.0
+    INGEST_GLOBAL_BURST: int = 10000  # Fits one full readings:batch request (INGEST_BATCH_MAX_ITEMS)
+    INGEST_QUOTA_ACTION: str = "flag"  # reject | sample | flag; flag stores everything, so measure before rejecting
+    INGEST_SAMPLE_KEEP_ONE_IN: int = 10  # With "sample", keep 1 in N over-quota points per device
+    INGEST_QUOTA_MAX_DEVICES: int = 10000  # Devices tracked; the least recently seen is dropped beyond this
+    INGEST_QUOTA_IDLE_SECONDS: float = 3600.0  # Devices idle this long are dropped (and their counters reset)
+    
+    # Batched ingest: MQTT readings are written in micro-batches; gateways can POST batches
+    INGEST_BATCH_MAX_ROWS: int = 500  # MQTT readings per transaction
+    INGEST_BATCH_MAX_DELAY_MS: int = 200  # Longest an MQTT reading waits before it is written
+    INGEST_BATCH_QUEUE_SIZE: int = 50000  # MQTT readings buffered before new ones are dropped
+    INGEST_BATCH_MAX_ITEMS: int = 10000  # Readings per POST /devices/readings:batch request
+    
+    # Retention (deletes run in slices; policies roll raw data up hourly before deleting it)
+    RETENTION_ENABLED: bool = False  # Scheduled policy runs; manual cleanup works either way
+    RETENTION_DAYS: int = 30
+    RETENTION_INTERVAL_SECONDS: int = 86400
+    RETENTION_BATCH_SIZE: int = 5000
+    RETENTION_BATCH_SLEEP_SECONDS: float = 0.5  # Pause after each RETENTION_BATCH_SIZE rows
+    RETENTION_ROLLUP_WINDOW_HOURS: int = 1  # Most hours of one channel rolled up and deleted per transaction (and at most RETENTION_BATCH_SIZE rows)
+    
+    # Parquet cold tier: readings are archived here before retention deletes them (requires pyarrow)
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_WORKERS: int = 4  # Writer processes
+    ARCHIVE_COMPRESSION: str = "zstd"
+    
+    # Bulk import of historical readings (COPY on PostgreSQL; CSV, NDJSON or Parquet)
+    IMPORT_CHUNK_SIZE: int = 10000  # Rows per COPY and commit; bounds memory regardless of file size
+    IMPORT_DIR: str = "imports"  # Uploaded files wait here until their import job finishes
+    IMPORT_MAX_ERRORS: int = 100  # Invalid rows reported per import (all invalid rows are skipped)
     
     # MQTT Configuration
     MQTT_BROKER: str = "broker.hivemq.com"
@@ -0,0 +1,199 @@
+"""
+Signing Keys
+Key ring for asymmetric JWT signing (EdDSA or RS256) with rotation
+The newest key signs; older keys keep verifying until the tokens they signed
+have expired. Public keys are published as a JWKS, so other services can
+verify tokens locally with cached keys instead of calling this API.
+"""
+
+import os
+import secrets
+import threading
+import time
+from typing import Dict, List, Optional
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from app.core.config import settings
+from app.core.logger import logger
+
+ASYMMETRIC_ALGORITHMS = ("EdDSA", "RS256")
+
+
+def uses_key_ring() -> bool:
+    return settings.ALGORITHM in ASYMMETRIC_ALGORITHMS
+
+
+def _generate_private_key(algorithm: str):
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    raise ValueError(f"Unsupported signing algorithm: {algorithm}")
+
+
+class SigningKey:
+    __slots__ = ("kid", "created_at", "private_key", "public_key")
+
+    def __init__(self, kid: str, created_at: int, private_key):
+        self.kid = kid
+        self.created_at = created_at
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+
+
+class KeyRing:
+    """
+    Private keys stored as <created_at>-<kid>.pem in `directory`
+    Nodes sharing the directory pick up a rotation on their next reload:
+    periodically, or at once when a token carries an unknown kid.
+    """
+
+    def __init__(self, directory: str, algorithm: str, reload_interval: float):
+        self.directory = directory
+        self.algorithm = algorithm
+        self.reload_interval = reload_interval
+        self._keys: Dict[str, SigningKey] = {}
+        self._active: Optional[SigningKey] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.rotations = 0
+
+    @staticmethod
+    def retire_after() -> int:
+        """Seconds a superseded key keeps verifying: the longest token lifetime"""
+        return max(settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60, settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+
+    def _write(self, key: SigningKey):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{key.created_at}-{key.kid}.pem")
+        pem = key.private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        )
+        tmp_path = path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        os.replace(tmp_path, path)
+
+    def _read(self) -> List[SigningKey]:
+        keys = []
+        if not os.path.isdir(self.directory):
+            return keys
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            created_at, _, kid = stem.partition("-")
+            if ext != ".pem" or not created_at.isdigit() or not kid:
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    private_key = serialization.load_pem_private_key(f.read(), password=None)
+            except (OSError, ValueError) as e:
+                logger.error(f"[Keys] Skipping unreadable key {name}: {str(e)}")
+                continue
+            keys.append(SigningKey(kid, int(created_at), private_key))
+        keys.sort(key=lambda key: key.created_at)
+        return keys
+
+    def _retire(self, keys: List[SigningKey]) -> List[SigningKey]:
+        """Drop keys superseded longer ago than any token they signed can live"""
+        now = time.time()
+        kept = []
+        for key, successor in zip(keys, keys[1:] + [None]):
+            if successor is not None and successor.created_at + self.retire_after() < now:
+                try:
+                    os.remove(os.path.join(self.directory, f"{key.created_at}-{key.kid}.pem"))
+                    logger.info(f"[Keys] Retired signing key {key.kid}")
+                except OSError:
+                    pass
+                continue
+            kept.append(key)
+        return kept
+
+    def _load(self):
+        keys = self._read()
+        if not keys:
+            key = SigningKey(secrets.token_hex(8), int(time.time()), _generate_private_key(self.algorithm))
+            self._write(key)
+            logger.info(f"[Keys] Generated {self.algorithm} signing key {key.kid}")
+            keys = [key]
+        keys = self._retire(keys)
+        self._keys = {key.kid: key for key in keys}
+        self._active = keys[-1]
+        self._loaded_at = time.monotonic()
+
+    def reload(self):
+        with self._lock:
+            self._load()
+
+    def signing_key(self) -> SigningKey:
+        with self._lock:
+            if self._active is None or time.monotonic() - self._loaded_at >= self.reload_interval:
+                self._load()
+            return self._active
+
+    def verification_key(self, kid: Optional[str]):
+        """Public key for a token's kid, or None when it isn't (or no longer) in the ring"""
+        with self._lock:
+            since_load = time.monotonic() - self._loaded_at
+            key = self._keys.get(kid)
+            # Another node may have rotated; re-read the directory, at most once a second
+            if since_load >= self.reload_interval or (key is None and kid and since_load >= 1.0):
+                self._load()
+                key = self._keys.get(kid)
+            return key.public_key if key is not None else None
+
+    def has_key(self, kid: Optional[str]) -> bool:
+        """Whether kid is still in the ring, as of the last periodic reload"""
+        with self._lock:
+            if time.monotonic() - self._loaded_at >= self.reload_interval:
+                self._load()
+            return kid in self._keys
+
+    def rotate(self, retire_previous: bool = False) -> SigningKey:
+        """
+        Make a new key the signing key
+        Older keys keep verifying until retired, or stop at once with
+        retire_previous (a compromised key), invalidating their tokens.
+        """
+        with self._lock:
+            # Keys are ordered by creation second; keep a rotation within the same second newest
+            created_at = max(int(time.time()), self._active.created_at + 1 if self._active else 0)
+            key = SigningKey(secrets.token_hex(8), created_at, _generate_private_key(self.algorithm))
+            self._write(key)
+            if retire_previous:
+                for old in self._read():
+                    if old.kid != key.kid:
+                        os.remove(os.path.join(self.directory, f"{old.created_at}-{old.kid}.pem"))
+            self._load()
+            self.rotations += 1
+        logger.info(f"[Keys] Rotated to {self.algorithm} signing key {key.kid}" + (", previous keys retired" if retire_previous else ""))
+        return key
+
+    def jwks(self) -> dict:
+        """Public keys as a JSON Web Key Set"""
+        with self._lock:
+            if self._active is None:
+                self._load()
+            keys = list(self._keys.values())
+        algorithm = jwt.get_algorithm_by_name(self.algorithm)
+        return {
+            "keys": [
+                {**algorithm.to_jwk(key.public_key, as_dict=True), "kid": key.kid, "use": "sig", "alg": self.algorithm}
+                for key in reversed(keys)
+            ]
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "algorithm": self.algorithm,
+                "active_kid": self._active.kid if self._active else None,
+                "kids": list(self._keys),
+                "rotations": self.rotations
+            }
+
+
+key_ring = KeyRing(settings.JWT_KEYS_DIR, settings.ALGORITHM, settings.JWT_KEY_RELOAD_SECONDS)
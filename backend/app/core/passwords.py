@@ -0,0 +1,168 @@
+"""
+Password Hashing
+scrypt password hashes computed on a dedicated, bounded thread pool, so
+sign-ins don't block the event loop or starve the database threadpool
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from app.core.config import settings
+
+SCHEME = "scrypt"
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int, length: int = HASH_BYTES) -> bytes:
+    # hashlib.scrypt releases the GIL, so pool threads hash in parallel
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=length
+    )
+
+
+def current_params() -> Tuple[int, int, int]:
+    return settings.PASSWORD_SCRYPT_N, settings.PASSWORD_SCRYPT_R, settings.PASSWORD_SCRYPT_P
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(SCHEME + "$")
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash a password with the configured scrypt cost
+    Format: scrypt$n$r$p$salt$hash (base64), so the cost can change later.
+    """
+    n, r, p = current_params()
+    salt = os.urandom(SALT_BYTES)
+    return f"{SCHEME}${n}${r}${p}${_b64encode(salt)}${_b64encode(_scrypt(password, salt, n, r, p))}"
+
+
+def verify_password(password: str, stored: str) -> Tuple[bool, bool]:
+    """
+    Check a password against a stored hash in constant time
+    Legacy rows hold the plaintext password; they match like before but
+    always need a rehash, as do hashes made with an outdated cost.
+
+    Returns:
+        (matches, needs_rehash)
+    """
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    try:
+        _, n, r, p, salt, expected = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        salt, expected = _b64decode(salt), _b64decode(expected)
+        # Malformed parameters (n not a power of two, too much memory) raise here too
+        derived = _scrypt(password, salt, n, r, p, len(expected))
+    except (ValueError, OverflowError):
+        return False, False
+    matches = hmac.compare_digest(derived, expected)
+    return matches, matches and (n, r, p) != current_params()
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on its own thread pool
+    At most `workers` hashes run at once; when `max_pending` sign-ins are
+    already waiting, new ones get 503 instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._dummy_hash: Optional[str] = None
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.busy_seconds += elapsed
+
+    async def _run(self, fn, *args):
+        # Only touched from the event loop, so the counter needs no lock
+        if self.max_pending > 0 and self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-ins in progress, retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), self._timed, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        stored = await self._run(hash_password, password)
+        self.hashed += 1
+        return stored
+
+    async def verify(self, password: str, stored: str) -> Tuple[bool, bool]:
+        result = await self._run(verify_password, password, stored)
+        self.verified += 1
+        return result
+
+    async def verify_dummy(self, password: str):
+        """Spend a verification on an unknown user, so response time doesn't reveal which usernames exist"""
+        if self._dummy_hash is None:
+            self._dummy_hash = await self._run(hash_password, "")
+        await self.verify(password, self._dummy_hash)
+
+    def stats(self) -> dict:
+        n, r, p = current_params()
+        operations = self.hashed + self.verified
+        return {
+            "scheme": SCHEME,
+            "cost": {"n": n, "r": r, "p": p},
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "avg_ms": round(self.busy_seconds / operations * 1000, 2) if operations else None
+        }
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,327 @@
+"""
+Rate Limiting
+Sliding-window request limits per IP, per user and per route class, applied
+by an ASGI middleware before requests reach the routes. Counters live in
+process memory, or in Redis so every worker shares them.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.security import token_cache, verify_token
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str) -> Optional[Tuple[int, int]]:
+    """'30/minute' -> (30, 60); an empty rate disables the limit"""
+    if not rate:
+        return None
+    count, _, period = rate.partition("/")
+    period = period.strip().rstrip("s") or "second"
+    if period not in _PERIODS:
+        raise ValueError(f"Invalid rate {rate!r}, expected e.g. 30/minute")
+    return int(count), _PERIODS[period]
+
+
+def sliding_window(previous: int, current: int, elapsed: float, limit: int, window: int) -> Tuple[bool, float]:
+    """
+    Sliding-window counter: the previous window's count weighted by how much
+    of it still overlaps the last `window` seconds, plus the current count
+
+    Returns:
+        (whether one more request fits, seconds until it would)
+    """
+    if previous * (1 - elapsed / window) + current + 1 <= limit:
+        return True, 0.0
+    if current + 1 <= limit:
+        # Wait until enough of the previous window has slid out
+        return False, window * (1 - (limit - 1 - current) / previous) - elapsed
+    # The current window alone is full: wait for it to become the previous one
+    wait = window - elapsed
+    if current > 0:
+        wait += max(0.0, window * (1 - (limit - 1) / current))
+    return False, wait
+
+
+class MemoryRateLimitStore:
+    """
+    Counters in this process; each worker enforces its own limits
+    Beyond `max_keys`, keys whose windows have passed are dropped, then the
+    least recently seen.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> [window index, current count, previous count, expires at], least recently seen first
+        self._windows: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str, limit: int, window: int) -> Tuple[bool, float, int]:
+        now = time.time()
+        index = int(now // window)
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or entry[0] < index - 1:
+                entry = [index, 0, 0, 0.0]
+            elif entry[0] == index - 1:
+                entry = [index, 0, entry[1], 0.0]
+            # Once the next window has passed too, the counts no longer matter
+            entry[3] = (index + 2) * window
+            self._windows[key] = entry
+            self._windows.move_to_end(key)
+            allowed, retry_after = sliding_window(entry[2], entry[1], now - index * window, limit, window)
+            if allowed:
+                entry[1] += 1
+            if len(self._windows) > self.max_keys:
+                self._prune(now)
+            remaining = max(0, math.floor(limit - entry[2] * (1 - (now - index * window) / window) - entry[1]))
+        return allowed, retry_after, remaining
+
+    async def refund(self, key: str, window: int):
+        """Take back a request counted by hit(), e.g. one another rule rejected"""
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is not None and entry[1] > 0:
+                entry[1] -= 1
+
+    def _prune(self, now: float):
+        # Drop expired keys, then the least recently seen down to 90% so the scan isn't repeated every request
+        for key in [key for key, entry in self._windows.items() if entry[3] <= now]:
+            del self._windows[key]
+        while len(self._windows) > self.max_keys * 0.9:
+            self._windows.popitem(last=False)
+
+    def size(self) -> int:
+        return len(self._windows)
+
+
+class RedisRateLimitStore:
+    """Counters in Redis, shared by every worker and node"""
+
+    # Read both windows and count the request in one round trip, atomically
+    _SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local elapsed = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+if previous * (1 - elapsed / window) + current + 1 <= limit then
+    current = redis.call('INCR', KEYS[1])
+    redis.call('EXPIRE', KEYS[1], window * 2)
+    return {1, current, previous}
+end
+return {0, current, previous}
+"""
+    _REFUND = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') > 0 then
+    redis.call('DECR', KEYS[1])
+end
+"""
+
+    def __init__(self, url: str):
+        # redis is only imported when RATE_LIMIT_STORAGE_URL is set
+        import redis.asyncio
+
+        self._client = redis.asyncio.from_url(url)
+        self._script = self._client.register_script(self._SCRIPT)
+        self._refund = self._client.register_script(self._REFUND)
+
+    async def hit(self, key: str, limit: int, window: int) -> Tuple[bool, float, int]:
+        now = time.time()
+        index = int(now // window)
+        elapsed = now - index * window
+        allowed, current, previous = await self._script(
+            keys=[f"ratelimit:{key}:{index}", f"ratelimit:{key}:{index - 1}"],
+            args=[elapsed, limit, window]
+        )
+        retry_after = 0.0 if allowed else sliding_window(previous, current, elapsed, limit, window)[1]
+        remaining = max(0, math.floor(limit - previous * (1 - elapsed / window) - current))
+        return bool(allowed), retry_after, remaining
+
+    async def refund(self, key: str, window: int):
+        index = int(time.time() // window)
+        await self._refund(keys=[f"ratelimit:{key}:{index}"])
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class RateLimitRule:
+    """
+    A limit for requests matching `methods` and `path` (regex)
+    scope "ip" counts per client IP, "user" per token subject (per IP
+    without a valid token).
+    """
+
+    def __init__(self, name: str, rate: str, scope: str, path: str = r"/api/", methods: Optional[Tuple[str, ...]] = None):
+        self.name = name
+        self.limit, self.window = parse_rate(rate)
+        self.scope = scope
+        self.path = re.compile(path)
+        self.methods = methods
+        self.rejected = 0
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.methods is None or method in self.methods) and self.path.match(path) is not None
+
+
+def default_rules() -> List[RateLimitRule]:
+    """Rules from settings; a rule with an empty rate is left out"""
+    rules = [
+        # Sign-in is deliberately slow (password hashing); stop guessing and signup floods per IP
+        ("auth", settings.RATE_LIMIT_AUTH, "ip", r"/api/v1/auth/(signin|signup|refresh)$", ("POST",)),
+        # Range scans and maintenance jobs
+        ("heavy", settings.RATE_LIMIT_HEAVY, "user",
+         r"/api/v1/(devices/[^/]+/sensors/[^/]+/(timeseries|stats)|quota/(stats|check-date-range|reconcile)"
+         r"|retention/(cleanup|apply-policies)|devices/import)$", None),
+        # Everything else under /api, except ingest, which has its own per-device quota
+        ("user", settings.RATE_LIMIT_USER, "user", r"/api/(?!v1/devices/(readings:batch$|[^/]+/sensors$))", None),
+        ("ip", settings.RATE_LIMIT_IP, "ip", r"/api/", None),
+    ]
+    return [RateLimitRule(*rule) for rule in rules if rule[1]]
+
+
+class RateLimitMiddleware:
+    """
+    Rejects requests over any matching rule with 429 and Retry-After
+    Allowed requests get X-RateLimit-Limit/Remaining for their tightest rule.
+    A rejected request is taken back from the rules that had counted it.
+    If the shared store fails, requests are let through rather than refused.
+    """
+
+    def __init__(self, app, store=None, rules: Optional[List[RateLimitRule]] = None):
+        self.app = app
+        if store is None:
+            store = RedisRateLimitStore(settings.RATE_LIMIT_STORAGE_URL) if settings.RATE_LIMIT_STORAGE_URL else MemoryRateLimitStore()
+        self.store = store
+        self.rules = default_rules() if rules is None else rules
+        self.store_errors = 0
+        self._warned_proxy = False
+        rate_limiter.middleware = self
+
+    def _client_ip(self, scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                if settings.RATE_LIMIT_TRUST_PROXY:
+                    return value.decode("latin-1").split(",")[0].strip()
+                if not self._warned_proxy:
+                    self._warned_proxy = True
+                    logger.warning("[RateLimit] Requests carry X-Forwarded-For but RATE_LIMIT_TRUST_PROXY is off: "
+                                   "per-IP limits apply to the proxy's address, shared by all its clients")
+                break
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    async def _user(scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    # Usually a cache hit; verifying a new token can be slow (RSA), so not on the event loop
+                    payload = token_cache.get(token)
+                    if payload is None:
+                        payload = await run_in_threadpool(verify_token, token)
+                    return payload.get("sub") if payload else None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method, path = scope["method"], scope["path"]
+        rules = [rule for rule in self.rules if rule.matches(method, path)]
+        if not rules:
+            return await self.app(scope, receive, send)
+
+        ip = self._client_ip(scope)
+        user = await self._user(scope) if any(rule.scope == "user" for rule in rules) else None
+        tightest = None
+        counted = []
+        for rule in rules:
+            key = f"{rule.name}:user:{user}" if rule.scope == "user" and user else f"{rule.name}:ip:{ip}"
+            try:
+                allowed, retry_after, remaining = await self.store.hit(key, rule.limit, rule.window)
+            except Exception as e:
+                self.store_errors += 1
+                logger.error(f"[RateLimit] Store error, allowing request: {str(e)}")
+                continue
+            if not allowed:
+                rule.rejected += 1
+                logger.warning(f"[RateLimit] {method} {path} rejected by rule {rule.name} for {key.split(':', 1)[1]}")
+                await self._refund(counted)
+                return await self._reject(send, rule, retry_after)
+            counted.append((key, rule.window))
+            if tightest is None or remaining < tightest[1]:
+                tightest = (rule, remaining)
+
+        if tightest is None:
+            return await self.app(scope, receive, send)
+        limit_headers = [
+            (b"x-ratelimit-limit", str(tightest[0].limit).encode()),
+            (b"x-ratelimit-remaining", str(tightest[1]).encode())
+        ]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + limit_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    async def _refund(self, counted: List[Tuple[str, int]]):
+        for key, window in counted:
+            try:
+                await self.store.refund(key, window)
+            except Exception as e:
+                self.store_errors += 1
+                logger.error(f"[RateLimit] Store error refunding {key}: {str(e)}")
+
+    @staticmethod
+    async def _reject(send, rule: RateLimitRule, retry_after: float):
+        retry_after = max(1, math.ceil(retry_after))
+        body = orjson.dumps({"detail": f"Rate limit exceeded ({rule.limit} requests per {rule.window}s), retry in {retry_after}s"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+                (b"x-ratelimit-limit", str(rule.limit).encode()),
+                (b"x-ratelimit-remaining", b"0")
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class _RateLimiterState:
+    """Handle on the installed middleware, for the metrics endpoint"""
+
+    def __init__(self):
+        self.middleware: Optional[RateLimitMiddleware] = None
+
+    def stats(self) -> dict:
+        middleware = self.middleware
+        if middleware is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "store": "redis" if isinstance(middleware.store, RedisRateLimitStore) else "memory",
+            "tracked_keys": middleware.store.size(),
+            "store_errors": middleware.store_errors,
+            "rules": [
+                {"name": rule.name, "scope": rule.scope, "limit": rule.limit, "window_seconds": rule.window, "rejected": rule.rejected}
+                for rule in middleware.rules
+            ]
+        }
+
+
+rate_limiter = _RateLimiterState()
@@ -0,0 +1,40 @@
+"""
+Fast JSON Responses
+orjson-based response class used as the application's default response
+"""
+
+from datetime import date, datetime, time, timezone
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def format_datetime(value: datetime) -> str:
+    """Format a datetime as UTC ISO 8601 with millisecond precision, e.g. 2026-01-02T03:04:05.678Z"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="milliseconds") + "Z"
+
+
+def _default(obj: Any) -> Any:
+    """orjson fallback for types it does not serialize natively"""
+    if isinstance(obj, datetime):
+        return format_datetime(obj)
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson
+
+    Datetimes are passed through to format_datetime so output matches the
+    `...Z` millisecond format of the pydantic schemas. Routes that return
+    large lists can hand their data to this class directly, skipping
+    response_model re-validation.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
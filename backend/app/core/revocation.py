@@ -0,0 +1,172 @@
+"""
+Token Revocation
+Revoked token ids (jti) live in the revoked_tokens table; each node keeps a
+Bloom filter of them, so checking a token costs a few hashes in memory and
+only a filter hit (a revoked token or a rare false positive) reads the table
+"""
+
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.user import RevokedToken
+
+
+class BloomFilter:
+    """Bit array with k hash positions per item; no false negatives"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: two 64-bit halves of one digest give all k positions
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """
+    Bloom filter of revoked jtis, confirmed against revoked_tokens on a hit
+    Revocations made on other nodes arrive with the periodic sync.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, confirmed_size: int = 10000):
+        self.error_rate = error_rate
+        self._filter = BloomFilter(capacity, error_rate)
+        self._confirmed: "OrderedDict[str, bool]" = OrderedDict()
+        self._confirmed_size = confirmed_size
+        self._lock = threading.Lock()
+        self._synced_to: Optional[datetime] = None
+        self._rebuilt_at = 0.0
+        self.checks = 0
+        self.filter_hits = 0
+        self.false_positives = 0
+        self.revoked_hits = 0
+
+    def add(self, jti: str):
+        with self._lock:
+            if not (self._confirmed.get(jti) and jti in self._filter):
+                self._filter.add(jti)
+            self._remember(jti, True)
+
+    def _remember(self, jti: str, revoked: bool):
+        self._confirmed[jti] = revoked
+        self._confirmed.move_to_end(jti)
+        while len(self._confirmed) > self._confirmed_size:
+            self._confirmed.popitem(last=False)
+
+    def might_be_revoked(self, jti: Optional[str]) -> bool:
+        """False means certainly not revoked; True needs is_revoked"""
+        if not jti:
+            return False
+        with self._lock:
+            self.checks += 1
+            if jti not in self._filter:
+                return False
+            self.filter_hits += 1
+            return True
+
+    def is_revoked(self, db: Session, jti: str) -> bool:
+        """Exact check of a filter hit, remembered so repeat hits skip the table"""
+        with self._lock:
+            known = self._confirmed.get(jti)
+        if known is None:
+            known = db.execute(select(RevokedToken.jti).where(RevokedToken.jti == jti)).first() is not None
+            with self._lock:
+                self._remember(jti, known)
+        with self._lock:
+            if known:
+                self.revoked_hits += 1
+            else:
+                self.false_positives += 1
+        return known
+
+    def rebuild(self, db: Session):
+        """Reload the filter from revoked_tokens, dropping expired entries"""
+        now = datetime.utcnow()
+        db.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+        db.commit()
+        jtis = db.execute(select(RevokedToken.jti)).scalars().all()
+        # Room to grow, so the false-positive rate holds until the next rebuild
+        bloom = BloomFilter(max(settings.REVOCATION_BLOOM_CAPACITY, 2 * len(jtis)), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            # Keep revocations made while the table was being read
+            for jti, revoked in self._confirmed.items():
+                if revoked and jti not in bloom:
+                    bloom.add(jti)
+            self._filter = bloom
+            self._confirmed = OrderedDict((jti, True) for jti, revoked in self._confirmed.items() if revoked)
+            self._synced_to = now
+            self._rebuilt_at = time.monotonic()
+        logger.info(f"[Revocation] Filter rebuilt with {len(jtis)} revoked tokens")
+
+    def sync(self, db: Session):
+        """Add tokens revoked since the last sync (e.g. on other nodes); rebuild hourly"""
+        if self._synced_to is None or time.monotonic() - self._rebuilt_at >= 3600:
+            self.rebuild(db)
+            return
+        now = datetime.utcnow()
+        # Overlap the window so rows committed late or stamped by a skewed clock aren't missed
+        since = self._synced_to - timedelta(seconds=max(settings.REVOCATION_SYNC_SECONDS * 2, 10))
+        jtis = db.execute(select(RevokedToken.jti).where(RevokedToken.revoked_at >= since)).scalars().all()
+        db.commit()
+        for jti in jtis:
+            self.add(jti)
+        self._synced_to = now
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "revoked": self._filter.count,
+                "capacity": self._filter.capacity,
+                "filter_bytes": len(self._filter._bits),
+                "hashes": self._filter.hashes,
+                "error_rate": self.error_rate,
+                "checks": self.checks,
+                "filter_hits": self.filter_hits,
+                "revoked_hits": self.revoked_hits,
+                "false_positives": self.false_positives,
+                "last_sync": self._synced_to.isoformat() if self._synced_to else None
+            }
+
+
+revocation_list = RevocationList(settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_BLOOM_ERROR_RATE)
+
+
+async def run_revocation_sync(session_factory, interval_seconds: float):
+    """Background task: pull new revocations into the filter every `interval_seconds` until cancelled"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        db = session_factory()
+        try:
+            await run_in_threadpool(revocation_list.sync, db)
+        except Exception as e:
+            logger.error(f"[Revocation] Sync failed: {str(e)}")
+        finally:
+            await run_in_threadpool(db.close)
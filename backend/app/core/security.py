@@ -1,11 +1,111 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
 from app.core.config import settings
+from app.core.keys import key_ring, uses_key_ring
+
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of verified token payloads, keyed by the token's SHA-256
+    Entries are dropped at the token's exp, so a cached token is never
+    accepted for longer than jwt.decode would accept it. Only successfully
+    verified tokens are cached. With a key ring, an entry is also dropped
+    once its signing key has been retired.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        if self.max_size <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, expires_at, kid = entry
+            if expires_at is not None and time.time() >= expires_at:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            if kid is not None and not key_ring.has_key(kid):
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(payload)
+
+    def put(self, token: str, payload: dict, kid: Optional[str] = None):
+        if self.max_size <= 0:
+            return
+        key = self._key(token)
+        expires_at = payload.get("exp")
+        with self._lock:
+            self._entries[key] = (dict(payload), expires_at, kid)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, token: str):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.max_size > 0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "expired": self.expired,
+                "evictions": self.evictions
+            }
+
+
+token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_SIZE)
+
+
+def _encode(payload: dict) -> str:
+    if uses_key_ring():
+        signing_key = key_ring.signing_key()
+        return jwt.encode(payload, signing_key.private_key, algorithm=settings.ALGORITHM, headers={"kid": signing_key.kid})
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """
     Create a JWT access token
+    Carries a unique jti so it can be revoked.
     """
     to_encode = data.copy()
     if expires_delta:
@@ -13,24 +113,45 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16), "type": ACCESS_TOKEN})
+    return _encode(to_encode)
+
+def create_refresh_token(username: str, family: Optional[str] = None) -> str:
+    """
+    Create a refresh token
+    family links the chain of tokens produced by rotating one sign-in's refresh
+    token, so reuse of a rotated token can revoke the whole chain.
+    """
+    return _encode({
+        "sub": username,
+        "exp": datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        "jti": secrets.token_urlsafe(16),
+        "fam": family or secrets.token_urlsafe(16),
+        "type": REFRESH_TOKEN
+    })
 
 def verify_token(token: str):
     """
     Verify and decode a JWT token
+    With EdDSA/RS256 the key is picked from the key ring by the token's kid.
+    Repeat verifications of the same token are answered from token_cache.
     """
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        kid = None
+        if uses_key_ring():
+            kid = jwt.get_unverified_header(token).get("kid")
+            key = key_ring.verification_key(kid)
+            if key is None:
+                return None
+        else:
+            key = settings.SECRET_KEY
+        payload = jwt.decode(token, key, algorithms=[settings.ALGORITHM])
+        token_cache.put(token, payload, kid)
         return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
-
-def verify_password(plain_password: str, storedpassword: str) -> bool:
-    """
-    Verify password
-    """
-    return plain_password == storedpassword
@@ -0,0 +1,60 @@
+"""
+Bulk Inserts
+Load many rows in one round trip: PostgreSQL COPY through psycopg2,
+falling back to an executemany INSERT on other drivers and databases
+"""
+
+import csv
+import io
+from datetime import datetime
+from typing import List, Sequence
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+
+def _copy_cursor(db: Session):
+    """A psycopg2 cursor on the session's connection, or None when COPY isn't available"""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    cursor = db.connection().connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        cursor.close()
+        return None
+    return cursor
+
+
+def _csv_value(value):
+    if value is None:
+        return ""  # Unquoted empty fields are NULL in COPY's csv format
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def bulk_insert(db: Session, table, columns: Sequence[str], rows: List[tuple]) -> int:
+    """
+    Insert `rows` (tuples ordered like `columns`) into `table` within the
+    session's transaction; the caller commits
+    None is written as NULL. Returns the number of rows inserted.
+    """
+    if not rows:
+        return 0
+
+    cursor = _copy_cursor(db)
+    if cursor is None:
+        db.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+        return len(rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+    buffer.seek(0)
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+    return len(rows)
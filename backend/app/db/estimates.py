@@ -0,0 +1,61 @@
+"""
+Row Count Estimates
+Cheap table size estimates from PostgreSQL planner statistics or TimescaleDB,
+for dashboards that don't need an exact COUNT(*)
+"""
+
+from typing import Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.logger import logger
+
+SOURCE_TIMESCALE = "timescale_approximate_row_count"
+SOURCE_PLANNER = "pg_class_reltuples"
+
+
+def _timescale_estimate(db: Session, table_name: str) -> Optional[int]:
+    """approximate_row_count() for hypertables; None when TimescaleDB or the hypertable is absent"""
+    has_timescale = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")).first()
+    if has_timescale is None:
+        return None
+    has_hypertable = db.execute(
+        text("SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = :table_name"),
+        {"table_name": table_name}
+    ).first()
+    if has_hypertable is None:
+        return None
+    return db.execute(text("SELECT approximate_row_count(:table_name)"), {"table_name": table_name}).scalar()
+
+
+def _planner_estimate(db: Session, table_name: str) -> Optional[int]:
+    """reltuples from the last ANALYZE/autovacuum; None if the table was never analyzed"""
+    reltuples = db.execute(
+        text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table_name)"),
+        {"table_name": table_name}
+    ).scalar()
+    if reltuples is None or reltuples < 0:
+        return None
+    return int(reltuples)
+
+
+def estimate_row_count(db: Session, table_name: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Estimated row count of a table and where it came from
+
+    Returns (None, None) when no estimate is available (non-PostgreSQL
+    databases, tables never analyzed); callers fall back to their own count.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None, None
+    try:
+        # Savepoint so a failing catalog query doesn't abort the caller's transaction
+        with db.begin_nested():
+            estimate = _timescale_estimate(db, table_name)
+            if estimate is not None:
+                return int(estimate), SOURCE_TIMESCALE
+            estimate = _planner_estimate(db, table_name)
+            if estimate is not None:
+                return estimate, SOURCE_PLANNER
+    except Exception as e:
+        logger.warning(f"[Estimates] Could not estimate rows of {table_name}: {str(e)}")
+    return None, None
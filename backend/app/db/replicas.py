@@ -0,0 +1,168 @@
+"""
+Read Replica Routing
+Sends read-only dashboard queries to PostgreSQL replicas that are within
+the configured staleness tolerance, falling back to the primary
+"""
+
+import asyncio
+import itertools
+import time
+from typing import List, Optional
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import (
+    SessionLocal,
+    AsyncSessionLocal,
+    _pool_options,
+    _async_database_url,
+    _session_scope
+)
+
+# Replication lag in seconds; 0 on a primary or a fully replayed standby
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    """One replica with its own pool and last known health"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.is_postgres = make_url(url).get_backend_name() == "postgresql"
+        self.engine = None
+        self.SessionLocal = None
+        self.async_engine = None
+        self.AsyncSessionLocal = None
+        if settings.DB_ASYNC:
+            from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+            async_url = _async_database_url(url)
+            self.async_engine = create_async_engine(
+                async_url,
+                **_pool_options(async_url, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, use_async=True)
+            )
+            # Session.info tells services that a session reads from this replica
+            self.AsyncSessionLocal = async_sessionmaker(
+                self.async_engine, autoflush=False, expire_on_commit=False, info={"replica": self}
+            )
+        else:
+            self.engine = create_engine(url, **_pool_options(url, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW))
+            self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine, info={"replica": self})
+        self.lag_seconds: Optional[float] = None
+        self.healthy = False
+        self.last_checked = 0.0
+        self.last_error: Optional[str] = None
+
+    def staleness(self) -> float:
+        """Upper bound on how far reads lag the primary: the last measured lag, which grows at most as fast as time passes"""
+        return (self.lag_seconds or 0.0) + (time.monotonic() - self.last_checked)
+
+    @property
+    def pool_engine(self):
+        return self.async_engine.sync_engine if self.async_engine is not None else self.engine
+
+    def _measure_lag_sync(self) -> float:
+        with self.engine.connect() as conn:
+            if not self.is_postgres:
+                conn.execute(text("SELECT 1"))
+                return 0.0
+            return float(conn.execute(LAG_QUERY).scalar() or 0)
+
+    async def _measure_lag_async(self) -> float:
+        async with self.async_engine.connect() as conn:
+            if not self.is_postgres:
+                await conn.execute(text("SELECT 1"))
+                return 0.0
+            return float((await conn.execute(LAG_QUERY)).scalar() or 0)
+
+    async def check(self):
+        """Refresh lag and health; unreachable replicas are marked unhealthy"""
+        try:
+            if self.async_engine is not None:
+                self.lag_seconds = await self._measure_lag_async()
+            else:
+                self.lag_seconds = await run_in_threadpool(self._measure_lag_sync)
+            self.healthy = self.lag_seconds <= settings.REPLICA_MAX_LAG_SECONDS
+            self.last_error = None
+            if not self.healthy:
+                logger.warning(f"[Replicas] {self.name} lagging {self.lag_seconds:.1f}s, routing reads to primary")
+        except Exception as e:
+            self.healthy = False
+            self.lag_seconds = None
+            self.last_error = str(e)
+            logger.warning(f"[Replicas] Health check failed for {self.name}: {str(e)}")
+        finally:
+            self.last_checked = time.monotonic()
+
+    def status(self) -> dict:
+        return {
+            "replica": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": round(self.lag_seconds, 3) if self.lag_seconds is not None else None,
+            "last_error": self.last_error
+        }
+
+
+class ReplicaSet:
+    """Round-robin over healthy replicas, re-checking lag at most every REPLICA_CHECK_INTERVAL seconds"""
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._cycle = itertools.cycle(self.replicas)
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _refresh_if_stale(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        now = time.monotonic()
+        if all(now - r.last_checked < settings.REPLICA_CHECK_INTERVAL for r in self.replicas):
+            return
+        async with self._lock:
+            now = time.monotonic()
+            stale = [r for r in self.replicas if now - r.last_checked >= settings.REPLICA_CHECK_INTERVAL]
+            if stale:
+                await asyncio.gather(*(r.check() for r in stale))
+
+    async def choose(self) -> Optional[Replica]:
+        """Next healthy replica, or None to use the primary"""
+        await self._refresh_if_stale()
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.healthy:
+                return replica
+        return None
+
+
+def _replica_urls() -> List[str]:
+    return [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+
+
+_urls = _replica_urls()
+replica_set: Optional[ReplicaSet] = ReplicaSet(_urls) if _urls else None
+
+
+async def get_read_db():
+    """
+    Dependency for read-only endpoints
+    Yields a session on a healthy replica when replicas are configured and
+    within REPLICA_MAX_LAG_SECONDS, otherwise a session on the primary.
+    Ingest and mutations keep using get_db.
+    """
+    async def choose_factories():
+        # Chosen on first use, so requests that never query skip the lag check
+        replica = await replica_set.choose() if replica_set is not None else None
+        if replica is None:
+            return SessionLocal, AsyncSessionLocal
+        return replica.SessionLocal, replica.AsyncSessionLocal
+    
+    async for db in _session_scope(choose_factories):
+        yield db
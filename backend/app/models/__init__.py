@@ -1,5 +1,5 @@
 # Models package initialization
 # SQLAlchemy ORM models only
-from app.models.user import User
+from app.models.user import User, RevokedToken
 
-__all__ = ["User"]
+__all__ = ["User", "RevokedToken"]
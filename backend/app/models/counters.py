@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, BigInteger, Date, DateTime, String
+from datetime import datetime
+from app.db.database import Base
+
+class DataPointCounter(Base):
+    """
+    Incrementally maintained count of sensor readings per month and device
+    Kept in step by ingest and retention; reconciled periodically against sensor_readings
+    """
+    __tablename__ = "data_point_counters"
+    
+    month = Column(Date, primary_key=True)  # First day of the month
+    device_id = Column(Integer, primary_key=True)  # devices.id (no FK so device deletes don't cascade here)
+    count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<DataPointCounter(month={self.month}, device_id={self.device_id}, count={self.count})>"
+
+
+class ReadingCountBucket(Base):
+    """
+    Hourly histogram of sensor reading counts per channel (device + sensor type)
+    Lets date-range quota checks sum buckets instead of scanning sensor_readings
+    """
+    __tablename__ = "reading_count_buckets"
+    
+    bucket_start = Column(DateTime, primary_key=True)  # Start of the UTC hour
+    device_id = Column(Integer, primary_key=True)  # devices.id (no FK, same as DataPointCounter)
+    sensor_type = Column(String, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<ReadingCountBucket(bucket_start={self.bucket_start}, device_id={self.device_id}, sensor_type={self.sensor_type}, count={self.count})>"
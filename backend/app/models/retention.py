@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime
+from datetime import datetime
+from app.db.database import Base
+
+class RetentionPolicy(Base):
+    """
+    How long to keep raw readings, and hourly rollups after that, for a set of channels
+    Null match fields are wildcards; the most specific matching policy wins.
+    """
+    __tablename__ = "retention_policies"
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(String, nullable=True)  # Public device id, e.g. "LR1"
+    sensor_type = Column(String, nullable=True)  # e.g. "CT1"
+    device_type = Column(String, nullable=True)  # e.g. "sensor_node"
+    raw_days = Column(Integer, nullable=False)  # Raw readings kept this long
+    rollup_days = Column(Integer, nullable=True)  # Hourly rollups kept this long; null = forever, 0 = none
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RetentionPolicy(id={self.id}, device_id={self.device_id}, sensor_type={self.sensor_type}, device_type={self.device_type}, raw_days={self.raw_days}, rollup_days={self.rollup_days})>"
+
+
+class SensorRollup(Base):
+    """Hourly aggregate of one channel's readings, kept after the raw rows are deleted"""
+    __tablename__ = "sensor_rollups"
+
+    device_id = Column(Integer, primary_key=True)  # devices.id
+    sensor_type = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)  # Start of the UTC hour
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sum_value = Column(Float, nullable=False)
+    count = Column(BigInteger, nullable=False)
+    unit = Column(String, nullable=True)
+
+    def __repr__(self):
+        return f"<SensorRollup(device_id={self.device_id}, sensor_type={self.sensor_type}, bucket_start={self.bucket_start}, count={self.count})>"
@@ -10,13 +10,15 @@ class Device(Base):
     device_id = Column(String, unique=True, index=True, nullable=False)  # e.g., "LR1", "LR2"
     name = Column(String, nullable=False)
     device_type = Column(String, nullable=True)  # e.g., "sensor_node", "gateway"
-    status = Column(String, default="offline")  # "online" or "offline"
+    status = Column(String, default="offline")  # "online", "offline" or "deleting"
     last_seen = Column(DateTime, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship to sensor readings
-    sensor_readings = relationship("SensorReading", back_populates="device", cascade="all, delete-orphan")
+    # passive_deletes: never load a device's readings to delete them; the
+    # database cascade (and the chunked purge job) removes them instead
+    sensor_readings = relationship("SensorReading", back_populates="device", cascade="all, delete-orphan", passive_deletes=True)
     
     def __repr__(self):
         return f"<Device(id={self.id}, device_id={self.device_id}, name={self.name}, status={self.status})>"
@@ -26,7 +28,7 @@ class SensorReading(Base):
     __tablename__ = "sensor_readings"
     
     id = Column(Integer, primary_key=True, index=True)
-    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False)
     sensor_type = Column(String, nullable=False)  # e.g., "CT1", "CT2", "IR", "K-Type"
     value = Column(Float, nullable=False)
     unit = Column(String, nullable=True)  # e.g., "A", "°C"
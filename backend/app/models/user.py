@@ -14,3 +14,20 @@ class User(Base):
     
     def __repr__(self):
         return f"<User(id={self.id}, username={self.username}, email={self.email})>"
+
+
+class RevokedToken(Base):
+    """
+    A revoked token id (jti), kept until the token would have expired
+    kind is "access" or "refresh", or "family" for a whole chain of rotated refresh tokens.
+    """
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    username = Column(String, nullable=True, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<RevokedToken(jti={self.jti}, kind={self.kind}, username={self.username})>"
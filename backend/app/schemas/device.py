@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, List
+from app.core.responses import format_datetime
 
 # Device Schemas
 class DeviceBase(BaseModel):
@@ -21,7 +22,7 @@ class DeviceResponse(DeviceBase):
     class Config:
         from_attributes = True
         json_encoders = {
-            datetime: lambda v: v.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z' if v else None
+            datetime: format_datetime
         }
 
 # Sensor Reading Schemas
@@ -41,7 +42,7 @@ class SensorReadingResponse(BaseModel):
     class Config:
         from_attributes = True
         json_encoders = {
-            datetime: lambda v: v.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z' if v else None
+            datetime: format_datetime
         }
 
 # Statistics Schema
@@ -56,7 +57,7 @@ class SensorStats(BaseModel):
 
     class Config:
         json_encoders = {
-            datetime: lambda v: v.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z' if v else None
+            datetime: format_datetime
         }
 
 # Time Series Data Point
@@ -66,10 +67,17 @@ class TimeSeriesPoint(BaseModel):
 
     class Config:
         json_encoders = {
-            datetime: lambda v: v.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z' if v else None
+            datetime: format_datetime
         }
 
 class TimeSeriesResponse(BaseModel):
     sensor_type: str
     unit: Optional[str] = None
     data: List[TimeSeriesPoint]
+    rolled_up_before: Optional[datetime] = None  # Points before this time are hourly averages
+    limited_to: Optional[int] = None  # Set when the range was too large and only the newest points are returned
+
+    class Config:
+        json_encoders = {
+            datetime: format_datetime
+        }
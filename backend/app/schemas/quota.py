@@ -11,6 +11,7 @@ from datetime import datetime
 class QuotaStatsResponse(BaseModel):
     """Response model for quota statistics"""
     total_data_points: int = Field(..., description="Total data points in range")
+    current_month_data_points: Optional[int] = Field(None, description="Data points stored this month (all-data stats only)")
     quota_limit: int = Field(..., description="Configured quota limit")
     quota_exceeded: bool = Field(..., description="Whether quota is exceeded")
     usage_percent: float = Field(..., description="Percentage of quota used")
@@ -20,6 +21,7 @@ class QuotaStatsResponse(BaseModel):
     date_range_applied: bool = Field(False, description="Whether date range filter was applied")
     start_date: Optional[str] = Field(None, description="Start date if range applied")
     end_date: Optional[str] = Field(None, description="End date if range applied")
+    count_mode: str = Field("exact", description="\"exact\" or \"bucket_approximate\" (edge hours prorated)")
 
     class Config:
         json_schema_extra = {
@@ -33,7 +35,8 @@ class QuotaStatsResponse(BaseModel):
                 "newest_timestamp": "2026-01-09T00:00:00",
                 "date_range_applied": True,
                 "start_date": "2026-01-02T00:00:00",
-                "end_date": "2026-01-09T00:00:00"
+                "end_date": "2026-01-09T00:00:00",
+                "count_mode": "exact"
             }
         }
 
@@ -46,6 +49,7 @@ class DateRangeQuotaCheckResponse(BaseModel):
     suggested_quota: int = Field(..., description="Suggested quota to accommodate the range")
     should_limit: bool = Field(..., description="Whether data should be limited")
     limit_to: int = Field(..., description="Number of points to limit to")
+    count_mode: str = Field("exact", description="\"exact\" or \"bucket_approximate\" (edge hours prorated)")
     message: str = Field(..., description="Human-readable message")
 
     class Config:
@@ -57,6 +61,7 @@ class DateRangeQuotaCheckResponse(BaseModel):
                 "suggested_quota": 60000,
                 "should_limit": True,
                 "limit_to": 25000,
+                "count_mode": "exact",
                 "message": "Date range contains 50000 data points. Quota limit is 25000."
             }
         }
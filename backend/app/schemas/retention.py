@@ -0,0 +1,48 @@
+"""
+Retention Schemas
+Pydantic models for retention policy requests and responses
+"""
+
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional
+from datetime import datetime
+
+
+class RetentionPolicyBase(BaseModel):
+    """Channel match (null = any) and retention periods"""
+    device_id: Optional[str] = Field(None, description="Device id, e.g. LR1 (any device if omitted)")
+    sensor_type: Optional[str] = Field(None, description="Sensor type, e.g. CT1 (any sensor if omitted)")
+    device_type: Optional[str] = Field(None, description="Device type, e.g. sensor_node (any type if omitted)")
+    raw_days: int = Field(..., ge=1, description="Days to keep raw readings")
+    rollup_days: Optional[int] = Field(None, ge=0, description="Days to keep hourly rollups (null = forever, 0 = no rollups)")
+
+    @model_validator(mode="after")
+    def check_rollup_outlives_raw(self):
+        if self.rollup_days and self.rollup_days < self.raw_days:
+            raise ValueError("rollup_days must be 0 or at least raw_days")
+        return self
+
+
+class RetentionPolicyCreate(RetentionPolicyBase):
+    pass
+
+
+class RetentionPolicyResponse(RetentionPolicyBase):
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+        json_schema_extra = {
+            "example": {
+                "id": 1,
+                "device_id": None,
+                "sensor_type": "CT1",
+                "device_type": "sensor_node",
+                "raw_days": 7,
+                "rollup_days": 365,
+                "created_at": "2026-01-02T00:00:00",
+                "updated_at": "2026-01-02T00:00:00"
+            }
+        }
@@ -35,6 +35,16 @@ class Token(BaseModel):
     """Schema for JWT token response"""
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # Access token lifetime in seconds
+
+class RefreshRequest(BaseModel):
+    """Schema for exchanging a refresh token"""
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    """Schema for logout; the refresh token's whole rotation chain is revoked too"""
+    refresh_token: Optional[str] = None
 
 class TokenData(BaseModel):
     """Schema for token payload data"""
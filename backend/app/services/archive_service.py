@@ -0,0 +1,324 @@
+"""
+Archive Service
+Cold tier: exports readings to Parquet files before retention deletes them,
+and reads them back for historical time ranges
+
+Layout (Hive-style partitions, one directory per day and channel):
+    {ARCHIVE_DIR}/day=2026-01-02/device=3/sensor=CT1/part-<first id>-<last id>.parquet
+
+Files are first written as <name>.parquet.staged, which readers ignore, and
+renamed once the delete of the archived rows has committed.
+"""
+
+import glob
+from contextlib import contextmanager
+import multiprocessing
+import os
+import shutil
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.sensor import SensorReading
+from app.services.counter_service import naive_utc
+
+# pyarrow is only required when archiving is enabled
+pa = None
+pc = None
+pq = None
+if settings.ARCHIVE_ENABLED:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+
+def _partition_dir(root: str, day, device_pk: int, sensor_type: str) -> str:
+    return os.path.join(root, f"day={day.isoformat()}", f"device={device_pk}", f"sensor={quote(sensor_type, safe='')}")
+
+
+STAGED_SUFFIX = ".staged"
+
+
+def _write_partition(path: str, ids: list, timestamps: list, values: list, units: list, compression: str) -> int:
+    """
+    Write one partition file (runs in a worker process)
+    Written to a temporary name and renamed, so a staged file is never
+    partial and a re-run of the same slice replaces it instead of duplicating it.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    table = pyarrow.table({
+        "id": pyarrow.array(ids, pyarrow.int64()),
+        "timestamp": pyarrow.array(timestamps, pyarrow.timestamp("us")),
+        "value": pyarrow.array(values, pyarrow.float64()),
+        "unit": pyarrow.array(units, pyarrow.string())
+    })
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pyarrow.parquet.write_table(table, tmp_path, compression=compression)
+    os.replace(tmp_path, path)
+    return len(ids)
+
+
+class ArchiveService:
+    """Parquet cold tier for sensor readings"""
+
+    _executor: ProcessPoolExecutor = None
+    _days: List[date] = []
+    _days_mtime: Optional[int] = None
+
+    @staticmethod
+    def enabled() -> bool:
+        return settings.ARCHIVE_ENABLED
+
+    @staticmethod
+    def _pool() -> ProcessPoolExecutor:
+        if ArchiveService._executor is None:
+            # spawn: forking a threaded server process is unsafe
+            ArchiveService._executor = ProcessPoolExecutor(
+                max_workers=settings.ARCHIVE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return ArchiveService._executor
+
+    @staticmethod
+    def shutdown():
+        if ArchiveService._executor is not None:
+            ArchiveService._executor.shutdown(wait=True)
+            ArchiveService._executor = None
+
+    @staticmethod
+    def archive_rows(rows) -> List[str]:
+        """
+        Write (id, device_id, sensor_type, timestamp, value, unit) rows to
+        staged Parquet files, one per day and channel, in parallel
+        Raises if any file fails, so the caller can keep the rows in the database.
+        
+        Returns:
+            paths of the staged files, for publish() or discard()
+        """
+        partitions = defaultdict(lambda: ([], [], [], []))
+        for reading_id, device_pk, sensor_type, timestamp, value, unit in rows:
+            ids, timestamps, values, units = partitions[(timestamp.date(), device_pk, sensor_type)]
+            ids.append(reading_id)
+            timestamps.append(timestamp)
+            values.append(value)
+            units.append(unit)
+        if not partitions:
+            return []
+
+        paths = []
+        futures = []
+        for (day, device_pk, sensor_type), (ids, timestamps, values, units) in partitions.items():
+            path = os.path.join(
+                _partition_dir(settings.ARCHIVE_DIR, day, device_pk, sensor_type),
+                f"part-{min(ids)}-{max(ids)}.parquet{STAGED_SUFFIX}"
+            )
+            paths.append(path)
+            futures.append(ArchiveService._pool().submit(
+                _write_partition, path, ids, timestamps, values, units, settings.ARCHIVE_COMPRESSION
+            ))
+        try:
+            written = sum(future.result() for future in futures)
+        except Exception:
+            ArchiveService.discard(paths)
+            raise
+        logger.debug(f"[Archive] Staged {written} readings in {len(futures)} partition files")
+        return paths
+
+    @staticmethod
+    def archive_matching(db: Session, *criteria) -> List[str]:
+        """Stage the readings matched by `criteria`; call before deleting them"""
+        rows = db.execute(
+            select(
+                SensorReading.id,
+                SensorReading.device_id,
+                SensorReading.sensor_type,
+                SensorReading.timestamp,
+                SensorReading.value,
+                SensorReading.unit
+            ).where(*criteria)
+        ).all()
+        return ArchiveService.archive_rows(rows)
+
+    @staticmethod
+    def publish(paths: List[str]):
+        """Make staged files visible to readers"""
+        for path in paths:
+            os.replace(path, path[:-len(STAGED_SUFFIX)])
+
+    @staticmethod
+    def discard(paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    @contextmanager
+    def archiving(db: Session, *criteria):
+        """
+        Stage the readings matched by `criteria` around a block that deletes
+        them and commits: published if the block succeeds, discarded if it
+        raises, so readings are never both in the table and in the archive
+        """
+        paths = ArchiveService.archive_matching(db, *criteria) if ArchiveService.enabled() else []
+        try:
+            yield
+        except BaseException:
+            ArchiveService.discard(paths)
+            raise
+        ArchiveService.publish(paths)
+
+    @staticmethod
+    def recover_staged(db: Session):
+        """
+        Resolve files left staged by a crash between commit and publish: the
+        delete committed if their readings are gone from sensor_readings
+        """
+        if not ArchiveService.enabled():
+            return
+        for path in glob.glob(os.path.join(settings.ARCHIVE_DIR, "day=*", "device=*", "sensor=*", f"*{STAGED_SUFFIX}")):
+            try:
+                ids = pq.read_table(path, columns=["id"]).column("id").to_pylist()
+            except (OSError, pa.ArrowException):
+                ArchiveService.discard([path])
+                continue
+            remaining = db.execute(select(SensorReading.id).where(SensorReading.id.in_(ids)).limit(1)).first()
+            if remaining is None:
+                ArchiveService.publish([path])
+                logger.info(f"[Archive] Published {path} left staged by an interrupted run")
+            else:
+                ArchiveService.discard([path])
+                logger.info(f"[Archive] Discarded {path} left staged by an interrupted run")
+        db.commit()
+
+    @staticmethod
+    def archived_days() -> List[date]:
+        """Days with archived partitions, oldest first; re-listed only when the archive directory changes"""
+        try:
+            mtime = os.stat(settings.ARCHIVE_DIR).st_mtime_ns
+        except OSError:
+            return []
+        if mtime != ArchiveService._days_mtime:
+            days = []
+            for name in os.listdir(settings.ARCHIVE_DIR):
+                if name.startswith("day="):
+                    try:
+                        days.append(date.fromisoformat(name[4:]))
+                    except ValueError:
+                        continue
+            ArchiveService._days = sorted(days)
+            ArchiveService._days_mtime = mtime
+        return ArchiveService._days
+
+    @staticmethod
+    def covers(start: datetime, end: datetime) -> bool:
+        """Whether any archived day falls within [start, end]; False skips the archive without touching files"""
+        if not settings.ARCHIVE_ENABLED:
+            return False
+        first, last = naive_utc(start).date(), naive_utc(end).date()
+        return any(first <= day <= last for day in ArchiveService.archived_days())
+
+    @staticmethod
+    def _day_paths(device_pk: int, sensor_type: str, start: datetime, end: datetime, newest_first: bool = False) -> Iterator[List[str]]:
+        """Partition files of a channel per archived day within [start, end]"""
+        days = [day for day in ArchiveService.archived_days() if start.date() <= day <= end.date()]
+        for day in reversed(days) if newest_first else days:
+            paths = sorted(glob.glob(os.path.join(_partition_dir(settings.ARCHIVE_DIR, day, device_pk, sensor_type), "*.parquet")))
+            if paths:
+                yield paths
+
+    @staticmethod
+    def read_table(device_pk: int, sensor_type: str, start: datetime, end: datetime, limit: Optional[int] = None):
+        """
+        Archived id/timestamp/value rows of a channel within [start, end] as an
+        Arrow table, or None; with `limit`, only the newest `limit` rows, reading
+        days newest first and stopping once they hold enough
+        """
+        if not ArchiveService.covers(start, end):
+            return None
+        start, end = naive_utc(start), naive_utc(end)
+
+        tables = []
+        rows = 0
+        for paths in ArchiveService._day_paths(device_pk, sensor_type, start, end, newest_first=limit is not None):
+            for path in paths:
+                table = pq.read_table(
+                    path,
+                    columns=["id", "timestamp", "value"],
+                    filters=[("timestamp", ">=", start), ("timestamp", "<=", end)]
+                )
+                tables.append(table)
+                rows += table.num_rows
+            # Days don't overlap, so older days can't hold any of the newest `limit` rows
+            if limit is not None and rows >= limit:
+                break
+        if not rows:
+            return None
+
+        table = pa.concat_tables(tables)
+        if pc.count_distinct(table.column("id")).as_py() < table.num_rows:
+            # A slice archived twice with different boundaries: keep each reading once
+            table = (
+                table.group_by("id")
+                .aggregate([("timestamp", "min"), ("value", "min")])
+                .select(["id", "timestamp_min", "value_min"])
+                .rename_columns(["id", "timestamp", "value"])
+            )
+        if limit is not None and table.num_rows > limit:
+            table = table.take(pc.select_k_unstable(table, k=limit, sort_keys=[("timestamp", "descending")]))
+        return table
+
+    @staticmethod
+    def read_points(device_pk: int, sensor_type: str, start: datetime, end: datetime, limit: Optional[int] = None) -> List[Tuple[datetime, float]]:
+        """Archived (timestamp, value) pairs of a channel within [start, end], oldest first; with `limit`, the newest `limit`"""
+        table = ArchiveService.read_table(device_pk, sensor_type, start, end, limit)
+        if table is None:
+            return []
+        table = table.sort_by("timestamp")
+        return list(zip(table.column("timestamp").to_pylist(), table.column("value").to_pylist()))
+
+    @staticmethod
+    def read_stats(device_pk: int, sensor_type: str, start: datetime, end: datetime, exclude_hours: Set[datetime]) -> Tuple[Optional[float], Optional[float], float, int]:
+        """
+        (min, max, sum, count) of archived values within [start, end],
+        skipping readings in `exclude_hours`; computed in Arrow, no Python rows
+        """
+        table = ArchiveService.read_table(device_pk, sensor_type, start, end)
+        if table is None:
+            return None, None, 0.0, 0
+        values = table.column("value")
+        if exclude_hours:
+            hours = pc.floor_temporal(table.column("timestamp"), unit="hour")
+            excluded = pc.is_in(hours, value_set=pa.array(sorted(exclude_hours), pa.timestamp("us")))
+            values = pc.filter(values, pc.invert(excluded))
+        if len(values) == 0:
+            return None, None, 0.0, 0
+        bounds = pc.min_max(values)
+        return bounds["min"].as_py(), bounds["max"].as_py(), pc.sum(values).as_py(), len(values)
+
+    @staticmethod
+    def count_upper_bound(device_pk: int, sensor_type: str, start: datetime, end: datetime) -> int:
+        """Archived rows on the range's days, from Parquet footers without reading any data"""
+        if not ArchiveService.covers(start, end):
+            return 0
+        start, end = naive_utc(start), naive_utc(end)
+        return sum(
+            pq.ParquetFile(path).metadata.num_rows
+            for paths in ArchiveService._day_paths(device_pk, sensor_type, start, end)
+            for path in paths
+        )
+
+    @staticmethod
+    def remove_device(device_pk: int):
+        """Delete all archived partitions of a device"""
+        for directory in glob.glob(os.path.join(settings.ARCHIVE_DIR, "day=*", f"device={device_pk}")):
+            shutil.rmtree(directory, ignore_errors=True)
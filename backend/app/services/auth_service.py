@@ -1,17 +1,32 @@
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from app.models.user import User
+from typing import List, Optional, Tuple
+from app.models.user import User, RevokedToken
 from app.schemas.user import UserCreate, UserLogin
-from app.core.security import  verify_password, create_access_token
-from datetime import timedelta
+from app.core.security import ACCESS_TOKEN, REFRESH_TOKEN, create_access_token, create_refresh_token, token_cache, verify_token
+from app.core.passwords import password_hasher
+from app.core.revocation import revocation_list
+from app.db.database import SessionLocal, run_db
+from app.services.counter_service import dialect_insert
+from datetime import datetime, timedelta
 from app.core.config import settings
 from app.core.logger import logger
 
 class AuthService:
     @staticmethod
-    def create_user(db: Session, user: UserCreate):
+    async def register_user(db: Session, user: UserCreate):
         """
-        Create a new user
+        Hash the password on the password pool, then create the user
+        """
+        password_hash = await password_hasher.hash(user.password)
+        return await run_db(db, AuthService.create_user, user, password_hash)
+
+    @staticmethod
+    def create_user(db: Session, user: UserCreate, password_hash: str):
+        """
+        Create a new user with an already hashed password
         """
         logger.info(f"Attempting to create new user: {user.username}")
         
@@ -38,7 +53,7 @@ class AuthService:
             db_user = User(
                 username=user.username,
                 email=user.email,
-                password=user.password  
+                password=password_hash
             )
             db.add(db_user)
             db.commit()
@@ -51,43 +66,194 @@ class AuthService:
             raise
     
     @staticmethod
-    def authenticate_user(db: Session, user_login: UserLogin):
+    def get_credentials(db: Session, username: str) -> Optional[Tuple[int, str]]:
+        """
+        (id, stored password) of a user, or None
+        Ends the transaction, so no connection is held while the password is checked.
+        """
+        row = db.execute(select(User.id, User.password).where(User.username == username)).first()
+        db.commit()
+        return tuple(row) if row else None
+
+    @staticmethod
+    def replace_password_hash(db: Session, user_id: int, old_password: str, new_password: str) -> bool:
+        """
+        Store an upgraded hash unless the password changed meanwhile
+        """
+        result = db.execute(
+            update(User)
+            .where(User.id == user_id, User.password == old_password)
+            .values(password=new_password)
+        )
+        db.commit()
+        return result.rowcount > 0
+
+    @staticmethod
+    async def authenticate_user(db: Session, user_login: UserLogin):
         """
         Authenticate user and return access token
+        The password is verified on the password pool. Legacy plaintext rows
+        and hashes with an outdated cost are rehashed on a successful sign-in.
         """
         logger.info(f"Authentication attempt for user: {user_login.username}")
+        unauthorized = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
         
         # Find user by username
-        db_user = db.query(User).filter(User.username == user_login.username).first()
-        if not db_user:
+        credentials = await run_db(db, AuthService.get_credentials, user_login.username)
+        if credentials is None:
+            await password_hasher.verify_dummy(user_login.password)
             logger.warning(f"Authentication failed: User '{user_login.username}' not found")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+            raise unauthorized
+        user_id, stored_password = credentials
         
         # Verify password
-        if not verify_password(user_login.password, db_user.password):
+        matches, needs_rehash = await password_hasher.verify(user_login.password, stored_password)
+        if not matches:
             logger.warning(f"Authentication failed: Invalid password for user '{user_login.username}'")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+            raise unauthorized
         
-        # Create access token
+        if needs_rehash:
+            try:
+                new_password = await password_hasher.hash(user_login.password)
+                if await run_db(db, AuthService.replace_password_hash, user_id, stored_password, new_password):
+                    logger.info(f"Password hash upgraded for user: {user_login.username}")
+            except Exception as e:
+                # The sign-in still succeeds; the upgrade is retried next time
+                logger.error(f"Password rehash failed for user '{user_login.username}': {str(e)}")
+        
+        # Create access and refresh tokens
         try:
-            access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-            access_token = create_access_token(
-                data={"sub": db_user.username}, expires_delta=access_token_expires
-            )
+            tokens = AuthService.issue_tokens(user_login.username)
             logger.info(f"Authentication successful for user: {user_login.username}")
-            return {"access_token": access_token, "token_type": "bearer"}
+            return tokens
         except Exception as e:
             logger.error(f"Token creation failed for user '{user_login.username}': {str(e)}", exc_info=True)
             raise
     
+    @staticmethod
+    def issue_tokens(username: str, family: Optional[str] = None) -> dict:
+        """
+        New access token plus refresh token (continuing `family` on a refresh)
+        """
+        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        access_token = create_access_token(
+            data={"sub": username}, expires_delta=access_token_expires
+        )
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "refresh_token": create_refresh_token(username, family),
+            "expires_in": int(access_token_expires.total_seconds())
+        }
+    
+    @staticmethod
+    def revoke(db: Session, entries: List[dict]):
+        """
+        Record revoked jtis (dicts of RevokedToken columns); already revoked ones are kept as they are
+        """
+        if entries:
+            db.execute(
+                dialect_insert(db, RevokedToken.__table__)
+                .values(entries)
+                .on_conflict_do_nothing(index_elements=["jti"])
+            )
+            db.commit()
+        for entry in entries:
+            revocation_list.add(entry["jti"])
+    
+    @staticmethod
+    def consume_refresh_token(db: Session, payload: dict) -> str:
+        """
+        Revoke a refresh token as it is exchanged, returning its family
+        A token that was already exchanged means a copy is being replayed,
+        so the whole family is revoked and the user has to sign in again.
+        """
+        username = payload["sub"]
+        unauthorized = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+        if db.get(RevokedToken, payload["fam"]) is not None:
+            logger.warning(f"Refresh rejected: token family of '{username}' is revoked")
+            raise unauthorized
+        if db.execute(select(User.id).where(User.username == username)).first() is None:
+            logger.warning(f"Refresh rejected: user '{username}' no longer exists")
+            raise unauthorized
+        
+        db.add(RevokedToken(
+            jti=payload["jti"],
+            kind=REFRESH_TOKEN,
+            username=username,
+            expires_at=datetime.utcfromtimestamp(payload["exp"])
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            logger.warning(f"Refresh token reuse detected for '{username}', revoking its family")
+            # Tokens of the family issued later can live at most one refresh lifetime from now
+            AuthService.revoke(db, [{
+                "jti": payload["fam"],
+                "kind": "family",
+                "username": username,
+                "expires_at": datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+                "revoked_at": datetime.utcnow()
+            }])
+            raise unauthorized
+        revocation_list.add(payload["jti"])
+        return payload["fam"]
+    
+    @staticmethod
+    async def refresh_tokens(db: Session, refresh_token: str) -> dict:
+        """
+        Exchange a refresh token for a new access token and refresh token
+        """
+        payload = AuthService.get_token_payload(refresh_token, REFRESH_TOKEN)
+        family = await run_db(db, AuthService.consume_refresh_token, payload)
+        token_cache.discard(refresh_token)
+        logger.info(f"Tokens refreshed for user: {payload['sub']}")
+        return AuthService.issue_tokens(payload["sub"], family)
+    
+    @staticmethod
+    async def logout(db: Session, access_token: str, refresh_token: Optional[str] = None):
+        """
+        Revoke the access token, and the refresh token's family when given
+        """
+        payload = AuthService.get_token_payload(access_token)
+        now = datetime.utcnow()
+        entries = []
+        if payload.get("jti"):
+            entries.append({
+                "jti": payload["jti"],
+                "kind": ACCESS_TOKEN,
+                "username": payload["sub"],
+                "expires_at": datetime.utcfromtimestamp(payload["exp"]),
+                "revoked_at": now
+            })
+        if refresh_token:
+            refresh_payload = AuthService.get_token_payload(refresh_token, REFRESH_TOKEN)
+            if refresh_payload["sub"] != payload["sub"]:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Refresh token belongs to another user"
+                )
+            entries.append({
+                "jti": refresh_payload["fam"],
+                "kind": "family",
+                "username": payload["sub"],
+                "expires_at": now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+                "revoked_at": now
+            })
+            token_cache.discard(refresh_token)
+        await run_db(db, AuthService.revoke, entries)
+        token_cache.discard(access_token)
+        logger.info(f"User logged out: {payload['sub']}")
+    
     @staticmethod
     def get_user_by_username(db: Session, username: str):
         """
@@ -102,14 +268,11 @@ class AuthService:
         return user
     
     @staticmethod
-    def get_current_user_from_token(token: str) -> str:
+    def get_token_payload(token: str, token_type: str = ACCESS_TOKEN) -> dict:
         """
-        Verify JWT token and extract username
-        Used for authentication in protected routes
+        Verify a JWT of the given type and return its payload
+        Tokens issued before refresh tokens existed carry no type and count as access tokens.
         """
-        from app.core.security import verify_token
-        
-        logger.debug("Verifying JWT token")
         payload = verify_token(token)
         if payload is None:
             logger.warning("Token verification failed: Invalid or expired token")
@@ -119,14 +282,28 @@ class AuthService:
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        username: str = payload.get("sub")
-        if username is None:
-            logger.warning("Token verification failed: Missing username in token payload")
+        if payload.get("type", ACCESS_TOKEN) != token_type or payload.get("sub") is None:
+            logger.warning(f"Token verification failed: not a valid {token_type} token")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token payload",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        logger.debug(f"Token verified successfully for user: {username}")
-        return username
+        return payload
+    
+    @staticmethod
+    def is_token_revoked(jti: str) -> bool:
+        """
+        Exact revocation check for a jti the in-memory filter flagged
+        """
+        with SessionLocal() as db:
+            return revocation_list.is_revoked(db, jti)
+    
+    @staticmethod
+    def get_current_user_from_token(token: str) -> str:
+        """
+        Verify JWT token and extract username
+        Used for authentication in protected routes
+        """
+        return AuthService.get_token_payload(token)["sub"]
@@ -0,0 +1,99 @@
+"""
+Query Coalescing
+Single-flight execution of identical read queries: while a query is running,
+requests for the same key wait for its result instead of running it again.
+Dashboards polling the same sensor at the same moment then cost one
+database round trip, and the waiting requests never open a session.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class _FlightStats:
+    __slots__ = ("calls", "executions", "coalesced", "errors")
+
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+
+class SingleFlight:
+    """
+    One in-flight call per key; concurrent callers with the same key share
+    its result or exception. Keys are tuples starting with the query name,
+    which groups the statistics.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._stats: Dict[str, _FlightStats] = {}
+
+    def _stats_for(self, name: str) -> _FlightStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _FlightStats()
+        return stats
+
+    async def do(self, key: Tuple, fn: Callable[[], Awaitable[T]]) -> T:
+        """Return fn()'s result, sharing the call with concurrent callers of the same key"""
+        stats = self._stats_for(key[0])
+        stats.calls += 1
+        if not self.enabled:
+            stats.executions += 1
+            return await fn()
+
+        future = self._calls.get(key)
+        if future is not None:
+            stats.coalesced += 1
+            try:
+                # Shielded so a waiter going away doesn't cancel the shared call
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # The leading request was cancelled (client disconnected); run the query ourselves
+            stats.executions += 1
+            return await fn()
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        stats.executions += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            stats.errors += 1
+            future.set_exception(e)
+            # Mark retrieved: without waiters asyncio would log it as never retrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        queries = {}
+        for name, stats in self._stats.items():
+            queries[name] = {
+                "calls": stats.calls,
+                "executions": stats.executions,
+                "coalesced": stats.coalesced,
+                "errors": stats.errors,
+                "coalesced_rate": round(stats.coalesced / stats.calls, 4) if stats.calls else 0.0
+            }
+        return {"enabled": self.enabled, "in_flight": len(self._calls), "queries": queries}
+
+
+# Sensor stats and time series reads, keyed by query name and parameters
+sensor_queries = SingleFlight(settings.QUERY_COALESCING_ENABLED)
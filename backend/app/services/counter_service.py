@@ -0,0 +1,404 @@
+"""
+Data Point Counter Service
+Maintains per-month, per-device reading counts and an hourly per-channel
+count histogram so quota statistics don't need COUNT(*) over sensor_readings
+"""
+
+import asyncio
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, delete
+from fastapi.concurrency import run_in_threadpool
+from app.models.counters import DataPointCounter, ReadingCountBucket
+from app.models.sensor import SensorReading
+from app.services.result_cache import note_change, note_readings
+from app.core.logger import logger
+
+
+COUNT_EXACT = "exact"
+COUNT_BUCKET_APPROXIMATE = "bucket_approximate"
+
+BUCKET_WIDTH = timedelta(hours=1)
+# Rows per multi-row upsert, well under SQLite's bound-parameter limit
+UPSERT_CHUNK = 1000
+
+
+def month_start(timestamp: datetime) -> date:
+    """First day of the timestamp's month"""
+    return date(timestamp.year, timestamp.month, 1)
+
+
+def month_bounds(month: date) -> Tuple[datetime, datetime]:
+    """[start, end) of a month as datetimes"""
+    next_month = month_start(month.replace(day=28) + timedelta(days=4))
+    return datetime.combine(month, datetime.min.time()), datetime.combine(next_month, datetime.min.time())
+
+
+def hour_start(timestamp: datetime) -> datetime:
+    """Start of the timestamp's hour"""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """Readings are stored as naive UTC; convert aware datetimes to match"""
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def as_datetime(value) -> datetime:
+    """Normalize a truncated-hour value (datetime or string depending on dialect)"""
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def dialect_insert(db: Session, table):
+    """INSERT supporting on_conflict_do_update for the session's database (PostgreSQL and SQLite)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return insert(table)
+
+
+def _upsert(db: Session, table, key_columns: Tuple[str, ...], rows: List[dict], increment_column: str):
+    """
+    INSERT counter rows, or add to the existing rows' counters, in multi-row statements
+    Rows are sorted by key so concurrent transactions lock them in the same
+    order and can't deadlock each other; keys must be unique.
+    """
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda row: tuple(row[column] for column in key_columns))
+    for offset in range(0, len(rows), UPSERT_CHUNK):
+        stmt = dialect_insert(db, table).values(rows[offset:offset + UPSERT_CHUNK])
+        update = {increment_column: getattr(table.c, increment_column) + getattr(stmt.excluded, increment_column)}
+        if "updated_at" in rows[0]:
+            update["updated_at"] = stmt.excluded.updated_at
+        db.execute(stmt.on_conflict_do_update(index_elements=list(key_columns), set_=update))
+
+
+def hour_expression(db: Session):
+    """SQL expression truncating sensor_readings.timestamp to the start of its hour"""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m-%d %H:00:00", SensorReading.timestamp)
+    return func.date_trunc("hour", SensorReading.timestamp)
+
+
+def _channel_filter(model, device_pk: Optional[int], sensor_type: Optional[str]) -> list:
+    criteria = []
+    if device_pk is not None:
+        criteria.append(model.device_id == device_pk)
+    if sensor_type is not None:
+        criteria.append(model.sensor_type == sensor_type)
+    return criteria
+
+
+class DataPointCounterService:
+    """Counter maintenance for ingest, retention and reconciliation"""
+
+    @staticmethod
+    def add(db: Session, deltas: Dict[Tuple[date, int], int]):
+        """
+        Apply count deltas keyed by (month, device_id)
+        Runs inside the caller's transaction; the caller commits.
+        """
+        now = datetime.utcnow()
+        _upsert(db, DataPointCounter.__table__, ("month", "device_id"), [
+            {"month": month, "device_id": device_pk, "count": delta, "updated_at": now}
+            for (month, device_pk), delta in deltas.items() if delta != 0
+        ], "count")
+
+    @staticmethod
+    def add_buckets(db: Session, deltas: Dict[Tuple[datetime, int, str], int]):
+        """Apply histogram deltas keyed by (hour, device_id, sensor_type), in the caller's transaction"""
+        _upsert(db, ReadingCountBucket.__table__, ("bucket_start", "device_id", "sensor_type"), [
+            {"bucket_start": bucket_start, "device_id": device_pk, "sensor_type": sensor_type, "count": delta}
+            for (bucket_start, device_pk, sensor_type), delta in deltas.items() if delta != 0
+        ], "count")
+
+    @staticmethod
+    def record_readings(db: Session, readings: Iterable[Tuple[int, str, datetime]], sign: int = 1):
+        """Count (device_id, sensor_type, timestamp) triples as added (sign=1) or removed (sign=-1)"""
+        readings = list(readings)
+        months = Counter()
+        buckets = Counter()
+        for device_pk, sensor_type, timestamp in readings:
+            months[(month_start(timestamp), device_pk)] += sign
+            buckets[(hour_start(timestamp), device_pk, sensor_type)] += sign
+        DataPointCounterService.add(db, months)
+        DataPointCounterService.add_buckets(db, buckets)
+        note_readings(db, readings, removed=sign < 0)
+
+    @staticmethod
+    def subtract_matching(db: Session, *criteria):
+        """
+        Subtract the readings matched by `criteria` from the counters
+        Call in the same transaction as the DELETE using the same criteria.
+        """
+        hour = hour_expression(db).label("hour")
+        rows = db.execute(
+            select(hour, SensorReading.device_id, SensorReading.sensor_type, func.count(SensorReading.id))
+            .where(*criteria)
+            .group_by(hour, SensorReading.device_id, SensorReading.sensor_type)
+        ).all()
+        months = Counter()
+        buckets = {}
+        for row_hour, device_pk, sensor_type, count in rows:
+            bucket_start = as_datetime(row_hour)
+            months[(month_start(bucket_start), device_pk)] -= count
+            buckets[(bucket_start, device_pk, sensor_type)] = -count
+            note_change(db, device_pk, history=True)
+        DataPointCounterService.add(db, months)
+        DataPointCounterService.add_buckets(db, buckets)
+
+    @staticmethod
+    def remove_device(db: Session, device_pk: int):
+        """Drop all counters of a device"""
+        db.execute(delete(DataPointCounter).where(DataPointCounter.device_id == device_pk))
+        db.execute(delete(ReadingCountBucket).where(ReadingCountBucket.device_id == device_pk))
+        note_change(db, device_pk, history=True)
+
+    @staticmethod
+    def total(db: Session, device_pk: Optional[int] = None, month: Optional[date] = None) -> int:
+        """Sum of counters, optionally for one device and/or month"""
+        query = select(func.coalesce(func.sum(DataPointCounter.count), 0))
+        if device_pk is not None:
+            query = query.where(DataPointCounter.device_id == device_pk)
+        if month is not None:
+            query = query.where(DataPointCounter.month == month)
+        return int(db.execute(query).scalar() or 0)
+
+    @staticmethod
+    def _bucket_sum(db: Session, first: datetime, last: datetime, channel: list) -> int:
+        """Sum of buckets starting in [first, last]"""
+        return int(db.execute(
+            select(func.coalesce(func.sum(ReadingCountBucket.count), 0)).where(
+                ReadingCountBucket.bucket_start >= first,
+                ReadingCountBucket.bucket_start <= last,
+                *channel
+            )
+        ).scalar() or 0)
+
+    @staticmethod
+    def _reading_count(db: Session, start: datetime, end: datetime, channel: list, include_end: bool) -> int:
+        """Exact count over a short timestamp range (served by the timestamp index)"""
+        upper = SensorReading.timestamp <= end if include_end else SensorReading.timestamp < end
+        return int(db.execute(
+            select(func.count(SensorReading.id)).where(SensorReading.timestamp >= start, upper, *channel)
+        ).scalar() or 0)
+
+    @staticmethod
+    def count_range(
+        db: Session,
+        start: datetime,
+        end: datetime,
+        device_pk: Optional[int] = None,
+        sensor_type: Optional[str] = None,
+        approximate: bool = False
+    ) -> Tuple[int, str]:
+        """
+        Count readings with start <= timestamp <= end from the hourly histogram
+        Whole hours are summed from buckets. The partial hours at either edge are
+        counted exactly against sensor_readings, or prorated from their buckets
+        when approximate=True.
+        
+        Returns:
+            (count, count_mode) where count_mode is "exact" or "bucket_approximate"
+        """
+        start, end = naive_utc(start), naive_utc(end)
+        if end < start:
+            return 0, COUNT_EXACT
+
+        first_full = hour_start(start)
+        if first_full < start:
+            first_full += BUCKET_WIDTH
+        last_full_end = hour_start(end)
+        reading_channel = _channel_filter(SensorReading, device_pk, sensor_type)
+
+        if first_full >= last_full_end:
+            # No whole hour inside the range; a direct count touches at most two hours
+            return DataPointCounterService._reading_count(db, start, end, reading_channel, include_end=True), COUNT_EXACT
+
+        bucket_channel = _channel_filter(ReadingCountBucket, device_pk, sensor_type)
+        total = DataPointCounterService._bucket_sum(db, first_full, last_full_end - BUCKET_WIDTH, bucket_channel)
+
+        if not approximate:
+            if start < first_full:
+                total += DataPointCounterService._reading_count(db, start, first_full, reading_channel, include_end=False)
+            total += DataPointCounterService._reading_count(db, last_full_end, end, reading_channel, include_end=True)
+            return total, COUNT_EXACT
+
+        # Prorate the edge buckets by the fraction of the hour inside the range
+        estimate = float(total)
+        if start < first_full:
+            head_start = first_full - BUCKET_WIDTH
+            head = DataPointCounterService._bucket_sum(db, head_start, head_start, bucket_channel)
+            estimate += head * ((first_full - start) / BUCKET_WIDTH)
+        if end > last_full_end:
+            tail = DataPointCounterService._bucket_sum(db, last_full_end, last_full_end, bucket_channel)
+            estimate += tail * ((end - last_full_end) / BUCKET_WIDTH)
+        return int(round(estimate)), COUNT_BUCKET_APPROXIMATE
+
+    @staticmethod
+    def bucket_upper_bound(
+        db: Session,
+        start: datetime,
+        end: datetime,
+        device_pk: Optional[int] = None,
+        sensor_type: Optional[str] = None
+    ) -> int:
+        """
+        Readings in every hourly bucket the range touches: never less than the
+        exact count, and cheap enough to check before running a range query
+        """
+        start, end = naive_utc(start), naive_utc(end)
+        if end < start:
+            return 0
+        return DataPointCounterService._bucket_sum(
+            db, hour_start(start), hour_start(end), _channel_filter(ReadingCountBucket, device_pk, sensor_type)
+        )
+
+    @staticmethod
+    def _snapshot_month(db: Session, month: date) -> Tuple[Dict[tuple, int], Dict[tuple, int], Dict[tuple, int]]:
+        """
+        Actual hourly counts of a month's readings, with its stored buckets
+        and counters, read in one snapshot; ends the transaction
+        Ingest writes readings and counters in one transaction, so the two
+        agree within the snapshot and their difference is the month's drift.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            # Statements in READ COMMITTED would each see a different moment
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        first, last = month_bounds(month)
+        try:
+            hour = hour_expression(db).label("hour")
+            actual = {
+                (as_datetime(row_hour), device_pk, sensor_type): count
+                for row_hour, device_pk, sensor_type, count in db.execute(
+                    select(hour, SensorReading.device_id, SensorReading.sensor_type, func.count(SensorReading.id))
+                    .where(SensorReading.timestamp >= first, SensorReading.timestamp < last)
+                    .group_by(hour, SensorReading.device_id, SensorReading.sensor_type)
+                )
+            }
+            buckets = {
+                (bucket_start, device_pk, sensor_type): count
+                for bucket_start, device_pk, sensor_type, count in db.execute(
+                    select(
+                        ReadingCountBucket.bucket_start, ReadingCountBucket.device_id,
+                        ReadingCountBucket.sensor_type, ReadingCountBucket.count
+                    ).where(ReadingCountBucket.bucket_start >= first, ReadingCountBucket.bucket_start < last)
+                )
+            }
+            counters = {
+                (month, device_pk): count
+                for device_pk, count in db.execute(
+                    select(DataPointCounter.device_id, DataPointCounter.count).where(DataPointCounter.month == month)
+                )
+            }
+        finally:
+            db.rollback()
+        return actual, buckets, counters
+
+    @staticmethod
+    def _months(db: Session) -> list:
+        """Months holding readings, counters or buckets, oldest first"""
+        months = set(db.execute(select(DataPointCounter.month).distinct()).scalars())
+        # Both ranges are index lookups: the timestamp index and the buckets' primary key
+        ranges = [
+            db.execute(select(func.min(SensorReading.timestamp), func.max(SensorReading.timestamp))).one(),
+            db.execute(select(func.min(ReadingCountBucket.bucket_start), func.max(ReadingCountBucket.bucket_start))).one()
+        ]
+        for first, last in ranges:
+            if first is None:
+                continue
+            month, last_month = month_start(as_datetime(first)), month_start(as_datetime(last))
+            while month <= last_month:
+                months.add(month)
+                month = month_bounds(month)[1].date()
+        db.rollback()
+        return sorted(months)
+
+    @staticmethod
+    def reconcile(db: Session, recent_months: int = 0) -> dict:
+        """
+        Correct counter and histogram drift against sensor_readings, one month at a time
+        Each month's counts are read in one snapshot and the differences are
+        applied as increments, which commute with concurrent ingest, so
+        nothing is locked beyond the rows being incremented. With
+        recent_months, only the current month and the ones before it, up to
+        that many, are checked (and any later ones).
+        """
+        try:
+            months = DataPointCounterService._months(db)
+            if recent_months > 0:
+                first = month_start(datetime.utcnow())
+                for _ in range(recent_months - 1):
+                    first = month_start(first - timedelta(days=1))
+                months = [month for month in months if month >= first]
+            before = after = counter_rows = bucket_rows = 0
+            for month in months:
+                actual, buckets, counters = DataPointCounterService._snapshot_month(db, month)
+                months = Counter()
+                for (_, device_pk, _), count in actual.items():
+                    months[(month, device_pk)] += count
+                before += sum(counters.values())
+                after += sum(months.values())
+                counter_rows += len(months)
+                bucket_rows += len(actual)
+
+                month_deltas = Counter(months)
+                month_deltas.subtract(counters)
+                bucket_deltas = Counter(actual)
+                bucket_deltas.subtract(buckets)
+                if not any(month_deltas.values()) and not any(bucket_deltas.values()):
+                    continue
+
+                DataPointCounterService.add(db, month_deltas)
+                DataPointCounterService.add_buckets(db, bucket_deltas)
+                # Rows whose readings are all gone; one incremented meanwhile no longer matches
+                first, last = month_bounds(month)
+                db.execute(delete(DataPointCounter).where(DataPointCounter.month == month, DataPointCounter.count == 0))
+                db.execute(delete(ReadingCountBucket).where(
+                    ReadingCountBucket.bucket_start >= first,
+                    ReadingCountBucket.bucket_start < last,
+                    ReadingCountBucket.count == 0
+                ))
+                # Cached results may have been computed from drifted counters
+                note_change(db, None)
+                db.commit()
+
+            if before != after:
+                logger.warning(f"[Counters] Reconciled counter drift: {before} -> {after}")
+            else:
+                logger.info(f"[Counters] Reconciled {counter_rows} counters, no drift")
+            return {
+                "counters": counter_rows,
+                "buckets": bucket_rows,
+                "total_before": before,
+                "total_after": after,
+                "drift": after - before
+            }
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[Counters] Error reconciling counters: {str(e)}")
+            raise
+
+
+async def run_reconciliation_loop(session_factory, interval_seconds: float, recent_months: int = 0):
+    """Background task: reconcile the `recent_months` (0: all) every `interval_seconds` until cancelled"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        db = session_factory()
+        try:
+            await run_in_threadpool(DataPointCounterService.reconcile, db, recent_months)
+        except Exception as e:
+            logger.error(f"[Counters] Scheduled reconciliation failed: {str(e)}")
+        finally:
+            await run_in_threadpool(db.close)
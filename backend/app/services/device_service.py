@@ -1,9 +1,21 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
 from fastapi import HTTPException, status
-from app.models.sensor import Device
+from app.models.sensor import Device, SensorReading
 from app.schemas.device import DeviceCreate
 from datetime import datetime
+from typing import List
+from app.db.database import SessionLocal
+from app.core.config import settings
 from app.core.logger import logger
+from app.services.counter_service import DataPointCounterService
+from app.services.rollup_service import RollupService
+from app.services.archive_service import ArchiveService
+from app.services.retention_service import RetentionService
+from app.services.job_service import Job, job_manager, ACTIVE_STATUSES
+
+DEVICE_DELETE_JOB = "device_delete"
+DEVICE_DELETING = "deleting"
 
 class DeviceService:
     @staticmethod
@@ -19,6 +31,33 @@ class DeviceService:
                 detail=f"Error retrieving devices: {str(e)}"
             )
     
+    @staticmethod
+    def get_all_device_rows(db: Session) -> List[dict]:
+        """
+        Get all devices as plain dicts shaped like DeviceResponse
+        Used by list endpoints that encode rows directly without re-validation
+        """
+        try:
+            rows = db.execute(
+                select(
+                    Device.device_id,
+                    Device.name,
+                    Device.device_type,
+                    Device.id,
+                    Device.status,
+                    Device.last_seen,
+                    Device.created_at,
+                    Device.updated_at
+                )
+            ).mappings().all()
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting all devices: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error retrieving devices: {str(e)}"
+            )
+    
     @staticmethod
     def get_device_by_id(db: Session, device_id: int):
         """Get device by database ID"""
@@ -73,15 +112,20 @@ class DeviceService:
             )
     
     @staticmethod
-    def update_device_status(db: Session, device_id: str, status: str):
+    def update_device_status(db: Session, device_id: str, new_status: str):
         """Update device online/offline status"""
         device = DeviceService.get_device_by_device_id(db, device_id)
+        if device.status == DEVICE_DELETING:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Device {device_id} is being deleted"
+            )
         try:
-            device.status = status
+            device.status = new_status
             device.last_seen = datetime.utcnow()
             db.commit()
             db.refresh(device)
-            logger.info(f"Updated device {device_id} status to {status}")
+            logger.info(f"Updated device {device_id} status to {new_status}")
             return device
         except Exception as e:
             db.rollback()
@@ -92,14 +136,68 @@ class DeviceService:
             )
     
     @staticmethod
-    def delete_device(db: Session, device_id: int):
-        """Delete a device"""
-        device = DeviceService.get_device_by_id(db, device_id)
+    def run_delete_job(job: Job, device_pk: int, device_id: str) -> dict:
+        """
+        Job body: purge a device's readings in chunks, then its counters,
+        rollups, archive and the device row itself
+        Re-running it (resume) continues with whatever readings are left.
+        """
+        db = SessionLocal()
         try:
-            db.delete(device)
+            job.update(
+                device_id=device_id,
+                estimated_total=DataPointCounterService.total(db, device_pk),
+                deleted=0,
+                batches=0
+            )
+            deleted = RetentionService.delete_matching(
+                db,
+                SensorReading.device_id == device_pk,
+                batch_size=settings.RETENTION_BATCH_SIZE,
+                batch_sleep=settings.RETENTION_BATCH_SLEEP_SECONDS,
+                archive=False,
+                job=job
+            )
+            
+            # Sweep readings that slipped in after the last chunk (ON DELETE
+            # CASCADE does this too, but SQLite doesn't enforce foreign keys)
+            DataPointCounterService.remove_device(db, device_pk)
+            RollupService.remove_device(db, device_pk)
+            db.execute(delete(SensorReading).where(SensorReading.device_id == device_pk))
+            db.execute(delete(Device).where(Device.id == device_pk))
             db.commit()
-            logger.info(f"Deleted device: {device.device_id}")
-            return {"message": f"Device {device.device_id} deleted successfully"}
+            if ArchiveService.enabled():
+                ArchiveService.remove_device(device_pk)
+            logger.info(f"Deleted device {device_id} and {deleted} sensor readings")
+            return {"device_id": device_id, "deleted": deleted}
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    @staticmethod
+    def mark_deleting(db: Session, device_id: str) -> Device:
+        """
+        Flag a device as being deleted, so ingest and status updates stop
+        A device left in "deleting" by an interrupted job can be deleted again.
+        """
+        device = DeviceService.get_device_by_device_id(db, device_id)
+        active = next((
+            job for job in job_manager.list(DEVICE_DELETE_JOB)
+            if job.status in ACTIVE_STATUSES and job.progress.get("device_id") == device_id
+        ), None)
+        if active is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Device {device_id} is already being deleted (job {active.id})"
+            )
+        
+        try:
+            device.status = DEVICE_DELETING
+            db.commit()
+            db.refresh(device)
+            return device
         except Exception as e:
             db.rollback()
             logger.error(f"Error deleting device: {str(e)}")
@@ -107,3 +205,11 @@ class DeviceService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error deleting device: {str(e)}"
             )
+    
+    @staticmethod
+    def start_delete_job(device: Device) -> Job:
+        """Purge a device marked as deleting in a background job (call from the event loop)"""
+        job = job_manager.submit(DEVICE_DELETE_JOB, DeviceService.run_delete_job, device.id, device.device_id)
+        job.update(device_id=device.device_id)
+        logger.info(f"Started deleting device {device.device_id} (job {job.id})")
+        return job
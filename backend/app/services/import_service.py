@@ -0,0 +1,218 @@
+"""
+Import Service
+Bulk loading of historical sensor readings from CSV, NDJSON or Parquet files,
+streamed in fixed-size chunks so memory is bounded by chunk size, not file size
+
+Each record needs device_id, sensor_type, value and timestamp (ISO 8601 or
+epoch seconds); unit is optional. Unknown devices are created on the fly.
+"""
+
+import csv
+import itertools
+import math
+import os
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional
+import orjson
+from fastapi import HTTPException, UploadFile, status
+from app.db.database import SessionLocal
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.ingest_service import IngestService, parse_timestamp
+from app.services.job_service import Job, job_manager
+
+IMPORT_JOB = "import"
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet"}
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def detect_format(filename: str, fmt: Optional[str] = None) -> str:
+    """The import format given explicitly or by the file extension"""
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in set(FORMATS.values()):
+            raise ValueError(f"Unsupported format {fmt} (expected csv, ndjson or parquet)")
+        return fmt
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Can't tell the format of {filename}; use a .csv, .ndjson or .parquet file")
+    return FORMATS[extension]
+
+
+def _read_records(path: str, fmt: str, chunk_size: int) -> Iterator:
+    """Stream the raw records of a file: dicts, or undecoded lines for NDJSON"""
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif fmt == "ndjson":
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield line
+    else:
+        # Only needed for Parquet imports
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield from batch.to_pylist()
+
+
+def _parse_record(record) -> tuple:
+    """(public device id, sensor_type, value, unit, timestamp) from a raw record; raises ValueError"""
+    if isinstance(record, bytes):
+        try:
+            record = orjson.loads(record)
+        except orjson.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {str(e)}")
+        if not isinstance(record, dict):
+            raise ValueError("expected a JSON object")
+
+    device_id = record.get("device_id")
+    sensor_type = record.get("sensor_type")
+    if device_id in (None, "") or sensor_type in (None, ""):
+        raise ValueError("device_id and sensor_type are required")
+    try:
+        value = float(record.get("value"))
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid value {record.get('value')!r}")
+    if not math.isfinite(value):
+        raise ValueError(f"invalid value {record.get('value')!r}")
+    try:
+        timestamp = parse_timestamp(record.get("timestamp"))
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise ValueError(f"invalid timestamp {record.get('timestamp')!r}")
+    unit = record.get("unit") or None
+    return str(device_id), str(sensor_type), value, unit, timestamp
+
+
+class ImportService:
+    """Bulk import of sensor readings"""
+
+    @staticmethod
+    def import_file(path: str, fmt: Optional[str] = None, chunk_size: Optional[int] = None, job: Job = None) -> dict:
+        """
+        Import a file of readings chunk by chunk, one COPY and commit per chunk
+        Invalid rows are skipped and reported. The number of records done is
+        kept next to the file (`<path>.offset`), so re-running an interrupted
+        import continues after the last committed chunk instead of duplicating it.
+        """
+        fmt = detect_format(path, fmt)
+        chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        offset_path = f"{path}.offset"
+        resumed_at = 0
+        if os.path.exists(offset_path):
+            with open(offset_path) as f:
+                resumed_at = int(f.read().strip() or 0)
+
+        records = itertools.islice(_read_records(path, fmt, chunk_size), resumed_at, None)
+        devices: Dict[str, Optional[int]] = {}
+        created: List[str] = []
+        errors: List[dict] = []
+        imported = skipped = chunks = 0
+        record_number = resumed_at
+        started = time.perf_counter()
+
+        db = SessionLocal()
+        try:
+            while True:
+                chunk = list(itertools.islice(records, chunk_size))
+                if not chunk:
+                    break
+
+                parsed = []
+                for record in chunk:
+                    record_number += 1
+                    try:
+                        parsed.append((record_number, *_parse_record(record)))
+                    except ValueError as e:
+                        skipped += 1
+                        if len(errors) < settings.IMPORT_MAX_ERRORS:
+                            errors.append({"record": record_number, "error": str(e)})
+
+                _, new_devices = IngestService.resolve_devices(db, [row[1] for row in parsed], devices)
+                created.extend(new_devices)
+                rows = []
+                for number, device_id, sensor_type, value, unit, timestamp in parsed:
+                    device_pk = devices.get(device_id)
+                    if device_pk is None:
+                        skipped += 1
+                        if len(errors) < settings.IMPORT_MAX_ERRORS:
+                            errors.append({"record": number, "error": f"device {device_id} is being deleted"})
+                        continue
+                    rows.append((device_pk, sensor_type, value, unit, timestamp))
+
+                IngestService.insert_readings(db, rows)
+                db.commit()
+                with open(offset_path, "w") as f:
+                    f.write(str(record_number))
+
+                imported += len(rows)
+                chunks += 1
+                elapsed = time.perf_counter() - started
+                rows_per_second = round(imported / elapsed) if elapsed > 0 else None
+                logger.info(f"[Import] {os.path.basename(path)}: {imported} rows ({rows_per_second} rows/s)")
+                if job is not None:
+                    job.update(
+                        records=record_number,
+                        imported=imported,
+                        skipped=skipped,
+                        chunks=chunks,
+                        rows_per_second=rows_per_second
+                    )
+                    job.check_cancelled()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if os.path.exists(offset_path):
+            os.remove(offset_path)
+        elapsed = time.perf_counter() - started
+        return {
+            "file": os.path.basename(path),
+            "format": fmt,
+            "imported": imported,
+            "skipped": skipped,
+            "errors": errors,
+            "devices_created": created,
+            "resumed_at": resumed_at,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(imported / elapsed) if elapsed > 0 else None
+        }
+
+    @staticmethod
+    def run_import_job(job: Job, path: str, fmt: str) -> dict:
+        """Job body: import an uploaded file, removing it once it's fully imported"""
+        job.update(file=os.path.basename(path), format=fmt)
+        result = ImportService.import_file(path, fmt, job=job)
+        os.remove(path)
+        return result
+
+    @staticmethod
+    async def store_upload(upload: UploadFile, fmt: Optional[str] = None) -> tuple:
+        """
+        Stream an uploaded file to IMPORT_DIR without holding it in memory
+
+        Returns:
+            (path, format)
+        """
+        try:
+            fmt = detect_format(upload.filename, fmt)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        os.makedirs(settings.IMPORT_DIR, exist_ok=True)
+        path = os.path.join(settings.IMPORT_DIR, f"{uuid.uuid4().hex}.{fmt}")
+        with open(path, "wb") as f:
+            while True:
+                data = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not data:
+                    break
+                f.write(data)
+        return path, fmt
+
+    @staticmethod
+    def start_import_job(path: str, fmt: str) -> Job:
+        """Import a stored upload in a background job (call from the event loop)"""
+        return job_manager.submit(IMPORT_JOB, ImportService.run_import_job, path, fmt)
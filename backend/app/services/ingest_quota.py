@@ -0,0 +1,293 @@
+"""
+Ingest Quota Service
+Enforces per-device and global data-point rates at ingest time with in-memory
+token buckets, so a runaway device is throttled before it reaches the database
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from app.core.config import settings
+from app.core.logger import logger
+
+ACTION_REJECT = "reject"
+ACTION_SAMPLE = "sample"
+ACTION_FLAG = "flag"
+ACTIONS = (ACTION_REJECT, ACTION_SAMPLE, ACTION_FLAG)
+
+# Seconds between "quota exceeded" warnings for the same device
+WARN_INTERVAL = 60.0
+# Longest Retry-After reported; a zero rate never refills
+MAX_RETRY_AFTER = 3600.0
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second up to `capacity`; not thread-safe on its own"""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def seconds_until(self, points: float) -> float:
+        """Time until `points` tokens are available (after refill)"""
+        if self.tokens >= points:
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (points - self.tokens) / self.rate
+
+
+@dataclass
+class IngestDecision:
+    """Outcome of an admission check"""
+    allowed: bool
+    over_quota: bool = False
+    scope: Optional[str] = None  # "device" or "global" when over quota
+    retry_after: float = 0.0  # Seconds until the points would fit, at most MAX_RETRY_AFTER
+
+
+class _DeviceStats:
+    """A device's bucket and counters"""
+    __slots__ = (
+        "bucket", "accepted", "rejected", "sampled_out", "flagged",
+        "over_quota_seen", "last_exceeded", "last_warned", "last_seen"
+    )
+
+    def __init__(self, bucket: TokenBucket, now: float):
+        self.bucket = bucket
+        self.accepted = 0
+        self.rejected = 0
+        self.sampled_out = 0
+        self.flagged = 0
+        self.over_quota_seen = 0  # Over-quota points so far, for sampling
+        self.last_exceeded: Optional[float] = None
+        self.last_warned = 0.0
+        self.last_seen = now
+
+
+class IngestQuota:
+    """
+    Per-device and global token buckets with a configurable over-quota action
+    - reject: drop points that don't fit
+    - sample: keep one in every `sample_keep_one_in` over-quota points
+    - flag: keep everything, but count and report the excess
+    Device ids come from MQTT topics, so per-device state is bounded: devices
+    idle for `idle_seconds` are dropped (their buckets have refilled by
+    then), and beyond `max_devices` the least recently seen one is.
+    """
+
+    def __init__(
+        self,
+        device_rate: float,
+        device_burst: float,
+        global_rate: float,
+        global_burst: float,
+        action: str = ACTION_REJECT,
+        sample_keep_one_in: int = 10,
+        enabled: bool = True,
+        max_devices: int = 10000,
+        idle_seconds: float = 3600.0
+    ):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown ingest quota action '{action}', expected one of {ACTIONS}")
+        self.enabled = enabled
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.action = action
+        self.sample_keep_one_in = max(1, sample_keep_one_in)
+        self.max_devices = max(1, max_devices)
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._global = TokenBucket(global_rate, global_burst, self._started)
+        # Least recently seen first
+        self._devices: "OrderedDict[str, _DeviceStats]" = OrderedDict()
+        self.evicted = 0
+
+    def _device(self, device_id: str, now: float) -> _DeviceStats:
+        """The device's state, created or moved to the recent end; caller holds the lock"""
+        stats = self._devices.get(device_id)
+        if stats is not None:
+            stats.last_seen = now
+            self._devices.move_to_end(device_id)
+            return stats
+        while self._devices:
+            oldest = next(iter(self._devices.values()))
+            if len(self._devices) < self.max_devices and now - oldest.last_seen < self.idle_seconds:
+                break
+            self._devices.popitem(last=False)
+            self.evicted += 1
+        stats = self._devices[device_id] = _DeviceStats(TokenBucket(self.device_rate, self.device_burst, now), now)
+        return stats
+
+    def _retry_after(self, bucket: TokenBucket, points: float) -> float:
+        """Seconds until `points` fit both buckets, capped so it stays a usable header value"""
+        return min(MAX_RETRY_AFTER, max(bucket.seconds_until(points), self._global.seconds_until(points)))
+
+    def admit(self, device_id: str, points: int = 1) -> IngestDecision:
+        """Account for `points` data points from a device and decide whether to store them"""
+        if not self.enabled:
+            return IngestDecision(allowed=True)
+
+        now = time.monotonic()
+        with self._lock:
+            stats = self._device(device_id, now)
+            bucket = stats.bucket
+            bucket.refill(now)
+            self._global.refill(now)
+
+            if bucket.tokens >= points and self._global.tokens >= points:
+                bucket.tokens -= points
+                self._global.tokens -= points
+                stats.accepted += points
+                return IngestDecision(allowed=True)
+
+            scope = "device" if bucket.tokens < points else "global"
+            retry_after = self._retry_after(bucket, points)
+            stats.last_exceeded = time.time()
+            stats.over_quota_seen += 1
+
+            if self.action == ACTION_FLAG:
+                allowed = True
+                stats.flagged += points
+                stats.accepted += points
+            elif self.action == ACTION_SAMPLE and stats.over_quota_seen % self.sample_keep_one_in == 0:
+                allowed = True
+                stats.accepted += points
+            elif self.action == ACTION_SAMPLE:
+                allowed = False
+                stats.sampled_out += points
+            else:
+                allowed = False
+                stats.rejected += points
+
+            warn = now - stats.last_warned >= WARN_INTERVAL
+            if warn:
+                stats.last_warned = now
+
+        if warn:
+            logger.warning(
+                f"[IngestQuota] {device_id} exceeded the {scope} ingest quota, action={self.action}"
+            )
+        return IngestDecision(allowed=allowed, over_quota=True, scope=scope, retry_after=retry_after)
+
+    def refund(self, device_id: str, points: int):
+        """Return the tokens of admitted points that weren't stored after all (device being deleted, failed write)"""
+        if not self.enabled or points <= 0:
+            return
+        with self._lock:
+            stats = self._devices.get(device_id)
+            if stats is None:
+                return
+            for bucket in (stats.bucket, self._global):
+                bucket.tokens = min(bucket.capacity, bucket.tokens + points)
+            stats.accepted = max(0, stats.accepted - points)
+
+    def admit_batch(self, device_id: str, points: int) -> Tuple[int, IngestDecision]:
+        """
+        Account for a batch of `points` data points from a device, admitting as many as fit
+        Unlike admit(), a batch larger than the bucket is split rather than refused.
+
+        Returns:
+            (number of the batch's points to store, in order; decision for the excess)
+        """
+        if not self.enabled or points <= 0:
+            return points, IngestDecision(allowed=True)
+
+        now = time.monotonic()
+        with self._lock:
+            stats = self._device(device_id, now)
+            bucket = stats.bucket
+            bucket.refill(now)
+            self._global.refill(now)
+
+            fit = max(0, min(points, int(bucket.tokens), int(self._global.tokens)))
+            bucket.tokens -= fit
+            self._global.tokens -= fit
+            stats.accepted += fit
+            excess = points - fit
+            if excess == 0:
+                return points, IngestDecision(allowed=True)
+
+            scope = "device" if bucket.tokens <= self._global.tokens else "global"
+            retry_after = self._retry_after(bucket, excess)
+            stats.last_exceeded = time.time()
+            seen_before = stats.over_quota_seen
+            stats.over_quota_seen += excess
+
+            if self.action == ACTION_FLAG:
+                kept = excess
+                stats.flagged += excess
+            elif self.action == ACTION_SAMPLE:
+                kept = stats.over_quota_seen // self.sample_keep_one_in - seen_before // self.sample_keep_one_in
+                stats.sampled_out += excess - kept
+            else:
+                kept = 0
+                stats.rejected += excess
+            stats.accepted += kept
+
+            warn = now - stats.last_warned >= WARN_INTERVAL
+            if warn:
+                stats.last_warned = now
+
+        if warn:
+            logger.warning(
+                f"[IngestQuota] {device_id} exceeded the {scope} ingest quota, action={self.action}"
+            )
+        return fit + kept, IngestDecision(allowed=kept == excess, over_quota=True, scope=scope, retry_after=retry_after)
+
+    def snapshot(self) -> dict:
+        """Configuration, global bucket level and per-device counters for the metrics API"""
+        now = time.monotonic()
+        with self._lock:
+            self._global.refill(now)
+            devices = {}
+            for device_id, stats in self._devices.items():
+                bucket = stats.bucket
+                bucket.refill(now)
+                devices[device_id] = {
+                    "tokens": round(bucket.tokens, 2),
+                    "accepted": stats.accepted,
+                    "rejected": stats.rejected,
+                    "sampled_out": stats.sampled_out,
+                    "flagged": stats.flagged,
+                    "exceeded": stats.rejected + stats.sampled_out + stats.flagged > 0,
+                    "last_exceeded": stats.last_exceeded
+                }
+            return {
+                "enabled": self.enabled,
+                "action": self.action,
+                "device_rate_per_second": self.device_rate,
+                "device_burst": self.device_burst,
+                "global_rate_per_second": self._global.rate,
+                "global_burst": self._global.capacity,
+                "global_tokens": round(self._global.tokens, 2),
+                "uptime_seconds": round(now - self._started, 1),
+                "devices_tracked": len(devices),
+                "devices_evicted": self.evicted,
+                "devices_over_quota": sorted(d for d, s in devices.items() if s["exceeded"]),
+                "devices": devices
+            }
+
+
+ingest_quota = IngestQuota(
+    device_rate=settings.INGEST_DEVICE_RATE,
+    device_burst=settings.INGEST_DEVICE_BURST,
+    global_rate=settings.INGEST_GLOBAL_RATE,
+    global_burst=settings.INGEST_GLOBAL_BURST,
+    action=settings.INGEST_QUOTA_ACTION,
+    sample_keep_one_in=settings.INGEST_SAMPLE_KEEP_ONE_IN,
+    enabled=settings.INGEST_QUOTA_ENABLED,
+    max_devices=settings.INGEST_QUOTA_MAX_DEVICES,
+    idle_seconds=settings.INGEST_QUOTA_IDLE_SECONDS
+)
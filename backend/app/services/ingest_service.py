@@ -0,0 +1,437 @@
+"""
+Ingest Service
+Shared batched write path for sensor readings: MQTT micro-batches, the HTTP
+batch endpoint and bulk imports resolve devices and insert readings here
+"""
+
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.db.bulk import bulk_insert
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.sensor import Device, SensorReading
+from app.services.counter_service import DataPointCounterService, dialect_insert, naive_utc
+from app.services.device_service import DEVICE_DELETING
+from app.services.ingest_quota import IngestDecision, ingest_quota
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # Without pyarrow batches are validated element by element
+    pa = None
+
+READING_COLUMNS = ("device_id", "sensor_type", "value", "unit", "timestamp")
+# Epoch seconds datetime can represent (0001-01-01 to 9999-12-31)
+EPOCH_RANGE = (-62135596800, 253402300799)
+
+
+def parse_timestamp(value) -> datetime:
+    """Naive UTC datetime from a datetime, epoch seconds or an ISO 8601 string"""
+    if isinstance(value, datetime):
+        return naive_utc(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+    if isinstance(value, str) and value:
+        try:
+            return naive_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        except ValueError:
+            return datetime.fromtimestamp(float(value), tz=timezone.utc).replace(tzinfo=None)
+    raise ValueError("timestamp is required")
+
+
+def _is_sequence(values) -> bool:
+    return isinstance(values, (list, tuple)) or (pa is not None and isinstance(values, (pa.Array, pa.ChunkedArray)))
+
+
+def _column(columns: dict, name: str, length: int, required: bool = True):
+    """A column as a list or Arrow array of `length` values; a scalar applies to every reading"""
+    values = columns.get(name)
+    if _is_sequence(values):
+        if len(values) != length:
+            raise ValueError(f"Column {name} has {len(values)} values, expected {length}")
+        return values
+    if values is None and required:
+        raise ValueError(f"Column {name} is required")
+    return [values] * length
+
+
+def _pylist(values) -> list:
+    return list(values) if isinstance(values, (list, tuple)) else values.to_pylist()
+
+
+def _arrow(values, null_type: str, *kinds: str):
+    """
+    values as one Arrow array if pyarrow is installed and its type is one of
+    `kinds` (pyarrow.types predicate names), with an all-null column cast to
+    `null_type`; otherwise None, and mixed types are checked element by element
+    """
+    if pa is None:
+        return None
+    if isinstance(values, pa.ChunkedArray):
+        array = values.combine_chunks()
+    elif isinstance(values, pa.Array):
+        array = values
+    else:
+        try:
+            array = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            return None
+    if pa.types.is_null(array.type):
+        return array.cast(null_type)
+    return array if any(getattr(pa.types, kind)(array.type) for kind in kinds) else None
+
+
+def _flag(errors: Dict[int, str], invalid, message) -> None:
+    """Record `message(index)` for every index where the boolean array `invalid` is true or null"""
+    for index in pc.indices_nonzero(pc.fill_null(invalid, True)).to_pylist():
+        errors.setdefault(index, message(index))
+
+
+def _check_text(values, name: str, errors: Dict[int, str]) -> list:
+    """Validate a column of non-empty strings"""
+    array = _arrow(values, "string", "is_string")
+    if array is not None:
+        _flag(errors, pc.equal(pc.utf8_length(array), 0), lambda index: f"{name} must be a non-empty string")
+        return array.to_pylist()
+    values = _pylist(values)
+    for index, value in enumerate(values):
+        if not isinstance(value, str) or not value:
+            errors.setdefault(index, f"{name} must be a non-empty string")
+    return values
+
+
+def _check_values(values, errors: Dict[int, str]) -> list:
+    """Validate a column of finite numbers"""
+    array = _arrow(values, "double", "is_floating", "is_integer")
+    if array is not None:
+        numbers = array.cast(pa.float64(), safe=False)
+        _flag(errors, pc.invert(pc.is_finite(numbers)), lambda index: f"invalid value {array[index].as_py()!r}")
+        return numbers.to_pylist()
+    values = _pylist(values)
+    for index, value in enumerate(values):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            errors.setdefault(index, f"invalid value {value!r}")
+    return [float(value) if index not in errors else None for index, value in enumerate(values)]
+
+
+def _check_units(units, errors: Dict[int, str]) -> list:
+    """Validate a column of optional strings"""
+    array = _arrow(units, "string", "is_string")
+    if array is not None:
+        return array.to_pylist()
+    units = _pylist(units)
+    for index, unit in enumerate(units):
+        if unit is not None and not isinstance(unit, str):
+            errors.setdefault(index, f"invalid unit {unit!r}")
+    return units
+
+
+def _check_timestamps(timestamps, errors: Dict[int, str]) -> list:
+    """
+    Parse a timestamp column to naive UTC; missing timestamps are now
+    Epoch seconds and Arrow timestamps are converted as whole columns, ISO
+    strings one by one (fromisoformat accepts offsets Arrow's parser doesn't).
+    """
+    now = datetime.utcnow()
+    array = _arrow(timestamps, "timestamp[us]", "is_timestamp", "is_floating", "is_integer")
+    if array is not None:
+        if pa.types.is_timestamp(array.type):
+            parsed = array.cast(pa.timestamp("us", array.type.tz)).cast(pa.timestamp("us"))
+        else:
+            seconds = array.cast(pa.float64(), safe=False)
+            out_of_range = pc.invert(pc.and_(
+                pc.is_finite(seconds),
+                pc.and_(pc.greater_equal(seconds, EPOCH_RANGE[0]), pc.less_equal(seconds, EPOCH_RANGE[1]))
+            ))
+            # Nulls are "now", not errors
+            _flag(errors, pc.and_(out_of_range, pc.is_valid(seconds)), lambda index: f"invalid timestamp {array[index].as_py()!r}")
+            micros = pc.if_else(pc.fill_null(out_of_range, True), None, pc.round(pc.multiply(seconds, 1_000_000)))
+            parsed = micros.cast(pa.int64()).cast(pa.timestamp("us"))
+        return [now if value is None else value for value in parsed.to_pylist()]
+
+    parsed_timestamps = []
+    for index, timestamp in enumerate(_pylist(timestamps)):
+        if timestamp is None:
+            parsed_timestamps.append(now)
+            continue
+        try:
+            parsed_timestamps.append(parse_timestamp(timestamp))
+        except (TypeError, ValueError, OverflowError, OSError):
+            parsed_timestamps.append(None)
+            errors.setdefault(index, f"invalid timestamp {timestamp!r}")
+    return parsed_timestamps
+
+
+class IngestService:
+    """Batched storage of sensor readings"""
+
+    @staticmethod
+    def resolve_devices(db: Session, device_ids, known: Optional[Dict[str, Optional[int]]] = None) -> Tuple[Dict[str, Optional[int]], List[str]]:
+        """
+        Map public device ids to devices.id, creating missing devices like MQTT does
+        Devices being deleted map to None. Ids already in `known` aren't looked up again.
+
+        Returns:
+            (public id -> devices.id, ids of the devices created)
+        """
+        known = {} if known is None else known
+        missing = [device_id for device_id in set(device_ids) if device_id not in known]
+        if not missing:
+            return known, []
+
+        existing = {
+            device_id: (None if device_status == DEVICE_DELETING else pk)
+            for device_id, pk, device_status in db.execute(
+                select(Device.device_id, Device.id, Device.status).where(Device.device_id.in_(missing))
+            ).all()
+        }
+        created = [device_id for device_id in missing if device_id not in existing]
+        if created:
+            now = datetime.utcnow()
+            db.execute(
+                dialect_insert(db, Device.__table__).values([
+                    {
+                        "device_id": device_id,
+                        "name": f"Device {device_id}",
+                        "device_type": "sensor_node",
+                        "status": "offline",
+                        "last_seen": now,
+                        "created_at": now,
+                        "updated_at": now
+                    }
+                    for device_id in created
+                ]).on_conflict_do_nothing(index_elements=["device_id"])
+            )
+            existing.update(db.execute(
+                select(Device.device_id, Device.id).where(Device.device_id.in_(created))
+            ).all())
+            logger.info(f"[Ingest] Created devices: {', '.join(created)}")
+        known.update(existing)
+        return known, created
+
+    @staticmethod
+    def insert_readings(db: Session, rows: List[tuple]) -> int:
+        """
+        Insert (devices.id, sensor_type, value, unit, timestamp) rows and count
+        them in the quota counters, in the caller's transaction
+        """
+        bulk_insert(db, SensorReading.__table__, READING_COLUMNS, rows)
+        DataPointCounterService.record_readings(db, [(row[0], row[1], row[4]) for row in rows])
+        return len(rows)
+
+    @staticmethod
+    def store_readings(db: Session, readings: List[tuple]) -> dict:
+        """
+        Store (public device id, sensor_type, value, unit, timestamp) readings
+        in one transaction: unknown devices are created, offline devices are
+        set online and readings of devices being deleted are dropped
+        """
+        devices, created = IngestService.resolve_devices(db, [reading[0] for reading in readings])
+        rows = [
+            (devices[device_id], sensor_type, value, unit, timestamp)
+            for device_id, sensor_type, value, unit, timestamp in readings
+            if devices.get(device_id) is not None
+        ]
+        device_pks = {row[0] for row in rows}
+        if device_pks:
+            # Like a single reading, data from an offline device brings it online
+            db.execute(
+                update(Device)
+                .where(Device.id.in_(device_pks), Device.status == "offline")
+                .values(status="online", last_seen=datetime.utcnow())
+            )
+        written = IngestService.insert_readings(db, rows)
+        db.commit()
+        return {
+            "written": written,
+            "created": created,
+            "deleting": sorted(device_id for device_id, pk in devices.items() if pk is None)
+        }
+
+    @staticmethod
+    def validate_columns(columns: dict) -> Tuple[list, Dict[int, str]]:
+        """
+        Validate a columnar batch one column at a time
+        Columns: device_id, sensor_type, value and optional unit and timestamp
+        (ISO 8601 or epoch seconds, default now) as lists or Arrow arrays;
+        scalars apply to every reading. With pyarrow, single-typed columns are
+        checked with Arrow compute kernels. Raises ValueError for a malformed batch.
+
+        Returns:
+            (valid readings as (index, device_id, sensor_type, value, unit, timestamp), index -> error)
+        """
+        values = columns.get("value")
+        if not _is_sequence(values):
+            raise ValueError("Column value must be a list")
+        length = len(values)
+        if length > settings.INGEST_BATCH_MAX_ITEMS:
+            raise OverflowError(f"Batch has {length} readings, the limit is {settings.INGEST_BATCH_MAX_ITEMS}")
+
+        errors: Dict[int, str] = {}
+        # Checked in this order, so a reading reports its first invalid column
+        device_ids = _check_text(_column(columns, "device_id", length), "device_id", errors)
+        sensor_types = _check_text(_column(columns, "sensor_type", length), "sensor_type", errors)
+        numbers = _check_values(values, errors)
+        units = _check_units(_column(columns, "unit", length, required=False), errors)
+        parsed_timestamps = _check_timestamps(_column(columns, "timestamp", length, required=False), errors)
+
+        valid = [
+            (index, device_ids[index], sensor_types[index], numbers[index], units[index] or None, parsed_timestamps[index])
+            for index in range(length)
+            if index not in errors
+        ]
+        return valid, errors
+
+    @staticmethod
+    def _refund(readings: list):
+        """Give back the quota charged for admitted readings that weren't stored"""
+        counts: Dict[str, int] = {}
+        for reading in readings:
+            counts[reading[1]] = counts.get(reading[1], 0) + 1
+        for device_id, points in counts.items():
+            ingest_quota.refund(device_id, points)
+
+    @staticmethod
+    def ingest_batch(db: Session, columns: dict) -> Tuple[dict, Optional[IngestDecision]]:
+        """
+        Validate, quota-check and store a columnar batch from a gateway
+        Quota charged for readings that end up not stored is given back.
+
+        Returns:
+            (result with per-index errors, the most restrictive over-quota decision or None)
+        """
+        valid, errors = IngestService.validate_columns(columns)
+
+        # Ingest quota per device; points that don't fit are refused in order
+        by_device: "OrderedDict[str, list]" = OrderedDict()
+        for reading in valid:
+            by_device.setdefault(reading[1], []).append(reading)
+        admitted = []
+        over_quota: Optional[IngestDecision] = None
+        for device_id, readings in by_device.items():
+            kept, decision = ingest_quota.admit_batch(device_id, len(readings))
+            admitted.extend(readings[:kept])
+            for reading in readings[kept:]:
+                errors[reading[0]] = f"ingest quota exceeded ({decision.scope})"
+            if decision.over_quota and (over_quota is None or decision.retry_after > over_quota.retry_after):
+                over_quota = decision
+
+        try:
+            stored = IngestService.store_readings(db, [reading[1:] for reading in admitted])
+        except Exception:
+            IngestService._refund(admitted)
+            raise
+        deleting = set(stored["deleting"])
+        for reading in admitted:
+            if reading[1] in deleting:
+                errors[reading[0]] = f"device {reading[1]} is being deleted"
+        IngestService._refund([reading for reading in admitted if reading[1] in deleting])
+
+        return {
+            "accepted": stored["written"],
+            "rejected": len(errors),
+            "errors": [{"index": index, "error": errors[index]} for index in sorted(errors)],
+            "devices_created": stored["created"]
+        }, over_quota
+
+
+class IngestBatchWriter:
+    """
+    Micro-batches MQTT readings: callbacks enqueue, and a writer thread stores
+    up to `max_rows` readings per transaction, at most `max_delay` seconds late
+    When the queue is full new readings are dropped rather than blocking MQTT.
+    """
+
+    def __init__(self, session_factory, max_rows: int, max_delay: float, queue_size: int):
+        self._session_factory = session_factory
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ingest-batch-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush what's queued and stop the writer thread"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, device_id: str, sensor_type: str, value: float, unit: Optional[str], timestamp: datetime) -> bool:
+        try:
+            self._queue.put_nowait((device_id, sensor_type, value, unit, timestamp))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"[IngestBatch] Queue full, dropped reading {device_id}/{sensor_type}")
+            return False
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: list):
+        db = self._session_factory()
+        try:
+            stored = IngestService.store_readings(db, batch)
+            self.written += stored["written"]
+            self.batches += 1
+            if stored["deleting"]:
+                logger.debug(f"[IngestBatch] Dropped readings for devices being deleted: {', '.join(stored['deleting'])}")
+            logger.debug(f"[IngestBatch] Stored {stored['written']} readings")
+        except Exception as e:
+            db.rollback()
+            self.failed += len(batch)
+            self.last_error = str(e)
+            logger.error(f"[IngestBatch] Error storing {len(batch)} readings: {str(e)}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "running": self._thread is not None,
+            "max_rows": self.max_rows,
+            "max_delay_ms": round(self.max_delay * 1000),
+            "queued": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 1) if self.batches else None,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,167 @@
+"""
+Background Job Service
+Runs long maintenance work (retention, purges, imports) in worker threads
+with progress reporting, cancellation and resume
+"""
+
+import asyncio
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from app.core.logger import logger
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+
+# Finished jobs kept for progress queries
+MAX_FINISHED_JOBS = 100
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when cancellation was requested"""
+
+
+class Job:
+    """
+    One unit of background work
+    The job function receives the Job and should call `update()` to report
+    progress and `check_cancelled()` between batches.
+    """
+
+    def __init__(self, kind: str, fn: Callable, args: tuple, kwargs: dict, resumed_from: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = STATUS_PENDING
+        self.progress: dict = {}
+        self.result = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.resumed_from = resumed_from
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def wait_or_cancel(self, seconds: float):
+        """Sleep between batches, waking up early (and raising) on cancellation"""
+        if seconds > 0 and self._cancel.wait(seconds):
+            raise JobCancelled()
+        self.check_cancelled()
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            progress = dict(self.progress)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "resumed_from": self.resumed_from
+        }
+
+
+class JobManager:
+    """In-process registry of background jobs; must be used from the event loop"""
+
+    def __init__(self):
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, kind: str, fn: Callable, *args, resumed_from: Optional[str] = None, **kwargs) -> Job:
+        """Start `fn(job, *args, **kwargs)` in a worker thread and return its Job"""
+        job = Job(kind, fn, args, kwargs, resumed_from=resumed_from)
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.get_running_loop().create_task(self._run(job))
+        self._prune()
+        logger.info(f"[Jobs] Submitted {kind} job {job.id}")
+        return job
+
+    async def _run(self, job: Job):
+        job.status = STATUS_RUNNING
+        job.started_at = datetime.utcnow()
+        try:
+            job.result = await asyncio.to_thread(job._fn, job, *job._args, **job._kwargs)
+            job.status = STATUS_COMPLETED
+            logger.info(f"[Jobs] {job.kind} job {job.id} completed")
+        except JobCancelled:
+            job.status = STATUS_CANCELLED
+            logger.info(f"[Jobs] {job.kind} job {job.id} cancelled")
+        except Exception as e:
+            job.status = STATUS_FAILED
+            job.error = str(e)
+            logger.error(f"[Jobs] {job.kind} job {job.id} failed: {str(e)}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            self._tasks.pop(job.id, None)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None) -> List[Job]:
+        return [job for job in reversed(self._jobs.values()) if kind is None or job.kind == kind]
+
+    def active(self, kind: str) -> Optional[Job]:
+        """The pending or running job of a kind, if any"""
+        return next((job for job in self._jobs.values() if job.kind == kind and job.status in ACTIVE_STATUSES), None)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None and job.status in ACTIVE_STATUSES:
+            job.cancel()
+        return job
+
+    def resume(self, job_id: str) -> Optional[Job]:
+        """
+        Re-run a cancelled or failed job with its original arguments
+        Job functions are written to be idempotent, so a re-run picks up
+        where the previous one stopped.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in (STATUS_CANCELLED, STATUS_FAILED):
+            return None
+        return self.submit(job.kind, job._fn, *job._args, resumed_from=job.id, **job._kwargs)
+
+    async def shutdown(self):
+        """Cancel running jobs and wait for their current batch to finish"""
+        for job in self._jobs.values():
+            if job.status in ACTIVE_STATUSES:
+                job.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+job_manager = JobManager()
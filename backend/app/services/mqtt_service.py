@@ -1,18 +1,40 @@
 import paho.mqtt.client as mqtt
 from app.core.config import settings
 from app.core.logger import logger
-from app.db.database import SessionLocal
+from app.db.database import IngestSessionLocal
 from app.services.device_service import DeviceService
-from app.services.sensor_service import SensorService
-from app.schemas.device import SensorReadingCreate
-from app.models.sensor import SensorReading
+from app.services.ingest_quota import ingest_quota
+from app.services.ingest_service import IngestBatchWriter
 import json
+from datetime import datetime
 from typing import Optional
+from sqlalchemy.orm import Session
 
 class MQTTService:
     def __init__(self):
         self.client: Optional[mqtt.Client] = None
         self.connected = False
+        self._db: Optional[Session] = None
+        self.writer = IngestBatchWriter(
+            IngestSessionLocal,
+            max_rows=settings.INGEST_BATCH_MAX_ROWS,
+            max_delay=settings.INGEST_BATCH_MAX_DELAY_MS / 1000,
+            queue_size=settings.INGEST_BATCH_QUEUE_SIZE
+        )
+    
+    def _get_db(self) -> Session:
+        """
+        Ingest session reused across messages
+        Callbacks only run on the MQTT network thread, so one session is enough.
+        """
+        if self._db is None:
+            self._db = IngestSessionLocal()
+        return self._db
+    
+    def _release_db(self):
+        """End the message's transaction and return its connection to the ingest pool"""
+        if self._db is not None and self._db.in_transaction():
+            self._db.rollback()
         
     def on_connect(self, client, userdata, flags, rc):
         """Callback when connected to MQTT broker"""
@@ -68,7 +90,7 @@ class MQTTService:
     def _handle_status_message(self, device_id: str, payload: str):
         """Handle device status messages (online/offline)"""
         try:
-            db = SessionLocal()
+            db = self._get_db()
             try:
                 status = payload.lower()
                 if status in ["online", "offline"]:
@@ -95,63 +117,34 @@ class MQTTService:
                         else:
                             raise e
             finally:
-                db.close()
+                self._release_db()
         except Exception as e:
             logger.error(f"Error handling status message for {device_id}: {str(e)}")
 
     
     def _handle_sensor_message(self, device_id: str, sensor_type: str, payload: str):
-        """Handle sensor data messages"""
+        """
+        Handle sensor data messages
+        Readings are queued for the batch writer, which creates unknown
+        devices and sets offline ones online as it stores them.
+        """
+        # Enforce the ingest quota before touching the database
+        if not ingest_quota.admit(device_id).allowed:
+            logger.debug(f"Dropped over-quota sensor reading: {device_id}/{sensor_type}")
+            return
+        
         try:
-            db = SessionLocal()
-            try:
-                # Parse JSON payload
-                data = json.loads(payload)
-                value = float(data.get('value', 0))
-                unit = data.get('unit', None)
-                
-                # Check if device exists, if not create it
-                try:
-                    device = DeviceService.get_device_by_device_id(db, device_id)
-                    
-                    # If device exists but is offline, set it to online
-                    # This handles the case where simulator starts before backend
-                    if device.status == "offline":
-                        DeviceService.update_device_status(db, device_id, "online")
-                        logger.info(f"Device {device_id} automatically set to online (receiving sensor data)")
-                        
-                except Exception as e:
-                    # Device doesn't exist, create it
-                    if "not found" in str(e).lower():
-                        from app.schemas.device import DeviceCreate
-                        logger.info(f"Device {device_id} not found, creating new device")
-                        new_device = DeviceCreate(
-                            device_id=device_id,
-                            name=f"Device {device_id}",
-                            device_type="sensor_node"
-                        )
-                        DeviceService.create_device(db, new_device)
-                        DeviceService.update_device_status(db, device_id, "online")
-                        logger.info(f"Device {device_id} created and set to online")
-                    else:
-                        raise e
-                
-                # Store sensor reading
-                reading = SensorReadingCreate(
-                    sensor_type=sensor_type,
-                    value=value,
-                    unit=unit
-                )
-                
-                SensorService.create_sensor_reading(db, device_id, reading)
-                logger.info(f"Stored sensor reading: {device_id}/{sensor_type} = {value} {unit}")
-            finally:
-                db.close()
+            data = json.loads(payload)
+            value = float(data.get('value', 0))
+            unit = data.get('unit', None)
+            if self.writer.submit(device_id, sensor_type, value, unit, datetime.utcnow()):
+                logger.debug(f"Queued sensor reading: {device_id}/{sensor_type} = {value} {unit}")
         except Exception as e:
             logger.error(f"Error handling sensor message for {device_id}/{sensor_type}: {str(e)}")
     
     def start(self):
         """Start MQTT client"""
+        self.writer.start()
         try:
             self.client = mqtt.Client()
             self.client.on_connect = self.on_connect
@@ -171,6 +164,10 @@ class MQTTService:
             self.client.loop_stop()
             self.client.disconnect()
             logger.info("MQTT client stopped")
+        self.writer.stop()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
     
     def publish(self, topic: str, payload: str):
         """Publish a message to MQTT broker"""
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from app.models.sensor import SensorReading, Device
 from app.core.logger import logger
+from app.services.counter_service import DataPointCounterService, month_start, COUNT_EXACT
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 
@@ -22,32 +23,46 @@ class DataQuotaService:
     
     @staticmethod
     def get_total_data_points(db: Session) -> int:
-        """Get total number of sensor readings"""
+        """Get total number of sensor readings (from the maintained counters)"""
         try:
-            count = db.query(func.count(SensorReading.id)).scalar()
-            return count or 0
+            return DataPointCounterService.total(db)
         except Exception as e:
             logger.error(f"[Quota] Error getting total data points: {e}")
             return 0
     
+    @staticmethod
+    def check_quota_exceeded(db: Session, quota_limit: int = DEFAULT_QUOTA_DPM) -> Tuple[bool, int, int]:
+        """
+        Check total data points against the quota
+        
+        Returns:
+            (exceeded, total, remaining)
+        """
+        total = DataQuotaService.get_total_data_points(db)
+        return total > quota_limit, total, max(0, quota_limit - total)
+    
     @staticmethod
     def get_quota_stats(db: Session, quota_limit: int = DEFAULT_QUOTA_DPM) -> Dict:
         """Get quota statistics"""
         try:
-            total = DataQuotaService.get_total_data_points(db)
-            exceeded, _, _ = DataQuotaService.check_quota_exceeded(db, quota_limit)
+            exceeded, total, remaining = DataQuotaService.check_quota_exceeded(db, quota_limit)
+            current_month = DataPointCounterService.total(db, month=month_start(datetime.utcnow()))
             
-            oldest = db.query(func.min(SensorReading.timestamp)).scalar()
-            newest = db.query(func.max(SensorReading.timestamp)).scalar()
+            # MIN and MAX together are answered from the timestamp index endpoints
+            oldest, newest = db.query(
+                func.min(SensorReading.timestamp),
+                func.max(SensorReading.timestamp)
+            ).one()
             
             usage_percent = (total / quota_limit * 100) if quota_limit > 0 else 0
             
             return {
                 'total_data_points': total,
+                'current_month_data_points': current_month,
                 'quota_limit': quota_limit,
                 'quota_exceeded': exceeded,
                 'usage_percent': round(usage_percent, 2),
-                'remaining_quota': max(0, quota_limit - total),
+                'remaining_quota': remaining,
                 'oldest_timestamp': oldest.isoformat() if oldest else None,
                 'newest_timestamp': newest.isoformat() if newest else None
             }
@@ -55,12 +70,18 @@ class DataQuotaService:
             logger.error(f"[Quota] Error getting stats: {e}")
             return {'error': str(e)}
     
+    @staticmethod
+    def reconcile_counters(db: Session) -> Dict:
+        """Rebuild the data point counters and hourly histogram from sensor_readings, correcting any drift"""
+        return DataPointCounterService.reconcile(db)
+    
     @staticmethod
     def check_date_range_quota(
         db: Session, 
         start_date: str, 
         end_date: str, 
-        quota_limit: int = DEFAULT_QUOTA_DPM
+        quota_limit: int = DEFAULT_QUOTA_DPM,
+        approximate: bool = False
     ) -> Dict:
         """
         Check if a date range would exceed the quota
@@ -69,6 +90,7 @@ class DataQuotaService:
             start_date: ISO format start date
             end_date: ISO format end date
             quota_limit: Quota limit to check against
+            approximate: Prorate partial edge hours instead of counting them
             
         Returns:
             - would_exceed: Whether the date range exceeds quota
@@ -77,16 +99,14 @@ class DataQuotaService:
             - suggested_quota: Suggested quota to accommodate the range
             - should_limit: Whether to limit/sample data
             - limit_to: How many points to show if limiting
+            - count_mode: "exact" or "bucket_approximate"
         """
         try:
             start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
             end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
             
-            # Count data points in the date range
-            count = db.query(func.count(SensorReading.id)).filter(
-                SensorReading.timestamp >= start_dt,
-                SensorReading.timestamp <= end_dt
-            ).scalar() or 0
+            # Count data points in the date range from the hourly histogram
+            count, count_mode = DataPointCounterService.count_range(db, start_dt, end_dt, approximate=approximate)
             
             would_exceed = count > quota_limit
             
@@ -100,6 +120,7 @@ class DataQuotaService:
                 'suggested_quota': suggested_quota,
                 'should_limit': would_exceed,  # Should we limit the data?
                 'limit_to': quota_limit if would_exceed else count,  # Limit to quota
+                'count_mode': count_mode,
                 'message': f'Date range contains {count} data points. Quota limit is {quota_limit}.'
             }
             
@@ -112,7 +133,8 @@ class DataQuotaService:
         db: Session,
         start_date: str = None,
         end_date: str = None,
-        quota_limit: int = DEFAULT_QUOTA_DPM
+        quota_limit: int = DEFAULT_QUOTA_DPM,
+        approximate: bool = False
     ) -> Dict:
         """
         Get quota statistics for a specific date range
@@ -120,33 +142,28 @@ class DataQuotaService:
         If no date range provided, returns stats for all data
         """
         try:
-            # Build query
-            query = db.query(func.count(SensorReading.id))
-            
+            count_mode = COUNT_EXACT
             if start_date and end_date:
                 start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
                 end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(
-                    SensorReading.timestamp >= start_dt,
-                    SensorReading.timestamp <= end_dt
-                )
-                
-                # Get oldest and newest in range
-                oldest = db.query(func.min(SensorReading.timestamp)).filter(
-                    SensorReading.timestamp >= start_dt,
-                    SensorReading.timestamp <= end_dt
-                ).scalar()
+                total, count_mode = DataPointCounterService.count_range(db, start_dt, end_dt, approximate=approximate)
                 
-                newest = db.query(func.max(SensorReading.timestamp)).filter(
+                # Oldest and newest in range, both answered from the timestamp index
+                oldest, newest = db.query(
+                    func.min(SensorReading.timestamp),
+                    func.max(SensorReading.timestamp)
+                ).filter(
                     SensorReading.timestamp >= start_dt,
                     SensorReading.timestamp <= end_dt
-                ).scalar()
+                ).one()
             else:
-                # All data
-                oldest = db.query(func.min(SensorReading.timestamp)).scalar()
-                newest = db.query(func.max(SensorReading.timestamp)).scalar()
+                # All data, counted from the maintained counters
+                oldest, newest = db.query(
+                    func.min(SensorReading.timestamp),
+                    func.max(SensorReading.timestamp)
+                ).one()
+                total = DataQuotaService.get_total_data_points(db)
             
-            total = query.scalar() or 0
             exceeded = total > quota_limit
             usage_percent = (total / quota_limit * 100) if quota_limit > 0 else 0
             
@@ -160,7 +177,8 @@ class DataQuotaService:
                 'newest_timestamp': newest.isoformat() if newest else None,
                 'date_range_applied': bool(start_date and end_date),
                 'start_date': start_date,
-                'end_date': end_date
+                'end_date': end_date,
+                'count_mode': count_mode
             }
         except Exception as e:
             logger.error(f"[Quota] Error getting range stats: {e}")
@@ -0,0 +1,367 @@
+"""
+Result Cache
+Caches aggregate query results (sensor stats, quota stats, database stats)
+keyed by their normalized parameters. Every entry records the ingest
+watermarks it was computed at and is served only while they are unchanged:
+- open ranges (ending recently or "last N hours") depend on every write to
+  their device, or to any device for global stats, and expire after a TTL
+- closed ranges only change when history is rewritten (imports of old
+  readings, retention, device deletion), so they are kept until then or
+  their longer TTL, which covers writes the store's watermarks miss
+Watermarks advance when the writing transaction commits.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, select
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.sensor import Device
+
+EPOCH = "epoch"  # Advanced when counters are rebuilt: invalidates everything
+_PENDING = "result_cache_changes"  # Session.info key for changes awaiting commit
+
+
+def _watermarks(device_pk: Optional[int], closed: bool) -> Tuple[str, ...]:
+    """Watermark names an entry depends on: device or global, any write or history only"""
+    if device_pk is None:
+        return (EPOCH, "history" if closed else "all")
+    return (EPOCH, f"history:{device_pk}" if closed else f"device:{device_pk}")
+
+
+def normalize_date(value: Optional[str]) -> Optional[str]:
+    """ISO date as naive UTC, so equivalent spellings share a key; None if unparseable"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def is_closed(end_date: Optional[str]) -> bool:
+    """Whether a range ending at `end_date` (normalized) is settled: no new readings expected"""
+    if not end_date:
+        return False
+    horizon = datetime.utcnow() - timedelta(seconds=settings.RESULT_CACHE_SETTLE_SECONDS)
+    return datetime.fromisoformat(end_date) < horizon
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "versions")
+
+    def __init__(self, value, expires_at: Optional[float], versions: Dict[str, int]):
+        self.value = value
+        self.expires_at = expires_at
+        self.versions = versions
+
+
+class MemoryResultStore:
+    """
+    Entries and watermarks in this process, LRU-bounded
+    Watermarks only advance for this worker's own commits: writes by other
+    workers or the CLI scripts show up when entries expire, after
+    RESULT_CACHE_TTL_SECONDS (open ranges) or RESULT_CACHE_CLOSED_TTL_SECONDS.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._watermarks: Dict[str, int] = {}
+        self._advanced_at: Dict[str, float] = {}  # Wall-clock time of each watermark's last advance
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, entry: _Entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def versions(self, names: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            return {name: self._watermarks.get(name, 0) for name in names}
+
+    def advance(self, names: Iterable[str]):
+        now = time.time()
+        with self._lock:
+            for name in names:
+                self._watermarks[name] = self._watermarks.get(name, 0) + 1
+                self._advanced_at[name] = now
+
+    def last_advanced(self, names: Iterable[str]) -> float:
+        """Latest advance of any of the watermarks, as a timestamp; 0 if never"""
+        with self._lock:
+            return max((self._advanced_at.get(name, 0.0) for name in names), default=0.0)
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+def _encode(obj: Any) -> Any:
+    """orjson fallback for cached values: service results may be pydantic models"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class RedisResultStore:
+    """
+    Entries and watermarks in Redis, shared by every worker and node
+    Eviction is Redis's: run it with an LRU maxmemory-policy.
+    Values are stored as JSON and come back as plain dicts, which the
+    routes' response models validate like the original results.
+    """
+
+    shared = True
+
+    def __init__(self, url: str):
+        # redis is only imported when RESULT_CACHE_URL is set
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self.evictions = 0
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return f"resultcache:{key!r}"
+
+    def get(self, key: Hashable) -> Optional[_Entry]:
+        data = self._client.get(self._key(key))
+        if data is None:
+            return None
+        data = orjson.loads(data)
+        return _Entry(data["value"], None, data["versions"])
+
+    def put(self, key: Hashable, entry: _Entry):
+        ttl = None if entry.expires_at is None else max(1, round(entry.expires_at - time.monotonic()))
+        self._client.set(self._key(key), orjson.dumps({"value": entry.value, "versions": entry.versions}, default=_encode), ex=ttl)
+
+    def delete(self, key: Hashable):
+        self._client.delete(self._key(key))
+
+    def versions(self, names: Iterable[str]) -> Dict[str, int]:
+        names = list(names)
+        values = self._client.mget([f"resultcache:wm:{name}" for name in names])
+        return {name: int(value or 0) for name, value in zip(names, values)}
+
+    def advance(self, names: Iterable[str]):
+        now = time.time()
+        pipeline = self._client.pipeline(transaction=False)
+        for name in names:
+            pipeline.incr(f"resultcache:wm:{name}")
+            pipeline.set(f"resultcache:wmt:{name}", now)
+        pipeline.execute()
+
+    def last_advanced(self, names: Iterable[str]) -> float:
+        values = self._client.mget([f"resultcache:wmt:{name}" for name in names])
+        return max((float(value) for value in values if value is not None), default=0.0)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class _QueryStats:
+    __slots__ = ("hits", "misses", "stale", "replica_skips")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # Entries found but outdated by a watermark or TTL
+        self.replica_skips = 0  # Results from a replica not cached: it may lag recent writes
+
+
+class ResultCache:
+    """Cached results validated against ingest watermarks; keys are tuples starting with the query name"""
+
+    def __init__(self, store, enabled: bool = True):
+        self.store = store
+        self.enabled = enabled
+        self._stats: Dict[str, _QueryStats] = {}
+        self.store_errors = 0
+
+    def _stats_for(self, name: str) -> _QueryStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _QueryStats()
+        return stats
+
+    def lookup(self, key: Tuple):
+        """Cached value for `key`, or None when missing or outdated; a None key is never cached"""
+        if not self.enabled or key is None:
+            return None
+        stats = self._stats_for(key[0])
+        try:
+            entry = self.store.get(key)
+            if entry is not None:
+                if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                    entry = None
+                elif self.store.versions(entry.versions) != entry.versions:
+                    entry = None
+                if entry is None:
+                    stats.stale += 1
+                    self.store.delete(key)
+        except Exception as e:
+            self.store_errors += 1
+            logger.error(f"[ResultCache] Store error on lookup: {str(e)}")
+            entry = None
+        if entry is None:
+            stats.misses += 1
+            return None
+        stats.hits += 1
+        return entry.value
+
+    async def get(self, key: Tuple):
+        """lookup() from a route; a shared store is read off the event loop"""
+        if self.enabled and key is not None and self.store.shared:
+            return await run_in_threadpool(self.lookup, key)
+        return self.lookup(key)
+
+    def compute(self, db: Session, key: Tuple, closed: bool, device_id: Optional[str], fn, *args):
+        """
+        Run fn(db, *args) and cache its result for `key`
+        It stays valid until a write to `device_id` (None: any device)
+        advances the watermarks read here, before the query; for a closed
+        range only a write to history does. Errors are not cached.
+        On a replica the result is cached only if none of the watermarks
+        advanced within the replica's possible lag: it may not have
+        replayed those writes yet.
+        """
+        if not self.enabled or key is None:
+            return fn(db, *args)
+        device_pk = None
+        if device_id is not None:
+            device_pk = db.execute(select(Device.id).where(Device.device_id == device_id)).scalar()
+            if device_pk is None:
+                return fn(db, *args)
+        names = _watermarks(device_pk, closed)
+        try:
+            versions = self.store.versions(names)
+        except Exception as e:
+            self.store_errors += 1
+            logger.error(f"[ResultCache] Store error reading watermarks: {str(e)}")
+            return fn(db, *args)
+
+        value = fn(db, *args)
+        if isinstance(value, dict) and "error" in value:
+            # Services report failures as {'error': ...} rather than raising
+            return value
+        replica = db.info.get("replica")
+        if replica is not None:
+            try:
+                recent = time.time() - self.store.last_advanced(names) < replica.staleness()
+            except Exception as e:
+                self.store_errors += 1
+                logger.error(f"[ResultCache] Store error reading watermarks: {str(e)}")
+                recent = True
+            if recent:
+                self._stats_for(key[0]).replica_skips += 1
+                return value
+        ttl = settings.RESULT_CACHE_CLOSED_TTL_SECONDS if closed else settings.RESULT_CACHE_TTL_SECONDS
+        expires_at = time.monotonic() + ttl if ttl > 0 else None
+        try:
+            self.store.put(key, _Entry(value, expires_at, versions))
+        except Exception as e:
+            self.store_errors += 1
+            logger.error(f"[ResultCache] Store error saving result: {str(e)}")
+        return value
+
+    def advance(self, changes: Iterable[Tuple[Optional[int], bool]]):
+        """Advance the watermarks of committed (device pk or None for all, history) changes"""
+        names = set()
+        for device_pk, history in changes:
+            if device_pk is None:
+                names.add(EPOCH)
+                continue
+            names.update((f"device:{device_pk}", "all"))
+            if history:
+                names.update((f"history:{device_pk}", "history"))
+        try:
+            self.store.advance(names)
+        except Exception as e:
+            # Open entries still expire with their TTL
+            self.store_errors += 1
+            logger.error(f"[ResultCache] Store error advancing watermarks: {str(e)}")
+
+    def stats(self) -> dict:
+        queries = {}
+        for name, stats in self._stats.items():
+            lookups = stats.hits + stats.misses
+            queries[name] = {
+                "hits": stats.hits,
+                "misses": stats.misses,
+                "stale": stats.stale,
+                "replica_skips": stats.replica_skips,
+                "hit_rate": round(stats.hits / lookups, 4) if lookups else 0.0
+            }
+        return {
+            "enabled": self.enabled,
+            "store": "redis" if self.store.shared else "memory",
+            "entries": self.store.size(),
+            "evictions": self.store.evictions,
+            "store_errors": self.store_errors,
+            "queries": queries
+        }
+
+
+def note_change(db: Session, device_pk: Optional[int], history: bool = False):
+    """
+    Record that db's transaction changes readings of `device_pk` (None: any
+    device, e.g. a counter rebuild); `history` when readings older than the
+    settle window change. Watermarks advance once the transaction commits.
+    """
+    db.info.setdefault(_PENDING, set()).add((device_pk, history))
+
+
+def note_readings(db: Session, readings: List[Tuple[int, str, datetime]], removed: bool = False):
+    """note_change() for (device pk, sensor_type, timestamp) readings written or removed"""
+    horizon = datetime.utcnow() - timedelta(seconds=settings.RESULT_CACHE_SETTLE_SECONDS)
+    oldest: Dict[int, datetime] = {}
+    for device_pk, _, timestamp in readings:
+        if device_pk not in oldest or timestamp < oldest[device_pk]:
+            oldest[device_pk] = timestamp
+    for device_pk, timestamp in oldest.items():
+        note_change(db, device_pk, removed or timestamp < horizon)
+
+
+@event.listens_for(Session, "after_commit")
+def _advance_on_commit(session):
+    changes = session.info.pop(_PENDING, None)
+    if changes:
+        result_cache.advance(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+result_cache = ResultCache(
+    RedisResultStore(settings.RESULT_CACHE_URL) if settings.RESULT_CACHE_URL else MemoryResultStore(settings.RESULT_CACHE_MAX_ENTRIES),
+    settings.RESULT_CACHE_ENABLED
+)
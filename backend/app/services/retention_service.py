@@ -3,82 +3,172 @@ Data Retention Service
 Handles data retention logic and database cleanup operations
 """
 
+import asyncio
+import time
+from contextlib import nullcontext
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, delete
 from datetime import datetime, timedelta
-from app.models.sensor import SensorReading
+from fastapi import HTTPException, status
+from typing import List, Optional
+from app.models.sensor import SensorReading, Device
+from app.models.retention import RetentionPolicy, SensorRollup
+from app.schemas.retention import RetentionPolicyCreate
+from app.db.database import SessionLocal
+from app.core.config import settings
 from app.core.logger import logger
+from app.db.estimates import estimate_row_count
+from app.services.counter_service import DataPointCounterService, hour_start, BUCKET_WIDTH
+from app.services.rollup_service import RollupService
+from app.services.archive_service import ArchiveService
+from app.services.job_service import Job, job_manager
+
+RETENTION_JOB = "retention"
+EPOCH = datetime(1970, 1, 1)
 
 
 class RetentionService:
     """Service for managing data retention and cleanup"""
     
     @staticmethod
-    def get_database_stats(db: Session) -> dict:
-        """Get database statistics"""
+    def get_database_stats(db: Session, approximate: bool = False) -> dict:
+        """
+        Get database statistics
+        
+        With approximate=True the total comes from planner statistics
+        (TimescaleDB approximate_row_count or pg_class.reltuples), falling
+        back to the quota counters; `estimated` lists the approximate fields.
+        """
         try:
-            total = db.query(SensorReading).count()
+            estimated = []
+            total_source = "exact"
+            if approximate:
+                total, total_source = estimate_row_count(db, SensorReading.__tablename__)
+                if total is None:
+                    total, total_source = DataPointCounterService.total(db), "quota_counters"
+                estimated.append("total_readings")
+            else:
+                total = db.execute(select(func.count(SensorReading.id))).scalar() or 0
+            
+            # MIN and MAX in one round trip, each answered from an end of the timestamp index
+            oldest, newest = db.execute(
+                select(func.min(SensorReading.timestamp), func.max(SensorReading.timestamp))
+            ).one()
             
-            if total == 0:
+            if oldest is None:
                 return {
                     "total_readings": 0,
                     "oldest_date": None,
                     "newest_date": None,
-                    "data_age_days": 0
+                    "data_age_days": 0,
+                    "approximate": approximate,
+                    "estimated": [],
+                    "total_source": total_source
                 }
             
-            oldest = db.query(SensorReading.timestamp).order_by(
-                SensorReading.timestamp.asc()
-            ).first()[0]
-            
-            newest = db.query(SensorReading.timestamp).order_by(
-                SensorReading.timestamp.desc()
-            ).first()[0]
-            
-            age_days = (newest - oldest).days if oldest and newest else 0
+            age_days = (newest - oldest).days
             
             return {
                 "total_readings": total,
                 "oldest_date": oldest.isoformat(),
                 "newest_date": newest.isoformat(),
-                "data_age_days": age_days
+                "data_age_days": age_days,
+                "approximate": approximate,
+                "estimated": estimated,
+                "total_source": total_source
             }
             
         except Exception as e:
             logger.error(f"[RetentionService] Error getting stats: {str(e)}")
             raise
     
+    @staticmethod
+    def delete_matching(
+        db: Session,
+        *criteria,
+        batch_size: int,
+        batch_sleep: float = 0.0,
+        archive: bool = True,
+        job: Job = None
+    ) -> int:
+        """
+        Delete the readings matched by `criteria` in slices of batch_size rows
+        Each slice is its own short transaction (oldest rows first via the
+        timestamp index), with a pause between slices so ingest isn't starved.
+        Safe to re-run with the same criteria: it continues with whatever is left.
+        """
+        if archive:
+            ArchiveService.recover_staged(db)
+        deleted = 0
+        batches = 0
+        while True:
+            ids = db.execute(
+                select(SensorReading.id)
+                .where(*criteria)
+                .order_by(SensorReading.timestamp)
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            
+            # Archive the slice, keep quota counters in step, then delete it
+            with ArchiveService.archiving(db, SensorReading.id.in_(ids)) if archive else nullcontext():
+                RetentionService._delete_committed(db, SensorReading.id.in_(ids))
+            
+            deleted += len(ids)
+            batches += 1
+            if job is not None:
+                job.update(deleted=deleted, batches=batches)
+                job.wait_or_cancel(batch_sleep)
+            elif batch_sleep > 0:
+                time.sleep(batch_sleep)
+        return deleted
+    
+    @staticmethod
+    def _delete_committed(db: Session, *criteria) -> int:
+        """Delete the readings matched by `criteria` with their counters and commit; rolls back on failure"""
+        try:
+            DataPointCounterService.subtract_matching(db, *criteria)
+            result = db.execute(
+                delete(SensorReading).where(*criteria).execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return result.rowcount or 0
+    
+    @staticmethod
+    def delete_before(db: Session, cutoff_date: datetime, batch_size: int, batch_sleep: float = 0.0, job: Job = None) -> int:
+        """Chunked delete of readings older than cutoff_date (see delete_matching)"""
+        return RetentionService.delete_matching(
+            db,
+            SensorReading.timestamp < cutoff_date,
+            batch_size=batch_size,
+            batch_sleep=batch_sleep,
+            job=job
+        )
+    
     @staticmethod
     def cleanup_old_data(db: Session, days: int) -> dict:
-        """Delete sensor readings older than specified days"""
+        """Delete sensor readings older than specified days (chunked, in the calling thread)"""
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
+            deleted = RetentionService.delete_before(db, cutoff_date, settings.RETENTION_BATCH_SIZE)
             
-            # Count records to delete
-            count = db.query(SensorReading).filter(
-                SensorReading.timestamp < cutoff_date
-            ).count()
-            
-            if count == 0:
+            if deleted == 0:
                 return {
                     "success": True,
                     "message": f"No data older than {days} days",
                     "deleted": 0
                 }
             
-            # Delete old records
-            db.query(SensorReading).filter(
-                SensorReading.timestamp < cutoff_date
-            ).delete()
-            
-            db.commit()
-            
-            logger.info(f"[RetentionService] Deleted {count} records older than {days} days")
+            logger.info(f"[RetentionService] Deleted {deleted} records older than {days} days")
             
             return {
                 "success": True,
-                "message": f"Deleted {count} old records",
-                "deleted": count,
+                "message": f"Deleted {deleted} old records",
+                "deleted": deleted,
                 "cutoff_date": cutoff_date.isoformat()
             }
             
@@ -86,3 +176,269 @@ class RetentionService:
             db.rollback()
             logger.error(f"[RetentionService] Error during cleanup: {str(e)}")
             raise
+    
+    @staticmethod
+    def run_cleanup_job(job: Job, cutoff_iso: str) -> dict:
+        """
+        Job body: chunked delete of readings older than a fixed cutoff
+        The cutoff is part of the job arguments, so resuming a cancelled or
+        failed job finishes the same cleanup rather than starting a new one.
+        """
+        cutoff_date = datetime.fromisoformat(cutoff_iso)
+        db = SessionLocal()
+        try:
+            estimated, _ = DataPointCounterService.count_range(db, EPOCH, cutoff_date, approximate=True)
+            job.update(cutoff_date=cutoff_iso, estimated_total=estimated, deleted=0, batches=0)
+            deleted = RetentionService.delete_before(
+                db,
+                cutoff_date,
+                settings.RETENTION_BATCH_SIZE,
+                settings.RETENTION_BATCH_SLEEP_SECONDS,
+                job=job
+            )
+            logger.info(f"[RetentionService] Deleted {deleted} records older than {cutoff_iso}")
+            return {"deleted": deleted, "cutoff_date": cutoff_iso}
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _ensure_no_active_job():
+        active = job_manager.active(RETENTION_JOB)
+        if active is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Retention job {active.id} is already running"
+            )
+    
+    @staticmethod
+    def start_cleanup_job(days: int) -> Job:
+        """Start a background cleanup of data older than `days`, unless one is already running"""
+        RetentionService._ensure_no_active_job()
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        return job_manager.submit(RETENTION_JOB, RetentionService.run_cleanup_job, cutoff_date.isoformat())
+    
+    # Retention policies
+    
+    @staticmethod
+    def list_policies(db: Session) -> List[RetentionPolicy]:
+        return db.query(RetentionPolicy).order_by(RetentionPolicy.id).all()
+    
+    @staticmethod
+    def _get_policy(db: Session, policy_id: int) -> RetentionPolicy:
+        policy = db.query(RetentionPolicy).filter(RetentionPolicy.id == policy_id).first()
+        if not policy:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Retention policy {policy_id} not found"
+            )
+        return policy
+    
+    @staticmethod
+    def create_policy(db: Session, policy: RetentionPolicyCreate) -> RetentionPolicy:
+        db_policy = RetentionPolicy(**policy.model_dump())
+        db.add(db_policy)
+        db.commit()
+        db.refresh(db_policy)
+        logger.info(f"[RetentionService] Created retention policy {db_policy.id}")
+        return db_policy
+    
+    @staticmethod
+    def update_policy(db: Session, policy_id: int, policy: RetentionPolicyCreate) -> RetentionPolicy:
+        db_policy = RetentionService._get_policy(db, policy_id)
+        for field, value in policy.model_dump().items():
+            setattr(db_policy, field, value)
+        db.commit()
+        db.refresh(db_policy)
+        logger.info(f"[RetentionService] Updated retention policy {policy_id}")
+        return db_policy
+    
+    @staticmethod
+    def delete_policy(db: Session, policy_id: int) -> dict:
+        db.delete(RetentionService._get_policy(db, policy_id))
+        db.commit()
+        logger.info(f"[RetentionService] Deleted retention policy {policy_id}")
+        return {"message": f"Retention policy {policy_id} deleted successfully"}
+    
+    @staticmethod
+    def resolve_policy(
+        policies: List[RetentionPolicy],
+        device_id: str,
+        device_type: Optional[str],
+        sensor_type: str
+    ) -> Optional[RetentionPolicy]:
+        """
+        Most specific policy matching a channel
+        Device beats sensor type beats device type; ties go to the oldest policy.
+        """
+        best = None
+        best_score = -1
+        for policy in policies:
+            if policy.device_id is not None and policy.device_id != device_id:
+                continue
+            if policy.sensor_type is not None and policy.sensor_type != sensor_type:
+                continue
+            if policy.device_type is not None and policy.device_type != device_type:
+                continue
+            score = (
+                (4 if policy.device_id is not None else 0)
+                + (2 if policy.sensor_type is not None else 0)
+                + (1 if policy.device_type is not None else 0)
+            )
+            if score > best_score:
+                best, best_score = policy, score
+        return best
+    
+    @staticmethod
+    def _apply_channel_policy(
+        db: Session,
+        device_pk: int,
+        sensor_type: str,
+        raw_days: int,
+        rollup_days: Optional[int],
+        now: datetime,
+        job: Job = None
+    ) -> dict:
+        """
+        Roll up and delete one channel's raw readings older than raw_days, in
+        slices of at most RETENTION_BATCH_SIZE rows within one window; each
+        slice's rollup, counter update and delete commit together, so an
+        interrupted run never folds a reading twice. Jobs pause once per
+        RETENTION_BATCH_SIZE rows, however sparse the windows are.
+        """
+        raw_cutoff = hour_start(now - timedelta(days=raw_days))
+        window = BUCKET_WIDTH * settings.RETENTION_ROLLUP_WINDOW_HOURS
+        batch_size = settings.RETENTION_BATCH_SIZE
+        keep_rollups = rollup_days != 0
+        rolled_up = 0
+        deleted = 0
+        since_pause = 0
+        
+        while True:
+            oldest = db.execute(
+                select(func.min(SensorReading.timestamp)).where(
+                    SensorReading.device_id == device_pk,
+                    SensorReading.sensor_type == sensor_type,
+                    SensorReading.timestamp < raw_cutoff
+                )
+            ).scalar()
+            if oldest is None:
+                break
+            
+            window_start = hour_start(oldest)
+            window_end = min(window_start + window, raw_cutoff)
+            ids = db.execute(
+                select(SensorReading.id).where(
+                    SensorReading.device_id == device_pk,
+                    SensorReading.sensor_type == sensor_type,
+                    SensorReading.timestamp < window_end
+                )
+                .order_by(SensorReading.timestamp)
+                .limit(batch_size)
+            ).scalars().all()
+            criteria = (SensorReading.id.in_(ids),)
+            with ArchiveService.archiving(db, *criteria):
+                if keep_rollups:
+                    rolled_up += RollupService.rollup_window(db, device_pk, sensor_type, window_start, window_end, *criteria)
+                deleted += RetentionService._delete_committed(db, *criteria)
+            
+            since_pause += len(ids)
+            if job is not None:
+                job.update(current_channel=f"{device_pk}/{sensor_type}", channel_deleted=deleted)
+                if since_pause >= batch_size:
+                    job.wait_or_cancel(settings.RETENTION_BATCH_SLEEP_SECONDS)
+                    since_pause = 0
+                else:
+                    job.check_cancelled()
+        
+        expired = 0
+        if rollup_days is not None:
+            expire_before = raw_cutoff if rollup_days == 0 else now - timedelta(days=rollup_days)
+            expired = RollupService.expire(db, device_pk, sensor_type, expire_before)
+            db.commit()
+        
+        return {"rolled_up": rolled_up, "deleted": deleted, "rollups_expired": expired}
+    
+    @staticmethod
+    def apply_policies(db: Session, default_raw_days: Optional[int] = None, job: Job = None) -> dict:
+        """
+        Apply retention policies to every channel with old data or rollups
+        Channels without a matching policy use default_raw_days (no rollups),
+        or are left alone when it is None.
+        """
+        now = datetime.utcnow()
+        ArchiveService.recover_staged(db)
+        policies = RetentionService.list_policies(db)
+        if not policies and default_raw_days is None:
+            return {"channels": 0, "rolled_up": 0, "deleted": 0, "rollups_expired": 0}
+        
+        devices = {pk: (device_id, device_type) for pk, device_id, device_type in db.execute(
+            select(Device.id, Device.device_id, Device.device_type)
+        ).all()}
+        
+        # Only channels with readings past the shortest raw period can need work
+        shortest = min([p.raw_days for p in policies] + ([default_raw_days] if default_raw_days is not None else []))
+        earliest_cutoff = hour_start(now - timedelta(days=shortest))
+        channels = set(db.execute(
+            select(SensorReading.device_id, SensorReading.sensor_type)
+            .where(SensorReading.timestamp < earliest_cutoff)
+            .group_by(SensorReading.device_id, SensorReading.sensor_type)
+        ).all())
+        channels.update(db.execute(select(SensorRollup.device_id, SensorRollup.sensor_type).distinct()).all())
+        
+        totals = {"channels": 0, "rolled_up": 0, "deleted": 0, "rollups_expired": 0}
+        for index, (device_pk, sensor_type) in enumerate(sorted(channels)):
+            device_id, device_type = devices.get(device_pk, (None, None))
+            policy = RetentionService.resolve_policy(policies, device_id, device_type, sensor_type)
+            if policy is not None:
+                raw_days, rollup_days = policy.raw_days, policy.rollup_days
+            elif default_raw_days is not None:
+                raw_days, rollup_days = default_raw_days, 0
+            else:
+                continue
+            
+            result = RetentionService._apply_channel_policy(db, device_pk, sensor_type, raw_days, rollup_days, now, job)
+            totals["channels"] += 1
+            for key, value in result.items():
+                totals[key] += value
+            if job is not None:
+                job.update(channels_done=index + 1, channels_total=len(channels), **totals)
+        
+        logger.info(
+            f"[RetentionService] Applied policies to {totals['channels']} channels: "
+            f"{totals['rolled_up']} readings rolled up, {totals['deleted']} deleted, "
+            f"{totals['rollups_expired']} rollups expired"
+        )
+        return totals
+    
+    @staticmethod
+    def run_policy_job(job: Job, default_raw_days: Optional[int] = None) -> dict:
+        """Job body for apply_policies; resuming simply re-applies the policies"""
+        db = SessionLocal()
+        try:
+            return RetentionService.apply_policies(db, default_raw_days, job=job)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    @staticmethod
+    def start_policy_job(default_raw_days: Optional[int] = None) -> Job:
+        """Start applying retention policies in the background, unless a retention job is running"""
+        RetentionService._ensure_no_active_job()
+        return job_manager.submit(RETENTION_JOB, RetentionService.run_policy_job, default_raw_days)
+
+
+async def run_retention_scheduler(days: int, interval_seconds: float):
+    """
+    Background task: apply retention policies every `interval_seconds` until cancelled
+    Channels without a policy keep `days` of raw data.
+    """
+    while True:
+        if job_manager.active(RETENTION_JOB) is None:
+            job = RetentionService.start_policy_job(days)
+            logger.info(f"[RetentionService] Scheduled retention run (job {job.id})")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,150 @@
+"""
+Rollup Service
+Hourly min/max/avg aggregates that keep the long-term shape of a channel
+after its raw readings are deleted by retention
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, delete, case
+from app.models.sensor import SensorReading
+from app.models.retention import SensorRollup
+from app.services.counter_service import dialect_insert, hour_expression, as_datetime
+
+
+class RollupService:
+    """Writes and reads the sensor_rollups tier"""
+
+    @staticmethod
+    def _channel(device_pk: int, sensor_type: str) -> list:
+        return [SensorRollup.device_id == device_pk, SensorRollup.sensor_type == sensor_type]
+
+    @staticmethod
+    def rollup_window(db: Session, device_pk: int, sensor_type: str, start: datetime, end: datetime, *criteria) -> int:
+        """
+        Fold a channel's raw readings in [start, end), optionally narrowed by
+        `criteria`, into hourly rollups
+        Existing rollup rows are merged, not replaced, so the caller must
+        delete the folded raw rows in the same transaction.
+
+        Returns:
+            Number of raw readings folded
+        """
+        hour = hour_expression(db).label("hour")
+        rows = db.execute(
+            select(
+                hour,
+                func.min(SensorReading.value),
+                func.max(SensorReading.value),
+                func.sum(SensorReading.value),
+                func.count(SensorReading.id),
+                func.max(SensorReading.unit)
+            ).where(
+                SensorReading.device_id == device_pk,
+                SensorReading.sensor_type == sensor_type,
+                SensorReading.timestamp >= start,
+                SensorReading.timestamp < end,
+                *criteria
+            ).group_by(hour)
+        ).all()
+
+        table = SensorRollup.__table__
+        folded = 0
+        for row_hour, min_value, max_value, sum_value, count, unit in rows:
+            stmt = dialect_insert(db, table).values(
+                device_id=device_pk,
+                sensor_type=sensor_type,
+                bucket_start=as_datetime(row_hour),
+                min_value=min_value,
+                max_value=max_value,
+                sum_value=sum_value,
+                count=count,
+                unit=unit
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["device_id", "sensor_type", "bucket_start"],
+                set_={
+                    "min_value": case((stmt.excluded.min_value < table.c.min_value, stmt.excluded.min_value), else_=table.c.min_value),
+                    "max_value": case((stmt.excluded.max_value > table.c.max_value, stmt.excluded.max_value), else_=table.c.max_value),
+                    "sum_value": table.c.sum_value + stmt.excluded.sum_value,
+                    "count": table.c.count + stmt.excluded.count,
+                    "unit": func.coalesce(stmt.excluded.unit, table.c.unit)
+                }
+            ))
+            folded += count
+        return folded
+
+    @staticmethod
+    def series(
+        db: Session,
+        device_pk: int,
+        sensor_type: str,
+        start: datetime,
+        end: datetime,
+        newest_first: bool = False,
+        limit: Optional[int] = None
+    ) -> List[Tuple[datetime, float]]:
+        """(bucket_start, average) pairs for hours starting within [start, end]"""
+        query = select(
+            SensorRollup.bucket_start,
+            SensorRollup.sum_value / SensorRollup.count
+        ).where(
+            *RollupService._channel(device_pk, sensor_type),
+            SensorRollup.bucket_start >= start,
+            SensorRollup.bucket_start <= end
+        ).order_by(SensorRollup.bucket_start.desc() if newest_first else SensorRollup.bucket_start.asc())
+        if limit is not None:
+            query = query.limit(limit)
+        return [(as_datetime(bucket_start), value) for bucket_start, value in db.execute(query).all()]
+
+    @staticmethod
+    def stats(db: Session, device_pk: int, sensor_type: str, start: datetime, end: datetime):
+        """Row of (min, max, sum, count) over rollups starting within [start, end]"""
+        return db.execute(
+            select(
+                func.min(SensorRollup.min_value),
+                func.max(SensorRollup.max_value),
+                func.sum(SensorRollup.sum_value),
+                func.coalesce(func.sum(SensorRollup.count), 0)
+            ).where(
+                *RollupService._channel(device_pk, sensor_type),
+                SensorRollup.bucket_start >= start,
+                SensorRollup.bucket_start <= end
+            )
+        ).one()
+
+    @staticmethod
+    def hours(db: Session, device_pk: int, sensor_type: str, start: datetime, end: datetime) -> set:
+        """Starts of the hours with rollups within [start, end]"""
+        return {as_datetime(bucket_start) for bucket_start in db.execute(
+            select(SensorRollup.bucket_start).where(
+                *RollupService._channel(device_pk, sensor_type),
+                SensorRollup.bucket_start >= start,
+                SensorRollup.bucket_start <= end
+            )
+        ).scalars()}
+
+    @staticmethod
+    def unit(db: Session, device_pk: int, sensor_type: str, bucket_start: datetime) -> Optional[str]:
+        return db.execute(
+            select(SensorRollup.unit).where(
+                *RollupService._channel(device_pk, sensor_type),
+                SensorRollup.bucket_start == bucket_start
+            )
+        ).scalar()
+
+    @staticmethod
+    def expire(db: Session, device_pk: int, sensor_type: str, before: datetime) -> int:
+        """Delete a channel's rollups for hours before `before`"""
+        result = db.execute(
+            delete(SensorRollup).where(
+                *RollupService._channel(device_pk, sensor_type),
+                SensorRollup.bucket_start < before
+            )
+        )
+        return result.rowcount or 0
+
+    @staticmethod
+    def remove_device(db: Session, device_pk: int):
+        db.execute(delete(SensorRollup).where(SensorRollup.device_id == device_pk))
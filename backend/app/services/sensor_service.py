@@ -1,13 +1,156 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, select
 from fastapi import HTTPException, status
 from app.models.sensor import SensorReading, Device
-from app.schemas.device import SensorReadingCreate, SensorStats, TimeSeriesPoint, TimeSeriesResponse
+from app.schemas.device import SensorReadingCreate, SensorStats
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from app.core.config import settings
 from app.core.logger import logger
+from app.services.counter_service import DataPointCounterService, BUCKET_WIDTH, hour_start
+from app.services.rollup_service import RollupService
+from app.services.archive_service import ArchiveService
+from app.services.device_service import DEVICE_DELETING
 
 class SensorService:
+    @staticmethod
+    def _series_filter(device_pk: int, sensor_type: str, start_time: datetime, end_time: datetime):
+        """WHERE clause selecting one channel (device + sensor type) over a time range"""
+        return and_(
+            SensorReading.device_id == device_pk,
+            SensorReading.sensor_type == sensor_type,
+            SensorReading.timestamp >= start_time,
+            SensorReading.timestamp <= end_time
+        )
+    
+    @staticmethod
+    def _series_query(device_pk: int, sensor_type: str, start_time: datetime, end_time: datetime):
+        """
+        Column-only Core select of (timestamp, value, unit) rows for one channel.
+        Rows come back as plain tuples, so bulk reads skip ORM identity-map
+        bookkeeping and attribute instrumentation entirely.
+        """
+        return select(SensorReading.timestamp, SensorReading.value, SensorReading.unit).where(
+            SensorService._series_filter(device_pk, sensor_type, start_time, end_time)
+        )
+    
+    @staticmethod
+    def _cold_points(db: Session, device_pk: int, sensor_type: str, start_time: datetime, end_time: datetime, limit: Optional[int] = None):
+        """
+        Points for data that retention moved out of sensor_readings: archived
+        raw readings where the Parquet tier has them, hourly rollups elsewhere
+        
+        Returns:
+            (archived points, rollup points), each chronological; with `limit`,
+            only the newest `limit` points overall
+        """
+        rollups = RollupService.series(db, device_pk, sensor_type, start_time, end_time, newest_first=limit is not None, limit=limit)
+        rollups.sort()
+        archived = ArchiveService.read_points(device_pk, sensor_type, start_time, end_time, limit=limit)
+        if archived:
+            archived_hours = {hour_start(timestamp) for timestamp, _ in archived}
+            rollups = [point for point in rollups if point[0] not in archived_hours]
+        if limit is not None and len(archived) + len(rollups) > limit:
+            cutoff = sorted([*archived, *rollups])[-limit][0]
+            archived = [point for point in archived if point[0] >= cutoff]
+            rollups = [point for point in rollups if point[0] >= cutoff]
+        return archived, rollups
+    
+    @staticmethod
+    def _merge_cold_stats(db: Session, device_pk: int, sensor_type: str, start_time: datetime, end_time: datetime, stats):
+        """Combine raw aggregates with rollups and archived readings for older parts of the range"""
+        min_value, max_value, count = stats.min_value, stats.max_value, stats.count
+        total = (stats.avg_value or 0) * stats.count
+        
+        rollup_min, rollup_max, rollup_sum, rollup_count = RollupService.stats(db, device_pk, sensor_type, start_time, end_time)
+        values_min = [v for v in (min_value, rollup_min) if v is not None]
+        values_max = [v for v in (max_value, rollup_max) if v is not None]
+        count += rollup_count
+        total += rollup_sum or 0
+        
+        # Archived readings for hours that have no rollup (rollups are cheaper and equivalent)
+        if ArchiveService.covers(start_time, end_time):
+            rollup_hours = RollupService.hours(db, device_pk, sensor_type, start_time, end_time)
+            archived_min, archived_max, archived_sum, archived_count = ArchiveService.read_stats(
+                device_pk, sensor_type, start_time, end_time, rollup_hours
+            )
+            if archived_count:
+                values_min.append(archived_min)
+                values_max.append(archived_max)
+                count += archived_count
+                total += archived_sum
+        
+        if count == 0:
+            return None, None, None, 0
+        return min(values_min), max(values_max), total / count, count
+    
+    @staticmethod
+    def _estimate(db: Session, device_pk: int, sensor_type: str, start_time: datetime, end_time: datetime) -> int:
+        """Readings in a range, estimated from the hourly histogram and archive file footers without reading rows"""
+        return (
+            DataPointCounterService.bucket_upper_bound(db, start_time, end_time, device_pk, sensor_type)
+            + ArchiveService.count_upper_bound(device_pk, sensor_type, start_time, end_time)
+        )
+    
+    @staticmethod
+    def _point_limit(db: Session, device_pk: int, sensor_type: str, start_time: datetime, end_time: datetime, quota_limit: Optional[int]) -> Tuple[Optional[int], bool]:
+        """
+        Cost guard for time series: a range estimated above QUERY_MAX_POINTS
+        returns only that many of its newest points
+        
+        Returns:
+            (limit to apply or None, whether the guard imposed it)
+        """
+        max_points = settings.QUERY_MAX_POINTS
+        if max_points <= 0 or (quota_limit and quota_limit <= max_points):
+            return quota_limit, False
+        estimated = SensorService._estimate(db, device_pk, sensor_type, start_time, end_time)
+        if estimated <= max_points:
+            return quota_limit, False
+        logger.warning(f"[CostGuard] {sensor_type} series of ~{estimated} points limited to the newest {max_points}")
+        return max_points, True
+    
+    @staticmethod
+    def _check_scan(db: Session, device_pk: int, sensor_type: str, start_time: datetime, end_time: datetime):
+        """Cost guard for stats: refuse ranges estimated above QUERY_MAX_SCAN_ROWS"""
+        max_rows = settings.QUERY_MAX_SCAN_ROWS
+        if max_rows <= 0:
+            return
+        estimated = SensorService._estimate(db, device_pk, sensor_type, start_time, end_time)
+        if estimated > max_rows:
+            logger.warning(f"[CostGuard] Refused {sensor_type} stats over ~{estimated} readings")
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Range covers about {estimated} readings, more than the {max_rows} allowed; narrow the range"
+            )
+    
+    @staticmethod
+    def _build_series(db: Session, device_pk: int, sensor_type: str, rows: list, archived: list, rollups: list) -> dict:
+        """
+        Time series response from chronological raw rows plus cold-tier points
+        Archived and rollup points stand in for raw data that retention has
+        already deleted from sensor_readings. Built as plain dicts in the
+        TimeSeriesResponse shape, for FastJSONResponse to render directly.
+        """
+        # The unit of the first raw reading, already fetched with the rows
+        unit = rows[0][2] if rows else None
+        rolled_up_before = None
+        points = [(timestamp, value) for timestamp, value, _ in rows]
+        if archived or rollups:
+            points = sorted([*archived, *rollups, *points])
+        if rollups:
+            rolled_up_before = rollups[-1][0] + BUCKET_WIDTH
+            if unit is None:
+                unit = RollupService.unit(db, device_pk, sensor_type, rollups[0][0])
+        
+        return {
+            "sensor_type": sensor_type,
+            "unit": unit,
+            "data": [{"timestamp": timestamp, "value": value} for timestamp, value in points],
+            "rolled_up_before": rolled_up_before,
+            "limited_to": None
+        }
+    
     @staticmethod
     def create_sensor_reading(db: Session, device_id: str, reading: SensorReadingCreate):
         """Store a new sensor reading"""
@@ -18,15 +161,22 @@ class SensorService:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Device {device_id} not found"
             )
+        if device.status == DEVICE_DELETING:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Device {device_id} is being deleted"
+            )
         
         try:
             db_reading = SensorReading(
                 device_id=device.id,
                 sensor_type=reading.sensor_type,
                 value=reading.value,
-                unit=reading.unit
+                unit=reading.unit,
+                timestamp=datetime.utcnow()
             )
             db.add(db_reading)
+            DataPointCounterService.record_readings(db, [(device.id, db_reading.sensor_type, db_reading.timestamp)])
             db.commit()
             db.refresh(db_reading)
             return db_reading
@@ -80,6 +230,7 @@ class SensorService:
         
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=hours)
+        SensorService._check_scan(db, device.id, sensor_type, start_time, end_time)
         
         stats = db.query(
             func.min(SensorReading.value).label('min_value'),
@@ -95,7 +246,11 @@ class SensorService:
             )
         ).first()
         
-        if stats.count == 0:
+        min_value, max_value, avg_value, count = SensorService._merge_cold_stats(
+            db, device.id, sensor_type, start_time, end_time, stats
+        )
+        
+        if count == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No readings found for {sensor_type} in the last {hours} hours"
@@ -103,10 +258,10 @@ class SensorService:
         
         return SensorStats(
             sensor_type=sensor_type,
-            min_value=stats.min_value,
-            max_value=stats.max_value,
-            avg_value=stats.avg_value,
-            count=stats.count,
+            min_value=min_value,
+            max_value=max_value,
+            avg_value=avg_value,
+            count=count,
             start_time=start_time,
             end_time=end_time
         )
@@ -117,7 +272,7 @@ class SensorService:
         device_id: str, 
         sensor_type: str, 
         hours: Optional[int] = 24
-    ) -> TimeSeriesResponse:
+    ) -> dict:
         """Get time series data for graphing"""
         device = db.query(Device).filter(Device.device_id == device_id).first()
         if not device:
@@ -128,32 +283,29 @@ class SensorService:
         
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=hours)
+        limit, limited = SensorService._point_limit(db, device.id, sensor_type, start_time, end_time, None)
         
-        readings = db.query(SensorReading).filter(
-            and_(
-                SensorReading.device_id == device.id,
-                SensorReading.sensor_type == sensor_type,
-                SensorReading.timestamp >= start_time,
-                SensorReading.timestamp <= end_time
-            )
-        ).order_by(SensorReading.timestamp.asc()).all()
+        query = SensorService._series_query(device.id, sensor_type, start_time, end_time)
+        if limit:
+            rows = db.execute(query.order_by(SensorReading.timestamp.desc()).limit(limit)).all()
+            rows.reverse()
+        else:
+            rows = db.execute(query.order_by(SensorReading.timestamp.asc())).all()
+        remaining = limit - len(rows) if limit else None
+        archived, rollups = ([], []) if remaining == 0 else SensorService._cold_points(
+            db, device.id, sensor_type, start_time, end_time, limit=remaining
+        )
         
-        if not readings:
+        if not rows and not archived and not rollups:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No readings found for {sensor_type} in the last {hours} hours"
             )
         
-        data_points = [
-            TimeSeriesPoint(timestamp=reading.timestamp, value=reading.value)
-            for reading in readings
-        ]
-        
-        return TimeSeriesResponse(
-            sensor_type=sensor_type,
-            unit=readings[0].unit if readings else None,
-            data=data_points
-        )
+        series = SensorService._build_series(db, device.id, sensor_type, rows, archived, rollups)
+        if limited:
+            series["limited_to"] = limit
+        return series
     
     @staticmethod
     def get_sensor_stats_by_date_range(
@@ -179,6 +331,7 @@ class SensorService:
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid date format: {str(e)}"
             )
+        SensorService._check_scan(db, device.id, sensor_type, start_time, end_time)
         
         stats = db.query(
             func.min(SensorReading.value).label('min_value'),
@@ -194,7 +347,11 @@ class SensorService:
             )
         ).first()
         
-        if stats.count == 0:
+        min_value, max_value, avg_value, count = SensorService._merge_cold_stats(
+            db, device.id, sensor_type, start_time, end_time, stats
+        )
+        
+        if count == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No readings found for {sensor_type} between {start_date} and {end_date}"
@@ -202,10 +359,10 @@ class SensorService:
         
         return SensorStats(
             sensor_type=sensor_type,
-            min_value=stats.min_value,
-            max_value=stats.max_value,
-            avg_value=stats.avg_value,
-            count=stats.count,
+            min_value=min_value,
+            max_value=max_value,
+            avg_value=avg_value,
+            count=count,
             start_time=start_time,
             end_time=end_time
         )
@@ -218,7 +375,7 @@ class SensorService:
         start_date: str,
         end_date: str,
         quota_limit: Optional[int] = None
-    ) -> TimeSeriesResponse:
+    ) -> dict:
         """Get time series data for graphing over a custom date range with optional quota limiting"""
         device = db.query(Device).filter(Device.device_id == device_id).first()
         if not device:
@@ -237,43 +394,36 @@ class SensorService:
             )
         
         # Build query
-        query = db.query(SensorReading).filter(
-            and_(
-                SensorReading.device_id == device.id,
-                SensorReading.sensor_type == sensor_type,
-                SensorReading.timestamp >= start_time,
-                SensorReading.timestamp <= end_time
-            )
+        query = SensorService._series_query(
+            device.id, sensor_type, start_time, end_time
         ).order_by(SensorReading.timestamp.desc())  # Get newest first
         
-        # Apply quota limit if specified
+        # Apply quota limit if specified (or the cost guard's limit for huge ranges);
+        # LIMIT alone keeps the newest points, without counting the whole range first
+        quota_limit, limited = SensorService._point_limit(db, device.id, sensor_type, start_time, end_time, quota_limit)
         if quota_limit:
-            # Count total readings in range
-            total_count = query.count()
-            
-            if total_count > quota_limit:
-                # Limit to quota and get most recent data
-                logger.info(f"[Quota] Limiting {sensor_type} data from {total_count} to {quota_limit} points")
-                query = query.limit(quota_limit)
+            query = query.limit(quota_limit)
+        
+        rows = db.execute(query).all()
+        if quota_limit and len(rows) == quota_limit:
+            logger.info(f"[Quota] Limited {sensor_type} data to {quota_limit} points")
         
-        readings = query.all()
+        # Older parts of the range may only survive in the archive or as hourly rollups; fill the rest of the quota with them
+        remaining = quota_limit - len(rows) if quota_limit else None
+        archived, rollups = ([], []) if remaining == 0 else SensorService._cold_points(
+            db, device.id, sensor_type, start_time, end_time, limit=remaining
+        )
         
         # Reverse to get chronological order
-        readings = list(reversed(readings))
+        rows.reverse()
         
-        if not readings:
+        if not rows and not archived and not rollups:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No readings found for {sensor_type} between {start_date} and {end_date}"
             )
         
-        data_points = [
-            TimeSeriesPoint(timestamp=reading.timestamp, value=reading.value)
-            for reading in readings
-        ]
-        
-        return TimeSeriesResponse(
-            sensor_type=sensor_type,
-            unit=readings[0].unit if readings else None,
-            data=data_points
-        )
+        series = SensorService._build_series(db, device.id, sensor_type, rows, archived, rollups)
+        if limited:
+            series["limited_to"] = quota_limit
+        return series
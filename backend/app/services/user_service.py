@@ -89,7 +89,7 @@ class UserService:
             update_data = user_update.model_dump(exclude_unset=True)
             
             if 'password' in update_data:
-                update_data['password'] = update_data['password']  
+                # Hashed by the caller on the password pool (see app.core.passwords)
                 logger.info(f"Password updated for user {user_id}")
             
             for field, value in update_data.items():
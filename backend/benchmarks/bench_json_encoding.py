@@ -0,0 +1,106 @@
+"""
+JSON Encoding Benchmark
+Compares response encoding throughput for device lists and time series:
+  - stdlib:   response_model validation + stdlib json (FastAPI's classic path)
+  - pydantic: response_model validation + pydantic dump_json
+  - orjson:   FastJSONResponse on service output, no re-validation
+
+Usage (from the backend directory):
+    python benchmarks/bench_json_encoding.py
+    python benchmarks/bench_json_encoding.py --devices 5000 --points 500000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+parser = argparse.ArgumentParser(description="Benchmark JSON response encoding")
+parser.add_argument("--devices", type=int, default=1000, help="Devices in the device list payload")
+parser.add_argument("--points", type=int, default=100_000, help="Points in the time series payload")
+parser.add_argument("--repeat", type=int, default=5, help="Timed runs per encoder")
+args = parser.parse_args()
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///benchmarks/bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+from app.core.responses import FastJSONResponse
+from app.schemas.device import DeviceResponse, TimeSeriesPoint, TimeSeriesResponse
+
+
+def device_rows(count: int) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {
+            "device_id": f"LR{i}",
+            "name": f"Device LR{i}",
+            "device_type": "sensor_node",
+            "id": i,
+            "status": "online" if i % 2 else "offline",
+            "last_seen": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def time_series(count: int) -> TimeSeriesResponse:
+    start = datetime.utcnow() - timedelta(seconds=count)
+    return TimeSeriesResponse.model_construct(
+        sensor_type="CT1",
+        unit="A",
+        data=[
+            TimeSeriesPoint.model_construct(timestamp=start + timedelta(seconds=i), value=i / 10.0)
+            for i in range(count)
+        ]
+    )
+
+
+def stdlib_encoder(adapter: TypeAdapter):
+    def encode(payload):
+        validated = adapter.validate_python(payload, from_attributes=True)
+        return json.dumps(adapter.dump_python(validated, mode="json")).encode("utf-8")
+    return encode
+
+
+def pydantic_encoder(adapter: TypeAdapter):
+    def encode(payload):
+        return adapter.dump_json(adapter.validate_python(payload, from_attributes=True))
+    return encode
+
+
+def orjson_encoder(payload):
+    return FastJSONResponse(payload).body
+
+
+def measure(label: str, encode, payload, items: int):
+    best = None
+    size = 0
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        size = len(encode(payload))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<9} {best * 1000:9.1f} ms  {items / best:>14,.0f} items/s  {size / best / 1024 / 1024:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    devices = device_rows(args.devices)
+    device_adapter = TypeAdapter(List[DeviceResponse])
+    print(f"Device list ({args.devices} devices)")
+    measure("stdlib", stdlib_encoder(device_adapter), devices, args.devices)
+    measure("pydantic", pydantic_encoder(device_adapter), devices, args.devices)
+    measure("orjson", orjson_encoder, devices, args.devices)
+
+    series = time_series(args.points)
+    series_adapter = TypeAdapter(TimeSeriesResponse)
+    print(f"Time series ({args.points} points)")
+    measure("stdlib", stdlib_encoder(series_adapter), series, args.points)
+    measure("pydantic", pydantic_encoder(series_adapter), series, args.points)
+    measure("orjson", orjson_encoder, series, args.points)
@@ -0,0 +1,74 @@
+"""
+Request Concurrency Benchmark
+Fires concurrent authenticated requests at a running backend and reports
+throughput and latency. Run it once against a server started with
+DB_ASYNC=false and once with DB_ASYNC=true to compare the two modes.
+
+Usage (from the backend directory, server already running):
+    DB_ASYNC=false uvicorn main:app --port 8000
+    python benchmarks/bench_request_concurrency.py --base-url http://localhost:8000
+
+    DB_ASYNC=true uvicorn main:app --port 8000
+    python benchmarks/bench_request_concurrency.py --base-url http://localhost:8000
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+parser = argparse.ArgumentParser(description="Benchmark concurrent API requests")
+parser.add_argument("--base-url", default="http://localhost:8000", help="Backend base URL")
+parser.add_argument("--path", default="/api/v1/devices/", help="Endpoint to request")
+parser.add_argument("--requests", type=int, default=2000, help="Total number of requests")
+parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+parser.add_argument("--username", default="benchmark", help="Benchmark user (created if missing)")
+parser.add_argument("--password", default="benchmark-password")
+args = parser.parse_args()
+
+_local = threading.local()
+
+
+def get_token() -> str:
+    """Sign in as the benchmark user, signing up first if needed"""
+    credentials = {"username": args.username, "password": args.password}
+    response = requests.post(f"{args.base_url}/api/v1/auth/signin", json=credentials)
+    if response.status_code == 401:
+        requests.post(
+            f"{args.base_url}/api/v1/auth/signup",
+            json={**credentials, "email": f"{args.username}@example.com"}
+        ).raise_for_status()
+        response = requests.post(f"{args.base_url}/api/v1/auth/signin", json=credentials)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def timed_request(url: str, headers: dict) -> tuple:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    started = time.perf_counter()
+    response = session.get(url, headers=headers)
+    return time.perf_counter() - started, response.status_code
+
+
+if __name__ == "__main__":
+    headers = {"Authorization": f"Bearer {get_token()}"}
+    url = f"{args.base_url}{args.path}"
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda _: timed_request(url, headers), range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, code in results if code >= 400)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+
+    print(f"{args.requests} requests to {args.path} with concurrency {args.concurrency}")
+    print(f"  throughput  {args.requests / elapsed:10.1f} req/s")
+    print(f"  latency     p50 {statistics.median(latencies) * 1000:.1f} ms  p95 {p95 * 1000:.1f} ms  max {latencies[-1] * 1000:.1f} ms")
+    print(f"  errors      {errors}")
@@ -0,0 +1,100 @@
+"""
+Sign-in Benchmark
+Fires concurrent sign-ins at a running backend and reports sign-in
+throughput and latency, plus the latency of /health probed meanwhile:
+with hashing on the password pool the probe should stay fast however
+many logins are in flight. Compare PASSWORD_HASH_WORKERS and
+PASSWORD_SCRYPT_N settings by restarting the server between runs.
+
+Usage (from the backend directory, server already running):
+    uvicorn main:app --port 8000
+    python benchmarks/bench_signin.py --base-url http://localhost:8000
+    python benchmarks/bench_signin.py --signins 400 --concurrency 50 --users 20
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+parser = argparse.ArgumentParser(description="Benchmark concurrent sign-ins")
+parser.add_argument("--base-url", default="http://localhost:8000", help="Backend base URL")
+parser.add_argument("--signins", type=int, default=200, help="Total number of sign-ins")
+parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients")
+parser.add_argument("--users", type=int, default=10, help="Benchmark users signing in (created if missing)")
+parser.add_argument("--password", default="benchmark-password")
+args = parser.parse_args()
+
+_local = threading.local()
+
+
+def ensure_users() -> list:
+    """Sign up the benchmark users that don't exist yet"""
+    usernames = [f"signin-bench-{i}" for i in range(args.users)]
+    for username in usernames:
+        requests.post(
+            f"{args.base_url}/api/v1/auth/signup",
+            json={"username": username, "email": f"{username}@example.com", "password": args.password}
+        )
+    return usernames
+
+
+def timed_signin(username: str) -> tuple:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    started = time.perf_counter()
+    response = session.post(
+        f"{args.base_url}/api/v1/auth/signin",
+        json={"username": username, "password": args.password}
+    )
+    return time.perf_counter() - started, response.status_code
+
+
+def probe(stop: threading.Event, latencies: list):
+    """Time /health every 50 ms while the sign-ins run"""
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        session.get(f"{args.base_url}/health")
+        latencies.append(time.perf_counter() - started)
+        stop.wait(0.05)
+
+
+def summary(latencies: list) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    return f"p50 {statistics.median(latencies) * 1000:.1f} ms  p95 {p95 * 1000:.1f} ms  max {latencies[-1] * 1000:.1f} ms"
+
+
+if __name__ == "__main__":
+    usernames = ensure_users()
+    # First sign-ins may upgrade legacy or outdated hashes; keep them out of the timing
+    for username in usernames:
+        timed_signin(username)
+
+    stop = threading.Event()
+    probe_latencies: list = []
+    prober = threading.Thread(target=probe, args=(stop, probe_latencies), daemon=True)
+    prober.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda i: timed_signin(usernames[i % len(usernames)]), range(args.signins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+
+    errors = {}
+    for _, code in results:
+        if code != 200:
+            errors[code] = errors.get(code, 0) + 1
+
+    print(f"{args.signins} sign-ins over {len(usernames)} users with concurrency {args.concurrency}")
+    print(f"  throughput  {args.signins / elapsed:10.1f} sign-ins/s")
+    print(f"  latency     {summary([latency for latency, _ in results])}")
+    print(f"  /health     {summary(probe_latencies)}  ({len(probe_latencies)} probes)")
+    print(f"  errors      {errors or 0}")
@@ -0,0 +1,64 @@
+"""
+Token Verification Benchmark
+Per-request auth overhead of the protected-route dependency:
+  - decode:  jwt.decode with HMAC verification on every request (no cache)
+  - cached:  verify_token with the verified-token cache
+  - route:   AuthService.get_current_user_from_token, cached (what routes call)
+
+Usage (from the backend directory):
+    python benchmarks/bench_token_verify.py
+    python benchmarks/bench_token_verify.py --requests 200000 --tokens 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+parser = argparse.ArgumentParser(description="Benchmark JWT verification per request")
+parser.add_argument("--requests", type=int, default=100_000, help="Verifications per run")
+parser.add_argument("--tokens", type=int, default=20, help="Distinct tokens (e.g. dashboard sessions)")
+parser.add_argument("--repeat", type=int, default=5, help="Timed runs per variant")
+args = parser.parse_args()
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///benchmarks/bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-of-at-least-32-bytes")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from app.core.config import settings
+from app.core.security import create_access_token, verify_token, token_cache
+from app.services.auth_service import AuthService
+
+
+def decode(token: str):
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+
+def measure(label: str, verify, tokens: list):
+    rng = random.Random(42)
+    sequence = [rng.choice(tokens) for _ in range(args.requests)]
+    best = None
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        for token in sequence:
+            verify(token)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<7} {best / args.requests * 1e6:8.2f} us/request  {args.requests / best:>12,.0f} requests/s")
+
+
+if __name__ == "__main__":
+    tokens = [
+        create_access_token({"sub": f"user{i}"}, expires_delta=timedelta(hours=1))
+        for i in range(args.tokens)
+    ]
+    print(f"{args.requests} verifications over {args.tokens} tokens ({settings.ALGORITHM})")
+    measure("decode", decode, tokens)
+    token_cache.clear()
+    measure("cached", verify_token, tokens)
+    measure("route", AuthService.get_current_user_from_token, tokens)
+    stats = token_cache.stats()
+    print(f"  cache hit rate {stats['hit_rate']:.2%} ({stats['hits']} hits, {stats['misses']} misses)")
@@ -1,43 +1,274 @@
 """
-Clear all devices and sensor readings from the database
-Run this to start fresh with a clean database
+Database maintenance CLI
+Wipe, purge and vacuum the sensor database from the command line
+
+Usage:
+    python clear_database.py                              # Wipe everything (asks for confirmation)
+    python clear_database.py wipe --yes --keep-devices    # Wipe readings, keep devices
+    python clear_database.py purge --device LR1 --yes     # Purge one device's readings
+    python clear_database.py purge --before 2026-01-01 --yes
+    python clear_database.py purge --device LR1 --start 2026-01-01 --end 2026-02-01 --yes
+    python clear_database.py vacuum --analyze
+    python clear_database.py analyze
+    python clear_database.py reconcile
+    python clear_database.py rotate-key                   # New JWT signing key (EdDSA/RS256)
+    python clear_database.py rotate-key --retire-previous --yes
 """
 
+import argparse
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import text
 from app.db.database import SessionLocal, engine
-from app.models.sensor import Device, SensorReading, Base
+from app.core.config import settings
+from app.core.keys import key_ring, uses_key_ring
+from app.models.sensor import Device, SensorReading
+from app.models.counters import DataPointCounter, ReadingCountBucket
+from app.models.retention import SensorRollup
+from app.services.counter_service import DataPointCounterService, naive_utc
+from app.services.retention_service import RetentionService
+from app.services.result_cache import result_cache
 
-def clear_database():
-    """Remove all devices and sensor readings"""
-    db = SessionLocal()
+# Children before parents; retention policies are configuration and survive a wipe
+READING_TABLES = [
+    SensorReading.__tablename__,
+    SensorRollup.__tablename__,
+    DataPointCounter.__tablename__,
+    ReadingCountBucket.__tablename__
+]
+DEVICE_TABLES = [Device.__tablename__]
+
+
+@contextmanager
+def timed(label: str):
+    """Print how long an operation took"""
+    started = time.perf_counter()
+    print(f"▶ {label}...")
+    yield
+    print(f"✓ {label} took {time.perf_counter() - started:.2f}s")
+
+
+def is_postgres() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def confirm(message: str, assume_yes: bool) -> bool:
+    if assume_yes:
+        return True
+    answer = input(f"{message} Are you sure you want to continue? (yes/no): ")
+    return answer.lower() == "yes"
+
+
+def parse_datetime(value: str) -> datetime:
     try:
-        # Delete all sensor readings first (due to foreign key constraint)
-        deleted_readings = db.query(SensorReading).delete()
-        print(f"Deleted {deleted_readings} sensor readings")
-        
-        # Delete all devices
-        deleted_devices = db.query(Device).delete()
-        print(f"Deleted {deleted_devices} devices")
-        
-        db.commit()
-        print("\n✅ Database cleared successfully!")
+        return naive_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date: {value} (expected ISO format)")
+
+
+def wipe(keep_devices: bool = False, include_archive: bool = False):
+    """Remove all readings (and devices) with TRUNCATE, no row-by-row DELETE"""
+    tables = READING_TABLES + ([] if keep_devices else DEVICE_TABLES)
+    with timed(f"Wiping {', '.join(tables)}"):
+        with engine.begin() as conn:
+            if is_postgres():
+                conn.execute(text(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE"))
+            else:
+                # SQLite turns an unqualified DELETE into a fast table truncate
+                for table in tables:
+                    conn.execute(text(f"DELETE FROM {table}"))
+                if "sqlite_sequence" in conn.dialect.get_table_names(conn):
+                    conn.execute(text("DELETE FROM sqlite_sequence WHERE name IN ({})".format(
+                        ", ".join(f"'{table}'" for table in tables)
+                    )))
+        # Raw connection: no session commit to advance the watermarks
+        result_cache.advance([(None, False)])
+
+    if include_archive and os.path.isdir(settings.ARCHIVE_DIR):
+        with timed(f"Removing archive {settings.ARCHIVE_DIR}"):
+            shutil.rmtree(settings.ARCHIVE_DIR)
+
+    print("\n✅ Database cleared successfully!")
+    if not keep_devices:
         print("You can now run the simulator to create LR1 and LR2 devices fresh.")
-        
-    except Exception as e:
-        db.rollback()
-        print(f"❌ Error clearing database: {str(e)}")
+
+
+def purge(device_id: str = None, start: datetime = None, end: datetime = None, before: datetime = None, batch_size: int = None):
+    """
+    Delete readings by device and/or time range in chunks, keeping the quota
+    counters in step; a time-only purge on a TimescaleDB hypertable drops whole chunks
+    """
+    db = SessionLocal()
+    try:
+        criteria = []
+        if device_id:
+            device = db.query(Device).filter(Device.device_id == device_id).first()
+            if not device:
+                print(f"❌ Device {device_id} not found")
+                return
+            criteria.append(SensorReading.device_id == device.id)
+        if start:
+            criteria.append(SensorReading.timestamp >= start)
+        if end:
+            criteria.append(SensorReading.timestamp < end)
+        if before:
+            criteria.append(SensorReading.timestamp < before)
+
+        if before and not (device_id or start or end) and is_hypertable(db):
+            with timed(f"Dropping chunks older than {before.isoformat()}"):
+                dropped = db.execute(
+                    text("SELECT drop_chunks(:table, older_than => :before)"),
+                    {"table": SensorReading.__tablename__, "before": before}
+                ).all()
+                db.commit()
+            print(f"Dropped {len(dropped)} chunks")
+            # drop_chunks bypasses the counter hooks
+            reconcile()
+            return
+
+        with timed("Purging readings"):
+            deleted = RetentionService.delete_matching(
+                db,
+                *criteria,
+                batch_size=batch_size or settings.RETENTION_BATCH_SIZE,
+                archive=False
+            )
+        print(f"Deleted {deleted} sensor readings")
     finally:
         db.close()
 
+
+def is_hypertable(db) -> bool:
+    if not is_postgres():
+        return False
+    has_timescale = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")).first()
+    if has_timescale is None:
+        return False
+    return db.execute(
+        text("SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = :table"),
+        {"table": SensorReading.__tablename__}
+    ).first() is not None
+
+
+def vacuum(full: bool = False, analyze: bool = False):
+    """VACUUM the reading tables (outside a transaction, as PostgreSQL requires)"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if is_postgres():
+            options = ", ".join(option for option, enabled in (("FULL", full), ("ANALYZE", analyze)) if enabled)
+            prefix = f"VACUUM ({options})" if options else "VACUUM"
+            for table in READING_TABLES + DEVICE_TABLES:
+                with timed(f"{prefix} {table}"):
+                    conn.execute(text(f"{prefix} {table}"))
+        else:
+            with timed("VACUUM"):
+                conn.execute(text("VACUUM"))
+            if analyze:
+                with timed("ANALYZE"):
+                    conn.execute(text("ANALYZE"))
+
+
+def analyze():
+    """Refresh planner statistics (also used by approximate retention stats)"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in READING_TABLES + DEVICE_TABLES:
+            with timed(f"ANALYZE {table}"):
+                conn.execute(text(f"ANALYZE {table}"))
+
+
+def reconcile():
+    """Rebuild the quota counters from sensor_readings"""
+    db = SessionLocal()
+    try:
+        with timed("Reconciling quota counters"):
+            result = DataPointCounterService.reconcile(db)
+        print(f"Counters: {result['counters']}, drift corrected: {result['drift']}")
+    finally:
+        db.close()
+
+
+def rotate_key(retire_previous: bool = False):
+    """
+    Make a fresh JWT signing key the active one in JWT_KEYS_DIR
+    API nodes sharing the directory pick it up within JWT_KEY_RELOAD_SECONDS.
+    With retire_previous, every older key is deleted: tokens they signed stop
+    verifying and every user has to sign in again.
+    """
+    if not uses_key_ring():
+        print(f"❌ Key rotation needs ALGORITHM EdDSA or RS256, not {settings.ALGORITHM}")
+        sys.exit(1)
+    key_ring.reload()
+    with timed("Rotating signing key"):
+        key = key_ring.rotate(retire_previous)
+    print(f"Signing key is now {key.kid}; keys in ring: {', '.join(key_ring.stats()['kids'])}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Database maintenance for the IoT backend")
+    commands = parser.add_subparsers(dest="command")
+
+    wipe_parser = commands.add_parser("wipe", help="Remove all readings and devices (TRUNCATE)")
+    wipe_parser.add_argument("--keep-devices", action="store_true", help="Only remove readings, rollups and counters")
+    wipe_parser.add_argument("--include-archive", action="store_true", help="Also delete the Parquet archive directory")
+    wipe_parser.add_argument("--yes", action="store_true", help="Don't ask for confirmation")
+
+    purge_parser = commands.add_parser("purge", help="Delete readings by device and/or time range")
+    purge_parser.add_argument("--device", help="Device id, e.g. LR1")
+    purge_parser.add_argument("--start", type=parse_datetime, help="Range start (ISO format, inclusive)")
+    purge_parser.add_argument("--end", type=parse_datetime, help="Range end (ISO format, exclusive)")
+    purge_parser.add_argument("--before", type=parse_datetime, help="Delete everything older than this (ISO format)")
+    purge_parser.add_argument("--batch-size", type=int, help=f"Rows per delete (default {settings.RETENTION_BATCH_SIZE})")
+    purge_parser.add_argument("--yes", action="store_true", help="Don't ask for confirmation")
+
+    vacuum_parser = commands.add_parser("vacuum", help="VACUUM the reading tables")
+    vacuum_parser.add_argument("--full", action="store_true", help="VACUUM FULL (rewrites tables, takes exclusive locks)")
+    vacuum_parser.add_argument("--analyze", action="store_true", help="Also refresh planner statistics")
+
+    commands.add_parser("analyze", help="Refresh planner statistics")
+    commands.add_parser("reconcile", help="Rebuild quota counters from sensor_readings")
+
+    rotate_parser = commands.add_parser("rotate-key", help="Rotate the JWT signing key (EdDSA/RS256)")
+    rotate_parser.add_argument("--retire-previous", action="store_true", help="Delete older keys, invalidating every token they signed")
+    rotate_parser.add_argument("--yes", action="store_true", help="Don't ask for confirmation")
+    return parser
+
+
 if __name__ == "__main__":
+    parser = build_parser()
+    args = parser.parse_args()
+
     print("=" * 60)
-    print("Database Cleanup Script")
-    print("=" * 60)
-    print("This will delete ALL devices and sensor readings.")
+    print("Database Maintenance")
     print("=" * 60)
-    print()
-    
-    confirm = input("Are you sure you want to continue? (yes/no): ")
-    if confirm.lower() == "yes":
-        clear_database()
+
+    if args.command in (None, "wipe"):
+        keep_devices = getattr(args, "keep_devices", False)
+        scope = "ALL sensor readings" if keep_devices else "ALL devices and sensor readings"
+        if confirm(f"This will delete {scope}.", getattr(args, "yes", False)):
+            wipe(keep_devices, getattr(args, "include_archive", False))
+        else:
+            print("Operation cancelled.")
+    elif args.command == "purge":
+        if not (args.device or args.start or args.end or args.before):
+            parser.error("purge needs --device, --start/--end or --before")
+        if confirm("This will permanently delete the matching sensor readings.", args.yes):
+            purge(args.device, args.start, args.end, args.before, args.batch_size)
+        else:
+            print("Operation cancelled.")
+    elif args.command == "vacuum":
+        vacuum(args.full, args.analyze)
+    elif args.command == "analyze":
+        analyze()
+    elif args.command == "reconcile":
+        reconcile()
+    elif args.command == "rotate-key":
+        if not args.retire_previous or confirm("This will sign out every user on every node.", args.yes):
+            rotate_key(args.retire_previous)
+        else:
+            print("Operation cancelled.")
     else:
-        print("Operation cancelled.")
+        parser.print_help()
+        sys.exit(1)
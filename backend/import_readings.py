@@ -0,0 +1,53 @@
+"""
+Bulk import CLI
+Load historical sensor readings from CSV, NDJSON or Parquet files
+
+Usage:
+    python import_readings.py readings.csv
+    python import_readings.py export-*.ndjson --chunk-size 50000
+    python import_readings.py dump.parquet --restart        # Ignore progress of an earlier, interrupted run
+
+Records need device_id, sensor_type, value and timestamp (ISO 8601 or epoch
+seconds); unit is optional. An interrupted import continues where it stopped
+when run again on the same file.
+"""
+
+import argparse
+import os
+import sys
+from app.services.import_service import ImportService, detect_format
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bulk import sensor readings")
+    parser.add_argument("files", nargs="+", help="CSV, NDJSON or Parquet files")
+    parser.add_argument("--format", choices=["csv", "ndjson", "parquet"], help="File format (default: from the extension)")
+    parser.add_argument("--chunk-size", type=int, help="Rows per COPY and commit (default IMPORT_CHUNK_SIZE)")
+    parser.add_argument("--restart", action="store_true", help="Start from the beginning even if an earlier run was interrupted")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.files:
+        try:
+            detect_format(path, args.format)
+        except ValueError as e:
+            print(f"❌ {e}")
+            failed = True
+            continue
+        if args.restart and os.path.exists(f"{path}.offset"):
+            os.remove(f"{path}.offset")
+
+        print(f"▶ Importing {path}...")
+        result = ImportService.import_file(path, args.format, args.chunk_size)
+        if result["resumed_at"]:
+            print(f"  Resumed after record {result['resumed_at']}")
+        print(f"✓ {result['imported']} rows in {result['seconds']}s ({result['rows_per_second']} rows/s), {result['skipped']} skipped")
+        if result["devices_created"]:
+            print(f"  Created devices: {', '.join(result['devices_created'])}")
+        for error in result["errors"]:
+            print(f"  Record {error['record']}: {error['error']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1 import auth, users, devices, retention, quota
-from app.db.database import engine, Base
+from app.api.v1 import auth, users, devices, retention, quota, metrics, jobs
+import asyncio
+from app.db.database import engine, Base, SessionLocal
+from app.core.config import settings
 from app.core.logger import logger
+from app.core.responses import FastJSONResponse
 from app.services.mqtt_service import mqtt_service
+from app.services.counter_service import run_reconciliation_loop
+from app.services.retention_service import run_retention_scheduler
+from app.services.job_service import job_manager
+from app.services.archive_service import ArchiveService
+from app.core.passwords import password_hasher
+from app.core.keys import key_ring, uses_key_ring
+from app.core.revocation import revocation_list, run_revocation_sync
+from app.core.rate_limit import RateLimitMiddleware
 from contextlib import asynccontextmanager
 
 # Lifespan context manager for startup and shutdown events
@@ -14,13 +25,49 @@ async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
     logger.info("Database tables initialized successfully")
     
+    if uses_key_ring():
+        key_ring.reload()
+        logger.info(f"Signing tokens with {settings.ALGORITHM} key {key_ring.signing_key().kid}")
+    
+    with SessionLocal() as db:
+        revocation_list.rebuild(db)
+    revocation_task = asyncio.create_task(
+        run_revocation_sync(SessionLocal, settings.REVOCATION_SYNC_SECONDS)
+    )
+    
     logger.info("Starting MQTT service...")
     mqtt_service.start()
     logger.info("MQTT service started")
     
+    reconcile_task = None
+    if settings.QUOTA_RECONCILE_INTERVAL_SECONDS > 0:
+        reconcile_task = asyncio.create_task(
+            run_reconciliation_loop(SessionLocal, settings.QUOTA_RECONCILE_INTERVAL_SECONDS, settings.QUOTA_RECONCILE_MONTHS)
+        )
+        logger.info(
+            f"Quota counter reconciliation every {settings.QUOTA_RECONCILE_INTERVAL_SECONDS}s "
+            f"({settings.QUOTA_RECONCILE_MONTHS or 'all'} months)"
+        )
+    
+    retention_task = None
+    if settings.RETENTION_ENABLED:
+        retention_task = asyncio.create_task(
+            run_retention_scheduler(settings.RETENTION_DAYS, settings.RETENTION_INTERVAL_SECONDS)
+        )
+        logger.info(f"Retention scheduler deleting data older than {settings.RETENTION_DAYS} days")
+    
     yield
     
     # Shutdown
+    revocation_task.cancel()
+    if reconcile_task is not None:
+        reconcile_task.cancel()
+    if retention_task is not None:
+        retention_task.cancel()
+    await job_manager.shutdown()
+    ArchiveService.shutdown()
+    password_hasher.shutdown()
+    
     logger.info("Stopping MQTT service...")
     mqtt_service.stop()
     logger.info("MQTT service stopped")
@@ -29,9 +76,14 @@ app = FastAPI(
     title="IoT Device Management API",
     description="Authentication API with JWT and IoT Device/Sensor Management",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
     lifespan=lifespan
 )
 
+# Rate limiting (added before CORS so 429 responses still get CORS headers)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -47,6 +99,8 @@ app.include_router(users.router, prefix="/api/v1/users", tags=["User Management"
 app.include_router(devices.router, prefix="/api/v1/devices", tags=["Devices & Sensors"])
 app.include_router(retention.router, prefix="/api/v1/retention", tags=["Data Retention"])
 app.include_router(quota.router, prefix="/api/v1/quota", tags=["Data Quota"])
+app.include_router(metrics.router, prefix="/api/v1/metrics", tags=["Metrics"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["Background Jobs"])
 
 logger.info("FastAPI application started successfully")
 
@@ -67,3 +121,13 @@ async def health_check():
         "status": "healthy",
         "mqtt": mqtt_status
     }
+
+@app.get("/.well-known/jwks.json")
+async def jwks(response: Response):
+    """
+    Public keys that verify this API's tokens (JWKS, RFC 7517)
+    Empty with HS256, whose secret can't be published.
+    """
+    logger.debug("JWKS endpoint accessed")
+    response.headers["Cache-Control"] = f"public, max-age={int(settings.JWT_KEY_RELOAD_SECONDS)}"
+    return key_ring.jwks() if uses_key_ring() else {"keys": []}
@@ -0,0 +1,75 @@
+"""
+Shared fixtures: settings point at a throwaway SQLite database before any
+app module is imported, so the tests never touch a configured server
+"""
+
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='sensegrid-tests-')}/test.db"
+os.environ["SECRET_KEY"] = "test-secret-key-not-for-production-use"
+os.environ["ALGORITHM"] = "HS256"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ["RESULT_CACHE_URL"] = ""
+os.environ["ARCHIVE_ENABLED"] = "false"
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.database import Base, SessionLocal, engine
+import app.models.counters  # noqa: F401 - registers the tables with Base
+import app.models.retention  # noqa: F401
+import app.models.sensor  # noqa: F401
+import app.models.user  # noqa: F401
+from app.models.sensor import Device, SensorReading
+from app.services.counter_service import DataPointCounterService
+
+# First reading of the `readings` fixture: two hours before a month boundary
+READINGS_START = datetime(2026, 1, 31, 22, 0)
+
+
+@pytest.fixture
+def db():
+    """Session on freshly created tables, dropped afterwards"""
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def make_device(db):
+    """Create a device by public id and return its devices.id"""
+    def make(device_id: str) -> int:
+        now = datetime.utcnow()
+        device = Device(
+            device_id=device_id, name=device_id, device_type="sensor_node",
+            status="online", last_seen=now, created_at=now, updated_at=now
+        )
+        db.add(device)
+        db.commit()
+        return device.id
+    return make
+
+
+@pytest.fixture
+def readings(db, make_device):
+    """
+    Two devices with CT1 and IR readings every 10 minutes for 30 hours from
+    READINGS_START, counted like ingest does; returns the devices.id values
+    """
+    devices = [make_device("LR1"), make_device("LR2")]
+    rows = []
+    for step in range(180):
+        timestamp = READINGS_START + timedelta(minutes=10 * step)
+        for device_pk in devices:
+            for sensor_type in ("CT1", "IR"):
+                db.add(SensorReading(device_id=device_pk, sensor_type=sensor_type, value=1.0, unit="A", timestamp=timestamp))
+                rows.append((device_pk, sensor_type, timestamp))
+    DataPointCounterService.record_readings(db, rows)
+    db.commit()
+    return devices
@@ -0,0 +1,94 @@
+import asyncio
+
+from app.services.coalescing import SingleFlight
+
+
+class Query:
+    """An awaitable query that blocks until released, counting its runs"""
+
+    def __init__(self, result="rows"):
+        self.result = result
+        self.runs = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_callers_share_one_execution():
+    async def scenario():
+        flight, query = SingleFlight(), Query()
+        calls = [asyncio.create_task(flight.do(("stats", "LR1"), query)) for _ in range(5)]
+        other = asyncio.create_task(flight.do(("stats", "LR2"), query))
+        await asyncio.sleep(0)
+        query.release.set()
+        return await asyncio.gather(*calls, other), query.runs, flight.stats()
+
+    results, runs, stats = run(scenario())
+    assert results == ["rows"] * 6 and runs == 2
+    assert stats["in_flight"] == 0
+    assert stats["queries"]["stats"] == {"calls": 6, "executions": 2, "coalesced": 4, "errors": 0, "coalesced_rate": 0.6667}
+
+
+def test_exceptions_are_shared_and_not_kept():
+    async def scenario():
+        flight, query = SingleFlight(), Query(ValueError("boom"))
+        calls = [asyncio.create_task(flight.do(("stats",), query)) for _ in range(3)]
+        await asyncio.sleep(0)
+        query.release.set()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        # The next call runs the query again
+        query.result = "rows"
+        return results, await flight.do(("stats",), query), flight.stats()
+
+    results, retry, stats = run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retry == "rows"
+    assert stats["queries"]["stats"]["errors"] == 1 and stats["queries"]["stats"]["executions"] == 2
+
+
+def test_waiter_runs_the_query_when_the_leader_is_cancelled():
+    async def scenario():
+        flight, query = SingleFlight(), Query()
+        leader = asyncio.create_task(flight.do(("timeseries",), query))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do(("timeseries",), query))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        query.release.set()
+        return await waiter, leader.cancelled(), query.runs
+
+    assert run(scenario()) == ("rows", True, 2)
+
+
+def test_cancelled_waiter_leaves_the_shared_call_running():
+    async def scenario():
+        flight, query = SingleFlight(), Query()
+        leader = asyncio.create_task(flight.do(("timeseries",), query))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do(("timeseries",), query))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        query.release.set()
+        return await leader, waiter.cancelled(), query.runs
+
+    assert run(scenario()) == ("rows", True, 1)
+
+
+def test_disabled_runs_every_call():
+    async def scenario():
+        flight, query = SingleFlight(enabled=False), Query()
+        query.release.set()
+        return await asyncio.gather(*[flight.do(("stats",), query) for _ in range(3)]), query.runs
+
+    assert run(scenario()) == (["rows"] * 3, 3)
@@ -0,0 +1,57 @@
+from datetime import timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.sensor import SensorReading
+from app.services.counter_service import COUNT_BUCKET_APPROXIMATE, COUNT_EXACT, DataPointCounterService
+from tests.conftest import READINGS_START as START
+
+
+def exact_count(db, start, end, device_pk=None, sensor_type=None) -> int:
+    query = select(func.count(SensorReading.id)).where(SensorReading.timestamp >= start, SensorReading.timestamp <= end)
+    if device_pk is not None:
+        query = query.where(SensorReading.device_id == device_pk)
+    if sensor_type is not None:
+        query = query.where(SensorReading.sensor_type == sensor_type)
+    return db.execute(query).scalar()
+
+
+@pytest.mark.parametrize("start, end", [
+    (START, START + timedelta(hours=30)),                                       # Whole hours
+    (START + timedelta(minutes=25), START + timedelta(hours=5, minutes=35)),    # Partial edge hours
+    (START + timedelta(minutes=5), START + timedelta(minutes=45)),              # Inside one hour
+    (START + timedelta(minutes=50), START + timedelta(hours=1, minutes=10)),    # Across one boundary
+    (START + timedelta(hours=1), START + timedelta(hours=1)),                   # A single instant
+    (START - timedelta(days=1), START + timedelta(days=3)),                     # Beyond the data
+])
+def test_count_range_matches_count_star(db, readings, start, end):
+    assert DataPointCounterService.count_range(db, start, end) == (exact_count(db, start, end), COUNT_EXACT)
+    device_pk = readings[1]
+    assert DataPointCounterService.count_range(db, start, end, device_pk, "IR") == (
+        exact_count(db, start, end, device_pk, "IR"), COUNT_EXACT
+    )
+
+
+def test_count_range_accepts_aware_datetimes(db, readings):
+    start, end = START + timedelta(hours=2), START + timedelta(hours=4)
+    aware = DataPointCounterService.count_range(db, start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc))
+    assert aware == DataPointCounterService.count_range(db, start, end)
+
+
+def test_count_range_empty_when_end_before_start(db, readings):
+    assert DataPointCounterService.count_range(db, START + timedelta(hours=2), START) == (0, COUNT_EXACT)
+
+
+def test_count_range_approximate_prorates_edge_buckets(db, readings):
+    # 4 channels x 6 readings per hour; 30 minutes at each edge of 4 whole hours
+    start, end = START + timedelta(minutes=30), START + timedelta(hours=5, minutes=30)
+    count, mode = DataPointCounterService.count_range(db, start, end, approximate=True)
+    assert mode == COUNT_BUCKET_APPROXIMATE
+    assert count == 4 * 6 * 5
+    assert abs(count - exact_count(db, start, end)) <= 4 * 2
+
+
+def test_bucket_upper_bound_never_undercounts(db, readings):
+    start, end = START + timedelta(minutes=25), START + timedelta(hours=3, minutes=5)
+    assert DataPointCounterService.bucket_upper_bound(db, start, end) >= exact_count(db, start, end)
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.models.counters import DataPointCounter, ReadingCountBucket
+from app.models.sensor import SensorReading
+from app.services.counter_service import DataPointCounterService, month_start
+from tests.conftest import READINGS_START as START
+
+
+def test_record_readings_counts_per_month_and_device(db, readings):
+    months = dict(((month, device_pk), count) for month, device_pk, count in db.execute(
+        select(DataPointCounter.month, DataPointCounter.device_id, DataPointCounter.count)
+    ))
+    # 2 hours in January, 28 in February; 2 channels x 6 readings per hour each
+    assert months[(month_start(START), readings[0])] == 2 * 2 * 6
+    assert months[(month_start(START + timedelta(days=1)), readings[0])] == 28 * 2 * 6
+    assert DataPointCounterService.total(db) == 4 * 180
+    assert DataPointCounterService.total(db, device_pk=readings[1]) == 2 * 180
+
+
+def test_subtract_matching_keeps_counters_in_step(db, readings):
+    criteria = [SensorReading.timestamp < START + timedelta(hours=3)]
+    DataPointCounterService.subtract_matching(db, *criteria)
+    db.query(SensorReading).filter(*criteria).delete(synchronize_session=False)
+    db.commit()
+    total = db.execute(select(func.count(SensorReading.id))).scalar()
+    assert DataPointCounterService.total(db) == total
+    assert DataPointCounterService.reconcile(db)["drift"] == 0
+
+
+def test_reconcile_corrects_drift(db, readings):
+    def snapshot():
+        return (
+            sorted(db.execute(select(DataPointCounter.month, DataPointCounter.device_id, DataPointCounter.count)).all()),
+            sorted(db.execute(select(
+                ReadingCountBucket.bucket_start, ReadingCountBucket.device_id,
+                ReadingCountBucket.sensor_type, ReadingCountBucket.count
+            )).all())
+        )
+
+    correct = snapshot()
+    db.query(DataPointCounter).filter(DataPointCounter.device_id == readings[0]).update({"count": DataPointCounter.count + 7})
+    db.query(ReadingCountBucket).filter(ReadingCountBucket.bucket_start == START).delete()
+    db.add(ReadingCountBucket(bucket_start=datetime(2025, 5, 1), device_id=99, sensor_type="X", count=3))
+    db.commit()
+
+    result = DataPointCounterService.reconcile(db)
+    assert result["total_after"] == 4 * 180
+    assert result["drift"] == -14
+    assert snapshot() == correct
+
+
+def test_reconcile_recent_months_leaves_older_months_alone(db, readings):
+    # Counted but never stored: drift now and in the readings' (older) months
+    DataPointCounterService.record_readings(db, [(readings[0], "CT1", START), (readings[0], "CT1", datetime.utcnow())])
+    db.commit()
+
+    result = DataPointCounterService.reconcile(db, recent_months=2)
+    assert result["drift"] == -1
+    assert DataPointCounterService.total(db) == 4 * 180 + 1
+    assert DataPointCounterService.reconcile(db)["drift"] == -1
+    assert DataPointCounterService.total(db) == 4 * 180
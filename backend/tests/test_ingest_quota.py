@@ -0,0 +1,132 @@
+import math
+
+import pytest
+
+from app.core.config import settings
+from app.models.sensor import Device
+from app.services import ingest_quota, ingest_service
+from app.services.device_service import DEVICE_DELETING
+from app.services.ingest_quota import MAX_RETRY_AFTER, IngestQuota, TokenBucket
+from app.services.ingest_service import IngestService
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for the quota module"""
+    now = [1000.0]
+    monkeypatch.setattr(ingest_quota.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=2.0, capacity=10, now=0.0)
+    bucket.tokens = 0
+    bucket.refill(2.5)
+    assert bucket.tokens == 5.0
+    bucket.refill(100.0)
+    assert bucket.tokens == 10
+    # Time going backwards doesn't drain or refill
+    bucket.refill(50.0)
+    assert bucket.tokens == 10 and bucket.updated == 100.0
+
+
+def test_token_bucket_seconds_until():
+    bucket = TokenBucket(rate=4.0, capacity=10, now=0.0)
+    assert bucket.seconds_until(10) == 0.0
+    bucket.tokens = 2
+    assert bucket.seconds_until(6) == 1.0
+    assert TokenBucket(rate=0.0, capacity=1, now=0.0).seconds_until(2) == math.inf
+
+
+def test_admit_rejects_beyond_the_burst_until_refilled(clock):
+    quota = IngestQuota(device_rate=1, device_burst=3, global_rate=100, global_burst=100)
+    assert [quota.admit("LR1").allowed for _ in range(4)] == [True, True, True, False]
+    decision = quota.admit("LR1")
+    assert decision.over_quota and decision.scope == "device" and decision.retry_after == 1.0
+    # Another device has its own bucket
+    assert quota.admit("LR2").allowed
+    clock[0] += 1
+    assert quota.admit("LR1").allowed
+
+
+def test_global_bucket_limits_all_devices(clock):
+    quota = IngestQuota(device_rate=100, device_burst=100, global_rate=1, global_burst=2)
+    assert quota.admit("LR1").allowed and quota.admit("LR2").allowed
+    decision = quota.admit("LR3")
+    assert not decision.allowed and decision.scope == "global"
+
+
+def test_zero_rate_gives_a_finite_retry_after(clock):
+    quota = IngestQuota(device_rate=0, device_burst=1, global_rate=100, global_burst=100)
+    assert quota.admit("LR1").allowed
+    decision = quota.admit("LR1")
+    assert not decision.allowed and decision.retry_after == MAX_RETRY_AFTER
+    kept, batch = quota.admit_batch("LR1", 5)
+    assert kept == 0 and batch.retry_after == MAX_RETRY_AFTER
+
+
+def test_sampling_is_per_device(clock):
+    quota = IngestQuota(device_rate=0, device_burst=0, global_rate=100, global_burst=100, action="sample", sample_keep_one_in=3)
+    kept = {"LR1": [], "LR2": []}
+    for _ in range(9):
+        for device_id in kept:
+            kept[device_id].append(quota.admit(device_id).allowed)
+    assert kept["LR1"] == kept["LR2"] == [False, False, True] * 3
+    # A batch continues the device's count: 9 seen, 6 more keeps 2
+    assert quota.admit_batch("LR1", 6)[0] == 2
+
+
+def test_admit_batch_splits_at_the_bucket(clock):
+    quota = IngestQuota(device_rate=1, device_burst=5, global_rate=100, global_burst=100, action="flag")
+    kept, decision = quota.admit_batch("LR1", 8)
+    assert kept == 8 and decision.allowed and decision.over_quota
+    assert quota.snapshot()["devices"]["LR1"]["flagged"] == 3
+
+
+def test_idle_and_excess_devices_are_evicted(clock):
+    quota = IngestQuota(device_rate=1, device_burst=5, global_rate=100, global_burst=100, max_devices=3, idle_seconds=60)
+    for device_id in ("A", "B", "C"):
+        quota.admit(device_id)
+    quota.admit("A")  # A is now the most recently seen
+    quota.admit("D")
+    assert list(quota.snapshot()["devices"]) == ["C", "A", "D"]
+    clock[0] += 61
+    quota.admit("E")
+    snapshot = quota.snapshot()
+    assert list(snapshot["devices"]) == ["E"]
+    assert snapshot["devices_evicted"] == 4
+
+
+def test_default_settings_store_a_full_gateway_batch(clock):
+    quota = IngestQuota(
+        device_rate=settings.INGEST_DEVICE_RATE,
+        device_burst=settings.INGEST_DEVICE_BURST,
+        global_rate=settings.INGEST_GLOBAL_RATE,
+        global_burst=settings.INGEST_GLOBAL_BURST,
+        action=settings.INGEST_QUOTA_ACTION
+    )
+    kept, decision = quota.admit_batch("GW1", settings.INGEST_BATCH_MAX_ITEMS)
+    assert kept == settings.INGEST_BATCH_MAX_ITEMS and decision.allowed
+
+
+def test_refund_returns_tokens_up_to_the_burst(clock):
+    quota = IngestQuota(device_rate=0, device_burst=5, global_rate=0, global_burst=10)
+    assert quota.admit_batch("LR1", 4)[0] == 4
+    quota.refund("LR1", 3)
+    assert quota.admit_batch("LR1", 5)[0] == 4
+    quota.refund("LR1", 100)
+    assert quota.admit_batch("LR1", 10)[0] == 5
+
+
+def test_batch_readings_of_devices_being_deleted_are_refunded(db, make_device, clock, monkeypatch):
+    quota = IngestQuota(device_rate=0, device_burst=5, global_rate=0, global_burst=100)
+    monkeypatch.setattr(ingest_service, "ingest_quota", quota)
+    make_device("GONE")
+    db.query(Device).filter(Device.device_id == "GONE").update({"status": DEVICE_DELETING})
+    db.commit()
+
+    columns = {"device_id": ["GONE"] * 3 + ["LR1"] * 2, "sensor_type": "CT1", "value": [1.0] * 5}
+    result, _ = IngestService.ingest_batch(db, columns)
+    assert result["accepted"] == 2 and result["rejected"] == 3
+    assert quota.admit_batch("GONE", 5)[0] == 5
+    assert quota.admit_batch("LR1", 5)[0] == 3
@@ -0,0 +1,21 @@
+import pytest
+
+from app.core.passwords import hash_password, verify_password
+
+
+def test_verify_password_matches_and_flags_legacy_rows():
+    stored = hash_password("secret")
+    assert verify_password("secret", stored) == (True, False)
+    assert verify_password("wrong", stored) == (False, False)
+    assert verify_password("secret", "secret") == (True, True)
+
+
+@pytest.mark.parametrize("stored", [
+    "scrypt$16384$8$1$c2FsdA",             # Too few fields
+    "scrypt$abc$8$1$c2FsdA$aGFzaA",        # Non-numeric cost
+    "scrypt$1000$8$1$c2FsdA$aGFzaA",       # n not a power of two
+    "scrypt$16384$8$1$c2FsdA$",            # Empty hash
+    "scrypt$1073741824$8$1$c2FsdA$aGFzaA",  # Needs more memory than scrypt allows
+])
+def test_malformed_hashes_do_not_match(stored):
+    assert verify_password("secret", stored) == (False, False)
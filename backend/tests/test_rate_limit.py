@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from app.core import rate_limit
+from app.core.rate_limit import MemoryRateLimitStore, RateLimitMiddleware, RateLimitRule, parse_rate, sliding_window
+
+
+def fits_after(previous: int, current: int, elapsed: float, limit: int, window: int, wait: float) -> bool:
+    """Whether one more request fits `wait` seconds later, rolling into the next window if needed"""
+    elapsed += wait
+    if elapsed >= window:
+        previous, current, elapsed = current, 0, elapsed - window
+    return sliding_window(previous, current, elapsed, limit, window)[0]
+
+
+def test_parse_rate():
+    assert parse_rate("30/minute") == (30, 60)
+    assert parse_rate("5/hours") == (5, 3600)
+    assert parse_rate("2/") == (2, 1)
+    assert parse_rate("") is None
+    with pytest.raises(ValueError):
+        parse_rate("10/fortnight")
+
+
+def test_sliding_window_weights_the_previous_window():
+    # Half of a full previous window still counts
+    assert sliding_window(10, 0, 30, 10, 60) == (True, 0.0)
+    assert sliding_window(10, 4, 30, 10, 60) == (True, 0.0)
+    assert not sliding_window(10, 5, 30, 10, 60)[0]
+
+
+@pytest.mark.parametrize("previous, current, elapsed", [
+    (10, 5, 0.0),    # The previous window must slide out
+    (10, 9, 45.0),
+    (0, 10, 30.0),   # The current window alone is full
+    (7, 10, 12.5),
+    (3, 10, 59.0),
+])
+def test_sliding_window_retry_after_is_exact(previous, current, elapsed):
+    limit, window = 10, 60
+    allowed, retry_after = sliding_window(previous, current, elapsed, limit, window)
+    assert not allowed and retry_after > 0
+    assert fits_after(previous, current, elapsed, limit, window, retry_after + 1e-6)
+    assert not fits_after(previous, current, elapsed, limit, window, retry_after - 0.01)
+
+
+def hit_at(store: MemoryRateLimitStore, monkeypatch, now: float, key: str, limit: int, window: int):
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now)
+    return asyncio.run(store.hit(key, limit, window))
+
+
+def test_memory_store_counts_across_windows(monkeypatch):
+    store = MemoryRateLimitStore()
+    start = 600.0  # A window boundary for 60s windows
+    results = [hit_at(store, monkeypatch, start + i, "client", 3, 60) for i in range(4)]
+    assert [allowed for allowed, _, _ in results] == [True, True, True, False]
+    assert [remaining for _, _, remaining in results] == [2, 1, 0, 0]
+    # Half a window later the three previous requests weigh 1.5
+    allowed, _, remaining = hit_at(store, monkeypatch, start + 90, "client", 3, 60)
+    assert allowed and remaining == 0
+
+
+def test_memory_store_prunes_expired_keys_before_active_ones(monkeypatch):
+    store = MemoryRateLimitStore(max_keys=10)
+    for i in range(8):
+        hit_at(store, monkeypatch, 1000.0, f"idle{i}", 5, 60)
+    hit_at(store, monkeypatch, 1000.0, "daily", 5, 86400)
+    # Two minutes on, the minute-window keys carry no counts any more
+    for key in ("active", "a", "b"):
+        hit_at(store, monkeypatch, 1200.0, key, 5, 60)
+    assert set(store._windows) == {"daily", "active", "a", "b"}
+
+    # Over the bound with live keys only, the least recently seen go first
+    for i in range(20):
+        hit_at(store, monkeypatch, 1201.0 + i, f"new{i}", 5, 3600)
+        hit_at(store, monkeypatch, 1201.0 + i, "active", 100, 60)
+    assert "active" in store._windows
+    assert store.size() <= 10
+
+
+def test_rejected_requests_are_refunded_to_earlier_rules(monkeypatch):
+    store = MemoryRateLimitStore()
+    rules = [RateLimitRule("wide", "100/minute", "ip"), RateLimitRule("narrow", "2/minute", "ip", r"/api/narrow")]
+    statuses = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    monkeypatch.setattr(rate_limit.rate_limiter, "middleware", None)
+    middleware = RateLimitMiddleware(app, store=store, rules=rules)
+    monkeypatch.setattr(rate_limit.time, "time", lambda: 600.0)
+    scope = {"type": "http", "method": "GET", "path": "/api/narrow", "headers": [], "client": ("10.0.0.1", 1)}
+    for _ in range(5):
+        asyncio.run(middleware(scope, None, send))
+    assert statuses == [200, 200, 429, 429, 429]
+    # Only the two admitted requests count against the wide rule
+    assert store._windows["wide:ip:10.0.0.1"][1] == 2
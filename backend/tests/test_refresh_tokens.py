@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.revocation import revocation_list
+from app.core.security import create_refresh_token, verify_token
+from app.models.user import RevokedToken, User
+from app.services.auth_service import AuthService
+
+
+@pytest.fixture
+def alice(db):
+    db.add(User(username="alice", email="alice@example.com", password="unused"))
+    db.commit()
+    return "alice"
+
+
+def test_refresh_rotates_and_keeps_the_family(db, alice):
+    first = create_refresh_token(alice)
+    tokens = asyncio.run(AuthService.refresh_tokens(db, first))
+
+    old, new = verify_token(first), verify_token(tokens["refresh_token"])
+    assert new["fam"] == old["fam"]
+    assert new["jti"] != old["jti"]
+    assert verify_token(tokens["access_token"])["sub"] == alice
+    # The exchanged token is revoked
+    assert db.get(RevokedToken, old["jti"]) is not None
+    assert revocation_list.might_be_revoked(old["jti"])
+
+
+def test_reusing_a_refresh_token_revokes_its_family(db, alice):
+    first = create_refresh_token(alice)
+    second = asyncio.run(AuthService.refresh_tokens(db, first))["refresh_token"]
+
+    # A replayed copy of the first token: rejected, and the family is revoked
+    with pytest.raises(HTTPException) as replay:
+        AuthService.consume_refresh_token(db, verify_token(first))
+    assert replay.value.status_code == 401
+    family = verify_token(first)["fam"]
+    assert db.get(RevokedToken, family).kind == "family"
+    assert revocation_list.might_be_revoked(family)
+
+    # So the legitimate client's newer token no longer works either
+    with pytest.raises(HTTPException) as rotated:
+        AuthService.consume_refresh_token(db, verify_token(second))
+    assert rotated.value.status_code == 401
+
+
+def test_other_families_are_unaffected_by_reuse(db, alice):
+    stolen = create_refresh_token(alice)
+    other_device = create_refresh_token(alice)
+    AuthService.consume_refresh_token(db, verify_token(stolen))
+    with pytest.raises(HTTPException):
+        AuthService.consume_refresh_token(db, verify_token(stolen))
+    assert AuthService.consume_refresh_token(db, verify_token(other_device)) == verify_token(other_device)["fam"]
+
+
+def test_refresh_for_a_deleted_user_is_rejected(db):
+    with pytest.raises(HTTPException) as missing:
+        AuthService.consume_refresh_token(db, verify_token(create_refresh_token("ghost")))
+    assert missing.value.status_code == 401
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import result_cache as result_cache_module
+from app.services.counter_service import DataPointCounterService
+from app.services.result_cache import MemoryResultStore, result_cache
+
+
+class FakeReplica:
+    def __init__(self, staleness: float):
+        self._staleness = staleness
+
+    def staleness(self) -> float:
+        return self._staleness
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """The shared result cache on an empty store, so commit hooks advance its watermarks"""
+    monkeypatch.setattr(result_cache, "store", MemoryResultStore(100))
+    monkeypatch.setattr(result_cache, "enabled", True)
+    monkeypatch.setattr(result_cache, "_stats", {})
+    return result_cache
+
+
+@pytest.fixture
+def devices(make_device):
+    return {"LR1": make_device("LR1"), "LR2": make_device("LR2")}
+
+
+def compute(cache, db, key, closed, device_id, value="result"):
+    calls = []
+
+    def fn(session):
+        calls.append(session)
+        return value
+
+    assert cache.compute(db, key, closed, device_id, fn) == value
+    return calls
+
+
+def write(db, device_pk, timestamp):
+    DataPointCounterService.record_readings(db, [(device_pk, "CT1", timestamp)])
+    db.commit()
+
+
+def test_open_entries_are_dropped_by_writes_to_their_device(db, cache, devices):
+    compute(cache, db, ("stats", "LR1"), False, "LR1")
+    compute(cache, db, ("quota_stats",), False, None)
+    assert cache.lookup(("stats", "LR1")) == "result"
+
+    write(db, devices["LR2"], datetime.utcnow())
+    # Another device's write only affects global results
+    assert cache.lookup(("stats", "LR1")) == "result"
+    assert cache.lookup(("quota_stats",)) is None
+
+    write(db, devices["LR1"], datetime.utcnow())
+    assert cache.lookup(("stats", "LR1")) is None
+    assert cache.stats()["queries"]["stats"]["stale"] == 1
+
+
+def test_closed_entries_survive_new_data_but_not_history_changes(db, cache, devices):
+    compute(cache, db, ("stats", "LR1", "closed"), True, "LR1")
+    write(db, devices["LR1"], datetime.utcnow())
+    assert cache.lookup(("stats", "LR1", "closed")) == "result"
+
+    write(db, devices["LR1"], datetime.utcnow() - timedelta(days=30))
+    assert cache.lookup(("stats", "LR1", "closed")) is None
+
+
+def test_rolled_back_writes_leave_entries_valid(db, cache, devices):
+    compute(cache, db, ("stats", "LR1"), False, "LR1")
+    DataPointCounterService.record_readings(db, [(devices["LR1"], "CT1", datetime.utcnow())])
+    db.rollback()
+    assert cache.lookup(("stats", "LR1")) == "result"
+
+
+def test_counter_rebuild_drops_everything(db, cache, devices):
+    compute(cache, db, ("stats", "LR1", "closed"), True, "LR1")
+    result_cache_module.note_change(db, None)
+    db.commit()
+    assert cache.lookup(("stats", "LR1", "closed")) is None
+
+
+def test_unknown_device_and_none_key_are_not_cached(db, cache, devices):
+    compute(cache, db, ("stats", "nope"), False, "nope")
+    assert cache.lookup(("stats", "nope")) is None
+    assert len(compute(cache, db, None, False, None)) == 1
+
+
+def test_error_results_are_not_cached(db, cache, devices):
+    compute(cache, db, ("quota_stats",), False, None, value={"error": "boom"})
+    assert cache.lookup(("quota_stats",)) is None
+
+
+def test_replica_results_are_cached_only_outside_its_lag(db, cache, devices):
+    write(db, devices["LR1"], datetime.utcnow())
+    db.info["replica"] = FakeReplica(staleness=5.0)
+    try:
+        # The write may not have reached the replica yet
+        compute(cache, db, ("stats", "LR1"), False, "LR1")
+        assert cache.lookup(("stats", "LR1")) is None
+        assert cache.stats()["queries"]["stats"]["replica_skips"] == 1
+        # A device without recent writes is safe to cache from the replica
+        compute(cache, db, ("stats", "LR2"), False, "LR2")
+        assert cache.lookup(("stats", "LR2")) == "result"
+
+        db.info["replica"] = FakeReplica(staleness=0.0)
+        compute(cache, db, ("stats", "LR1"), False, "LR1")
+        assert cache.lookup(("stats", "LR1")) == "result"
+    finally:
+        db.info.pop("replica")
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.models.retention import SensorRollup
+from app.models.sensor import SensorReading
+from app.services.counter_service import DataPointCounterService
+from app.services.retention_service import RetentionService
+from tests.conftest import READINGS_START as START
+
+
+@pytest.fixture
+def slices(monkeypatch):
+    """Row counts of the slices deleted, one per committed transaction"""
+    sizes = []
+    delete_committed = RetentionService._delete_committed
+
+    def spy(db, *criteria):
+        deleted = delete_committed(db, *criteria)
+        sizes.append(deleted)
+        return deleted
+
+    monkeypatch.setattr(RetentionService, "_delete_committed", staticmethod(spy))
+    return sizes
+
+
+def remaining(db, *criteria):
+    return db.execute(select(func.count(SensorReading.id)).where(*criteria)).scalar()
+
+
+def test_delete_before_works_in_slices_and_keeps_counters(db, readings, slices):
+    cutoff = START + timedelta(hours=3)
+    # 18 timestamps before the cutoff, 2 devices x 2 channels
+    assert RetentionService.delete_before(db, cutoff, batch_size=10) == 72
+    assert slices == [10] * 7 + [2]
+    assert remaining(db, SensorReading.timestamp < cutoff) == 0
+    assert DataPointCounterService.total(db) == remaining(db) == 4 * 180 - 72
+    assert DataPointCounterService.reconcile(db)["drift"] == 0
+
+
+def test_delete_before_resumes_with_what_is_left(db, readings, slices):
+    cutoff = START + timedelta(hours=3)
+    RetentionService.delete_before(db, START + timedelta(hours=1), batch_size=10)
+    # A re-run with a later cutoff (or after an interruption) only sees the rest
+    assert RetentionService.delete_before(db, cutoff, batch_size=10) == 72 - 24
+    assert RetentionService.delete_before(db, cutoff, batch_size=10) == 0
+
+
+class FakeJob:
+    def __init__(self):
+        self.pauses = 0
+        self.progress = {}
+
+    def update(self, **progress):
+        self.progress.update(progress)
+
+    def wait_or_cancel(self, seconds: float):
+        self.pauses += 1
+
+    def check_cancelled(self):
+        pass
+
+
+def apply_to_lr1(db, readings, job=None):
+    # Raw readings are kept for a day: the cutoff falls 3 hours after START
+    now = START + timedelta(days=1, hours=3)
+    return RetentionService._apply_channel_policy(db, readings[0], "CT1", 1, None, now, job)
+
+
+def test_channel_policy_rolls_up_then_deletes_in_bounded_slices(db, readings, slices, monkeypatch):
+    monkeypatch.setattr(settings, "RETENTION_BATCH_SIZE", 4)
+    monkeypatch.setattr(settings, "RETENTION_ROLLUP_WINDOW_HOURS", 2)
+    result = apply_to_lr1(db, readings)
+    assert result == {"rolled_up": 18, "deleted": 18, "rollups_expired": 0}
+    # A 2-hour window of 12 readings, then the hour of 6 before the cutoff
+    assert slices == [4, 4, 4, 4, 2]
+
+    rollups = db.execute(
+        select(SensorRollup.bucket_start, SensorRollup.count, SensorRollup.sum_value).order_by(SensorRollup.bucket_start)
+    ).all()
+    assert rollups == [(START + timedelta(hours=hour), 6, 6.0) for hour in range(3)]
+    assert remaining(db, SensorReading.device_id == readings[0], SensorReading.sensor_type == "CT1") == 180 - 18
+    assert DataPointCounterService.reconcile(db)["drift"] == 0
+
+
+def test_channel_policy_jobs_pause_per_batch_of_rows(db, readings, monkeypatch):
+    monkeypatch.setattr(settings, "RETENTION_BATCH_SIZE", 10)
+    job = FakeJob()
+    apply_to_lr1(db, readings, job)
+    # Three one-hour windows of 6 rows: one pause once 10 rows are done, not one per window
+    assert job.pauses == 1
+    assert job.progress["channel_deleted"] == 18
@@ -0,0 +1,90 @@
+import secrets
+from datetime import datetime, timedelta
+
+from app.core.revocation import BloomFilter, RevocationList
+from app.models.user import RevokedToken
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [secrets.token_urlsafe(16) for _ in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    assert bloom.count == 1000
+
+
+def test_bloom_filter_false_positive_rate_near_target():
+    bloom = BloomFilter(capacity=2000, error_rate=0.01)
+    for _ in range(2000):
+        bloom.add(secrets.token_urlsafe(16))
+    trials = 20000
+    false_positives = sum(secrets.token_urlsafe(16) in bloom for _ in range(trials))
+    # Filled to capacity the expected rate is 1%; allow for sampling noise
+    assert false_positives / trials < 0.02
+
+
+def test_bloom_filter_sizing():
+    bloom = BloomFilter(capacity=100000, error_rate=0.001)
+    # About 1.44 * log2(1/p) bits and log2(1/p) hashes per item
+    assert 14 * 100000 <= bloom.size <= 15 * 100000
+    assert bloom.hashes == 10
+
+
+def test_revocation_list_confirms_filter_hits_against_the_table(db):
+    revocations = RevocationList(capacity=100, error_rate=0.01)
+    revoked = secrets.token_urlsafe(16)
+    db.add(RevokedToken(jti=revoked, kind="access", expires_at=datetime.utcnow() + timedelta(hours=1)))
+    db.commit()
+    revocations.rebuild(db)
+
+    assert revocations.might_be_revoked(revoked)
+    assert revocations.is_revoked(db, revoked)
+    assert not revocations.might_be_revoked(None)
+
+    # A filter hit for a token that isn't in the table is a false positive
+    stranger = secrets.token_urlsafe(16)
+    assert not revocations.is_revoked(db, stranger)
+    # ... remembered, so asking again doesn't need the database
+    assert not revocations.is_revoked(None, stranger)
+    stats = revocations.stats()
+    assert stats["false_positives"] == 2
+    assert stats["revoked_hits"] == 1
+
+
+def test_revocation_list_add_is_visible_without_the_table():
+    revocations = RevocationList(capacity=100, error_rate=0.01)
+    jti = secrets.token_urlsafe(16)
+    assert not revocations.might_be_revoked(jti)
+    revocations.add(jti)
+    assert revocations.might_be_revoked(jti)
+    assert revocations.is_revoked(None, jti)
+
+
+def test_rebuild_drops_expired_and_keeps_local_revocations(db):
+    revocations = RevocationList(capacity=100, error_rate=0.001)
+    expired, live, local = (secrets.token_urlsafe(16) for _ in range(3))
+    now = datetime.utcnow()
+    db.add_all([
+        RevokedToken(jti=expired, kind="access", expires_at=now - timedelta(minutes=1)),
+        RevokedToken(jti=live, kind="access", expires_at=now + timedelta(hours=1)),
+    ])
+    db.commit()
+    # Revoked on this node but not yet in the table the rebuild reads
+    revocations.add(local)
+    revocations.rebuild(db)
+
+    assert db.get(RevokedToken, expired) is None
+    assert revocations.might_be_revoked(live)
+    assert revocations.might_be_revoked(local)
+
+
+def test_sync_picks_up_revocations_from_other_nodes(db):
+    revocations = RevocationList(capacity=100, error_rate=0.001)
+    revocations.rebuild(db)
+    jti = secrets.token_urlsafe(16)
+    db.add(RevokedToken(jti=jti, kind="refresh", expires_at=datetime.utcnow() + timedelta(days=1)))
+    db.commit()
+    assert not revocations.might_be_revoked(jti)
+    revocations.sync(db)
+    assert revocations.might_be_revoked(jti)
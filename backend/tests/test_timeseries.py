@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from app.services.sensor_service import SensorService
+from tests.conftest import READINGS_START as START
+
+
+def series(db, hours: int, quota_limit=None):
+    end = START + timedelta(hours=hours)
+    return SensorService.get_time_series_by_date_range(db, "LR1", "CT1", START.isoformat(), end.isoformat(), quota_limit)
+
+
+def test_series_is_chronological_with_the_channel_unit(db, readings):
+    result = series(db, 2)
+    assert result["unit"] == "A" and result["limited_to"] is None
+    timestamps = [point["timestamp"] for point in result["data"]]
+    assert timestamps == [START + timedelta(minutes=10 * step) for step in range(13)]
+
+
+def test_quota_limit_keeps_the_newest_points(db, readings):
+    result = series(db, 2, quota_limit=3)
+    assert [point["timestamp"] for point in result["data"]] == [START + timedelta(minutes=10 * step) for step in (10, 11, 12)]